@@ -0,0 +1,83 @@
+#----------------------------------------------------------------------------#
+# Async database access for the async read views.
+#
+# The app is a WSGI app: Flask runs each async view to completion in an event
+# loop of its own, on the worker thread serving the request. The thread stays
+# busy until the view returns, what runs concurrently is the independent
+# statements of one request, gathered with asyncio.gather(). Connections
+# cannot outlive that loop: the engines use NullPool, and every statement runs
+# on a connection of its own. Reads go to the replicas on the same terms as
+# the sync RoutingSession, and the instrumentation sees the statements of
+# every engine.
+#----------------------------------------------------------------------------#
+
+import asyncio
+import random
+
+from flask import g, has_request_context, request
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.pool import NullPool
+
+from engines import reads_primary
+
+# asyncio driver of each database backend
+ASYNC_DRIVERS = {
+  'postgresql': 'asyncpg',
+  'sqlite': 'aiosqlite',
+}
+
+
+def async_url(url):
+  """
+  The asyncio driver equivalent of a database url
+  """
+  url = make_url(url)
+  backend = url.get_backend_name()
+  if backend not in ASYNC_DRIVERS:
+    raise ValueError(f'No asyncio driver for {backend} databases')
+  return url.set(drivername=f'{backend}+{ASYNC_DRIVERS[backend]}')
+
+
+class AsyncDatabase:
+  """
+  Runs read statements built by the sync code on an asyncio engine, or on one of
+  the engines of `replica_urls`
+  """
+
+  def __init__(self, url, replica_urls=()):
+    self.engine = create_async_engine(async_url(url), poolclass=NullPool)
+    self.replicas = [create_async_engine(async_url(url), poolclass=NullPool) for url in replica_urls]
+
+  def read_engine(self):
+    """
+    A replica during GET and HEAD requests, unless the client must read its own
+    writes, the primary otherwise. One replica serves the whole request.
+    """
+    if not self.replicas or not has_request_context() or request.method not in ('GET', 'HEAD') \
+        or reads_primary():
+      return self.engine
+    if 'async_replica' not in g:
+      g.async_replica = random.choice(self.replicas)
+    return g.async_replica
+
+  def session(self) -> AsyncSession:
+    return AsyncSession(self.read_engine(), expire_on_commit=False)
+
+  async def all(self, statement) -> list:
+    async with self.session() as session:
+      return (await session.execute(statement)).all()
+
+  async def scalar(self, statement):
+    async with self.session() as session:
+      return await session.scalar(statement)
+
+  async def get(self, model, ident, options=()):
+    async with self.session() as session:
+      return await session.get(model, ident, options=options)
+
+  async def gather(self, *statements) -> list:
+    """
+    Rows of each statement, run concurrently
+    """
+    return await asyncio.gather(*(self.all(statement) for statement in statements))
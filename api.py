@@ -0,0 +1,95 @@
+#----------------------------------------------------------------------------#
+# JSON API responses.
+#
+# Every API view states the version of the data it depends on (latest
+# updated_at and row counts, read by one cheap query) before building
+# anything. The version is hashed into a strong ETag, so repeat polls are
+# answered 304 Not Modified without assembling or serializing the payload.
+# Last-Modified is only sent for data whose changes all have a timestamp:
+# deleted rows and shows starting leave none, only the ETag sees them.
+#----------------------------------------------------------------------------#
+
+import hashlib
+import json
+from datetime import datetime, timezone
+
+from flask import Response, request
+
+from cache import MISSING
+
+try:
+  import orjson
+except ImportError:
+  orjson = None
+
+
+class ApiError(Exception):
+  """
+  Error answered as {"error": message} with `status`
+  """
+
+  def __init__(self, message, status=400):
+    super().__init__(message)
+    self.message = message
+    self.status = status
+
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(data) -> bytes:
+  """
+  Serialize `data`, with orjson when it is installed
+  """
+  if orjson is not None:
+    return orjson.dumps(data)
+  return json.dumps(data, default=json_default, separators=(',', ':')).encode()
+
+
+def make_etag(*parts) -> str:
+  return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+def not_modified(etag, last_modified) -> bool:
+  """
+  Whether the client copy matching the request validators is still current
+  """
+  if request.if_none_match:
+    return request.if_none_match.contains(etag)
+  if last_modified is not None and request.if_modified_since is not None:
+    return last_modified.replace(microsecond=0) <= request.if_modified_since
+  return False
+
+
+def conditional_json(version, build, cache=None):
+  """
+  Respond with the JSON of `build()`, or 304 when the client already has it.
+
+  `version` is (last modification as a naive UTC datetime, or None when some
+  changes have no timestamp, hashable validators). When `cache` is given, serialized bodies are stored in it under
+  their ETag, so clients polling the same version share one serialization.
+  """
+  last_modified, validators = version
+  etag = make_etag(request.full_path, validators)
+  if last_modified is not None:
+    last_modified = last_modified.replace(tzinfo=timezone.utc)
+
+  if not_modified(etag, last_modified):
+    response = Response(status=304)
+  else:
+    body = cache.get(f'api:{etag}') if cache is not None else MISSING
+    if body is MISSING:
+      body = dumps(build())
+      if cache is not None:
+        cache.set(f'api:{etag}', body)
+    response = Response(body, mimetype='application/json')
+  response.set_etag(etag)
+  # werkzeug dates a None Last-Modified now
+  if last_modified is not None:
+    response.last_modified = last_modified
+  # clients may keep the body but must revalidate it before every use
+  response.cache_control.no_cache = True
+  return response
@@ -2,108 +2,241 @@
 # Imports
 #----------------------------------------------------------------------------#
 
+import base64
+import os
+import binascii
 import json
-import dateutil.parser
-import babel
-from collections import deque
-from flask import Flask, jsonify, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func
+import math
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from itertools import groupby
+from flask import Blueprint, Flask, current_app, g, has_request_context, jsonify, render_template, request, Response, flash, redirect, url_for, stream_template, stream_with_context
+from flask.cli import AppGroup
+from sqlalchemy import and_, func, or_, tuple_
+from sqlalchemy.orm import joinedload, selectinload
 from sqlalchemy.sql import case
-import logging
-from logging import Formatter, FileHandler
+import click
 from flask_wtf import Form
 from forms import *
 import config
-from flask_migrate import Migrate
+from extensions import db, moment
+from models import Artist, Availability, Show, Venue, refresh_upcoming_shows, roll_forward_upcoming_shows, utcnow
+from search import create_search_backend
+from geo import create_geo_backend, gazetteer, geo_cli
+from autocomplete import Autocomplete
+from cache import MISSING, create_cache
+from scheduling import ConflictDetector, IntervalSet
+from importer import import_cli
+from exporter import MIMETYPES, encode, export_cli
+from genres import GENRES, to_genre_mask
+from api import ApiError, conditional_json
+from engines import engine_options, init_engines
+from assets import Assets, assets_cli
+from logs import init_logging
+
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-# in-memory recent queries
-recent_queries = deque(maxlen=10)
+bp = Blueprint('main', __name__)
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object(config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+def create_app(config_object=config):
+  """
+  The app with its extensions initialized, routes registered and logging set up.
+  Importing this module only defines them: no database, file or network access.
+  """
+  app = Flask(__name__)
+  app.config.from_object(config_object)
+  if not app.config['SECRET_KEY']:
+    if not app.debug:
+      raise RuntimeError('Set the SECRET_KEY environment variable, shared by every worker')
+    # sessions and CSRF tokens of a debug server do not survive its restarts
+    app.config['SECRET_KEY'] = os.urandom(32)
+  app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    **engine_options(app.config, app.config['SQLALCHEMY_DATABASE_URI']),
+    **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+  }
+  db.init_app(app)
+  moment.init_app(app)
+  with app.app_context():
+    init_engines(app, db.engine)
+  if app.config['INSTRUMENTATION']:
+    from instrumentation import Instrumentation
+    app.extensions['instrumentation'] = Instrumentation(app)
+  app.extensions['assets'] = Assets(app)
+
+  app.jinja_env.filters['datetime'] = format_datetime
+  app.jinja_env.filters['datetimes'] = format_datetimes
+  # genre filter options
+  app.jinja_env.globals['GENRES'] = GENRES
+  app.register_blueprint(bp)
+  if app.config['ASYNC_VIEWS']:
+    app.view_functions.update({f'{bp.name}.{endpoint}': view for endpoint, view in ASYNC_VIEWS.items()})
+
+  # Flask-Migrate imports alembic, a tenth of the startup time: only set it up for
+  # `flask` commands, workers never run migrations
+  if click.get_current_context(silent=True) is not None:
+    from flask_migrate import Migrate
+    Migrate(app, db, render_as_batch=True)
+  app.cli.add_command(import_cli)
+  app.cli.add_command(export_cli)
+  app.cli.add_command(assets_cli)
+  app.cli.add_command(upcoming_cli)
+  app.cli.add_command(geo_cli)
+  init_logging(app)
+  return app
 
 #----------------------------------------------------------------------------#
-# Models.
+# Model helpers.
 #----------------------------------------------------------------------------#
 
-class Show(db.Model):
-  __tablename__ = 'Show'
-  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), primary_key=True, nullable=False)
-  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), primary_key=True, nullable=False)
-  start_time = db.Column(db.DateTime, primary_key=True)
-
-class Venue(db.Model):
-  __tablename__ = 'Venue'
-  id = db.Column(db.Integer, primary_key=True, nullable=False)
-  name = db.Column(db.String)
-  city = db.Column(db.String(120))
-  state = db.Column(db.String(120))
-  address = db.Column(db.String(120))
-  phone = db.Column(db.String(120))
-  genres = db.Column(db.String)
-  image_link = db.Column(db.String(500))
-  facebook_link = db.Column(db.String(120))
-  website_link = db.Column(db.String(120))
-  seeking_talent = db.Column(db.Boolean())
-  seeking_description = db.Column(db.String)
-
-  def __repr__(self):
-    return (f'<Venue id={self.id} name={self.name} city={self.city} state={self.state} '
-            f'address={self.address} phone={self.phone} genres={self.genres} '
-            f'image_link={self.image_link} facebook_link={self.facebook_link} '
-            f'website_link={self.website_link} seeking_talent={self.seeking_talent} '
-            f'seeking_description={self.seeking_description}>')
-       
-class Artist(db.Model):
-  __tablename__ = 'Artist'
-  id = db.Column(db.Integer, primary_key=True, nullable=False)
-  name = db.Column(db.String)
-  city = db.Column(db.String(120))
-  state = db.Column(db.String(120))
-  phone = db.Column(db.String(120))
-  genres = db.Column(db.String)
-  image_link = db.Column(db.String(500))
-  facebook_link = db.Column(db.String(120))
-  website_link = db.Column(db.String(120))
-  seeking_venue = db.Column(db.Boolean())
-  seeking_description = db.Column(db.String)
-  availability = db.Column(db.String)
-
-  def __repr__(self):
-    return (
-        f"<Artist id={self.id}, name={self.name}, city={self.city}, state={self.state}, "
-        f"phone={self.phone}, genres={self.genres}, image_link={self.image_link}, "
-        f"facebook_link={self.facebook_link}, website_link={self.website_link}, "
-        f"seeking_venue={self.seeking_venue}, seeking_description={self.seeking_description}, "
-        f"availability={self.availability}>"
-    )
-
-def get_availability_list(availability_artist) -> list[dict]:
-  """
-  Parse availability string to a list of dict
+def get_availability_list(availabilities) -> list[dict]:
   """
-  try:
-    if availability_artist is not None:
-      availability_list = list()
-      for a in availability_artist.split(','):
-        if a:
-          times = a.split(';')
-          availability_list.append({'start_time': times[0], 'end_time': times[1]})
-      return availability_list
-    else:
-      return list()
-  except Exception as e:
-    print(e)
-    flash(f'Invalid availability: {availability_artist}')
+  Format availability windows as the start/end strings of the availability form
+  """
+  return [{
+    'start_time': a.start_time.isoformat(timespec='minutes'),
+    'end_time': a.end_time.isoformat(timespec='minutes')
+  } for a in availabilities]
+
+def get_availability_index(artist_ids) -> dict:
+  """
+  Availability windows of the given artists as IntervalSets, loaded in one query.
+  Checking whether an artist is free at some time is then a binary search.
+  """
+  windows = {artist_id: list() for artist_id in artist_ids}
+  rows = db.session.query(Availability.artist_id, Availability.start_time, Availability.end_time) \
+    .filter(Availability.artist_id.in_(windows))
+  for artist_id, start_time, end_time in rows:
+    windows[artist_id].append((start_time, end_time))
+  return {artist_id: IntervalSet(intervals) for artist_id, intervals in windows.items()}
+
+def find_show_conflicts(proposals) -> list[list[str]]:
+  """
+  Check proposed (venue_id, artist_id, start_time) shows against the existing
+  shows of the same artists and venues, and against each other in order.
+  Existing shows come from one indexed range query around the proposals.
+  Returns the conflict messages of each proposal, empty when it can be booked.
+  """
+  if not proposals:
     return list()
+  duration = timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES'])
+  venue_ids = {venue_id for venue_id, _, _ in proposals}
+  artist_ids = {artist_id for _, artist_id, _ in proposals}
+  start_times = [start_time for _, _, start_time in proposals]
+
+  detector = ConflictDetector(duration)
+  existing = db.session.query(Show.venue_id, Show.artist_id, Show.start_time) \
+    .filter(or_(Show.venue_id.in_(venue_ids), Show.artist_id.in_(artist_ids)),
+            Show.start_time > min(start_times) - duration,
+            Show.start_time < max(start_times) + duration)
+  for venue_id, artist_id, start_time in existing:
+    detector.add(venue_id, artist_id, start_time)
+  return [detector.check_and_add(*proposal) for proposal in proposals]
+
+def get_search_backend():
+  """
+  Name search backend of the app, created on first use
+  """
+  if 'search' not in current_app.extensions:
+    current_app.extensions['search'] = create_search_backend(current_app.config['SEARCH_BACKEND'], db)
+  return current_app.extensions['search']
+
+def get_geo_backend():
+  """
+  Nearby search backend of the app, created on first use
+  """
+  if 'geo' not in current_app.extensions:
+    current_app.extensions['geo'] = create_geo_backend(current_app.config['GEO_BACKEND'], db,
+                                                       current_app.config['GEO_GRID_CELL_DEGREES'])
+  return current_app.extensions['geo']
+
+def get_autocomplete():
+  """
+  Search box completions of the app, loaded on first use
+  """
+  if 'autocomplete' not in current_app.extensions:
+    current_app.extensions['autocomplete'] = Autocomplete(db, (Venue, Artist))
+  return current_app.extensions['autocomplete']
+
+def index_entity(model, entity):
+  """
+  Bring the in-process indexes up to date with a committed new or edited venue or artist
+  """
+  get_search_backend().index(model, entity.id, entity.name)
+  get_geo_backend().index(model, entity.id, entity.latitude, entity.longitude)
+  get_autocomplete().index(model, entity.id, entity.name, entity.city, entity.state)
+
+def remove_entity(model, entity_id):
+  """
+  Drop a deleted venue or artist from the in-process indexes
+  """
+  get_search_backend().remove(model, entity_id)
+  get_geo_backend().remove(model, entity_id)
+  get_autocomplete().remove(model, entity_id)
+
+def get_cache():
+  """
+  View data cache of the app, created on first use
+  """
+  if 'cache' not in current_app.extensions:
+    current_app.extensions['cache'] = create_cache(current_app.config)
+  return current_app.extensions['cache']
+
+def get_recent_items():
+  """
+  Recently viewed venues and artists, created on first use
+  """
+  if 'recent' not in current_app.extensions:
+    from recent import create_recent_items
+    current_app.extensions['recent'] = create_recent_items(current_app.config)
+  return current_app.extensions['recent']
+
+def cached(key, build):
+  """
+  Return the cached value of `key`, building and storing it on a miss.
+  A None result (missing entity) is not cached.
+  """
+  cache = get_cache()
+  value = cache.get(key)
+  if value is MISSING:
+    value = build()
+    if value is not None:
+      cache.set(key, value)
+  return value
+
+def invalidate_venue(venue_id, artist_ids=None):
+  """
+  Drop the cached views showing a venue: listings, its page and the pages of artists playing
+  there, `artist_ids` when its shows are already deleted
+  """
+  if artist_ids is None:
+    artist_ids = [artist_id for artist_id, in
+                  db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+  cache = get_cache()
+  cache.delete(f'venue:{venue_id}', *[f'artist:{artist_id}' for artist_id in artist_ids])
+  cache.delete_prefix('venues:')
+  cache.delete_prefix('shows:')
+
+def invalidate_artist(artist_id):
+  """
+  Drop the cached views showing an artist: listings, its page and the pages of venues it plays at
+  """
+  venue_ids = db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()
+  cache = get_cache()
+  cache.delete(f'artist:{artist_id}', *[f'venue:{venue_id}' for venue_id, in venue_ids])
+  cache.delete_prefix('artists:')
+  cache.delete_prefix('shows:')
+
+def invalidate_show(venue_id, artist_id):
+  """
+  Drop the cached views counting or listing a show
+  """
+  cache = get_cache()
+  cache.delete(f'venue:{venue_id}', f'artist:{artist_id}')
+  cache.delete_prefix('venues:')
+  cache.delete_prefix('shows:')
 
 def flash_form_errors(form):
   for field, errors in form.errors.items():
@@ -114,117 +247,287 @@ def flash_form_errors(form):
 # Filters.
 #----------------------------------------------------------------------------#
 
+def get_date_formatter():
+  """
+  Memoizing date formatter of the app, created on first use
+  """
+  if 'dates' not in current_app.extensions:
+    # babel and dateutil are loaded by the first page formatting a date
+    from dates import DateFormatter
+    current_app.extensions['dates'] = DateFormatter(current_app.config['DATE_FORMAT_CACHE_SIZE'])
+  return current_app.extensions['dates']
+
+def get_locale() -> str:
+  """
+  Locale of the request, the best Accept-Language match among LOCALES
+  """
+  locales = current_app.config['LOCALES']
+  if not has_request_context():
+    return locales[0]
+  g.negotiated_locale = True
+  return request.accept_languages.best_match(locales, default=locales[0])
+
+@bp.after_app_request
+def vary_on_locale(response):
+  """
+  Responses formatted in the negotiated locale differ by Accept-Language, shared
+  caches must keep one copy per language. The view cache holds the data before
+  rendering, its entries do not depend on the locale.
+  """
+  if g.get('negotiated_locale') and len(current_app.config['LOCALES']) > 1:
+    response.vary.add('Accept-Language')
+  return response
+
 def format_datetime(value, format='medium'):
-  if isinstance(value, str):
-    value = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(value, format, locale='en')
+  return get_date_formatter().format(value, format, get_locale())
 
-app.jinja_env.filters['datetime'] = format_datetime
+def format_datetimes(values, format='medium') -> list[str]:
+  """
+  Format a whole column of values at once, e.g. the start times of a show list
+  """
+  return get_date_formatter().format_many(values, format, get_locale())
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
-with app.app_context():
-   db.create_all()
-
-@app.route('/')
+@bp.route('/')
 def index():
-  return render_template('pages/home.html', recent=recent_queries)
+  return render_template('pages/home.html', recent=get_recent_items().items())
 
 
 #  Venues
 #  ----------------------------------------------------------------
-@app.route('/venues')
+@bp.route('/venues')
 def venues():
-  now_time = datetime.now()
+  genre_mask = get_genre_mask()
+  areas = cached(f'venues:{genre_mask}', lambda: get_venue_areas(genre_mask))
+  return render_template('pages/venues.html', areas=areas)
+
+def get_venue_areas(genre_mask=0) -> list[dict]:
+  """
+  Group venues by (city, state) with their number of upcoming shows.
+  Reads the counts maintained on the venue rows, no show is scanned.
+  """
+  return group_venue_areas(venue_areas_query(genre_mask).all())
+
+def venue_areas_query(genre_mask=0):
+  query = db.session.query(Venue.id, Venue.name, Venue.city, Venue.state,
+                           Venue.upcoming_show_count.label('num_upcoming_shows'))
+  if genre_mask:
+    query = query.filter(Venue.has_genres(genre_mask))
+  return query.order_by(Venue.city, Venue.state, Venue.name)
+
+def group_venue_areas(rows) -> list[dict]:
   data = list()
-  cities_and_states = db.session.query(Venue.city, Venue.state).distinct().all()
-  for city, state in cities_and_states:
-    city_entry = dict()
-    city_entry['city'] = city
-    city_entry['state'] = state
-    venues = Venue.query.filter(Venue.city == city, Venue.state == state).all()
-    venues_data = list()
-    for venue in venues:
-      num_upcoming_shows = Show.query.filter(Show.venue_id == venue.id, Show.start_time >= now_time).count()
-      venues_data.append({
-         'id': venue.id,
-         'name': venue.name,
-         'num_upcoming_shows': num_upcoming_shows
-      })
-    city_entry['venues'] = venues_data
-    data.append(city_entry)
-  return render_template('pages/venues.html', areas=data)
-
-@app.route('/venues/search', methods=['POST'])
+  for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+    data.append({
+      'city': city,
+      'state': state,
+      'venues': [{
+        'id': venue.id,
+        'name': venue.name,
+        'num_upcoming_shows': venue.num_upcoming_shows
+      } for venue in venues]
+    })
+  return data
+
+@bp.route('/venues/search', methods=['POST'])
 def search_venues():
   # seach for Hop should return "The Musical Hop".
   # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-  now_time = datetime.now()
   search_term = request.form.get('search_term', '')
-  search_res = db.session.query(Venue.id, Venue.name).filter(Venue.name.ilike(f'%{search_term}%'))
-  data = list()
-  for venue in search_res.all():
-    data.append({
-      'id': venue.id,
-      'name': venue.name,
-      'num_upcoming_shows': Show.query.filter(Show.venue_id==venue.id, Show.start_time >= now_time).count()
-    })
-  res = {'count': search_res.count(), 'data': data}
+  res = search_by_name(Venue, search_term, genre_mask=get_genre_mask(), **get_search_page())
   return render_template('pages/search_venues.html', results=res, search_term=search_term)
 
-@app.route('/artists_and_venues/search', methods=['POST'])
+def get_search_page() -> dict:
+  """
+  Read the requested result page from the search form
+  """
+  page = max(request.values.get('page', 1, type=int), 1)
+  per_page = request.values.get('per_page', current_app.config['SEARCH_RESULTS_PER_PAGE'], type=int)
+  per_page = min(max(per_page, 1), current_app.config['SEARCH_RESULTS_PER_PAGE'])
+  return {'page': page, 'per_page': per_page}
+
+def get_genre_mask() -> int:
+  """
+  Bitmask of the ?genre= filters of the request, 0 when there are none.
+  Several genres select the rows having all of them.
+  """
+  try:
+    return to_genre_mask(request.values.getlist('genre'))
+  except ValueError as e:
+    flash(str(e))
+    return 0
+
+def search_by_name(model, search_term, page=1, per_page=None, genre_mask=0) -> dict:
+  """
+  Search `model` by name through the configured search backend, most relevant first
+  """
+  match = get_search_backend().match(model, search_term)
+  if match.ids is None:
+    criterion = and_(match.criterion, model.has_genres(genre_mask)) if genre_mask else match.criterion
+    return search_with_upcoming_counts(model, criterion, page, per_page, order_by=match.order_by)
+
+  matched = match.ids
+  if genre_mask:
+    matched = filter_genres(matched, db.session.execute(genre_ids_query(model, genre_mask)).all())
+
+  # the backend already ranked every match, only the requested page goes to the database
+  ids = page_ids(matched, page, per_page)
+  res = search_with_upcoming_counts(model, model.id.in_(ids))
+  return rank_results(res, ids, len(matched), page, per_page)
+
+def genre_ids_query(model, genre_mask):
+  return db.select(model.id).where(model.has_genres(genre_mask))
+
+def filter_genres(matched, genre_rows) -> list:
+  # filter before paging so that pages and counts only cover rows of the genres
+  with_genres = {id for id, in genre_rows}
+  return [entity_id for entity_id in matched if entity_id in with_genres]
+
+def page_ids(matched, page, per_page) -> list:
+  return matched if per_page is None else matched[(page - 1) * per_page:page * per_page]
+
+def rank_results(res, ids, count, page, per_page) -> dict:
+  """
+  Put the results of a page of backend-ranked `ids` back in rank order
+  """
+  position = {entity_id: i for i, entity_id in enumerate(ids)}
+  res['data'].sort(key=lambda row: position[row['id']])
+  res.update({'count': count, 'page': page, 'per_page': per_page})
+  return res
+
+def search_with_upcoming_counts(model, criterion, page=1, per_page=None, order_by=None) -> dict:
+  """
+  Search `model` rows matching `criterion` with their upcoming show counts in a single
+  query. When paging, the total number of matches comes from a window count over the
+  same query instead of a second COUNT(*) round-trip.
+  """
+  rows = upcoming_counts_query(model, criterion, page, per_page, order_by).all()
+  count = None
+  if per_page is not None and not rows and page > 1:
+    # paged past the end, there is no row to read the window count from
+    count = db.session.execute(match_count_query(model, criterion)).scalar()
+  return upcoming_counts_result(rows, page, per_page, count)
+
+def upcoming_counts_query(model, criterion, page=1, per_page=None, order_by=None):
+  query = db.session.query(model.id, model.name, model.upcoming_show_count.label('num_upcoming_shows')) \
+    .filter(criterion) \
+    .order_by(*(order_by or [model.name]), model.id)
+  if per_page is not None:
+    query = query.add_columns(func.count().over().label('total')) \
+      .limit(per_page) \
+      .offset((page - 1) * per_page)
+  return query
+
+def match_count_query(model, criterion):
+  return db.select(func.count(model.id)).where(criterion)
+
+def upcoming_counts_result(rows, page, per_page, count=None) -> dict:
+  if count is None:
+    count = len(rows) if per_page is None else (rows[0].total if rows else 0)
+  data = [{
+    'id': row.id,
+    'name': row.name,
+    'num_upcoming_shows': row.num_upcoming_shows
+  } for row in rows]
+  return {'count': count, 'data': data, 'page': page, 'per_page': per_page}
+
+@bp.route('/artists_and_venues/search', methods=['POST'])
 def search_by_city_and_state():
   # Searching by "San Francisco, CA" should return all artists or venues in San Francisco, CA"
 
-  # get city and state
   search_term = request.form.get('search_term', '')
-  splitted = search_term.split(',')
-
-  data = list()
-  if len(splitted) == 2:
-    city, state = splitted[0].strip(), splitted[1].strip()
-
-    # search venues
-    venues = db.session.query(Venue.id, Venue.name).filter(Venue.city.ilike(f'{city}'), Venue.state.ilike(f'{state}'))
-    for venue in venues.all():
-      data.append({
-        'venue_id': venue.id,
-        'venue_name': venue.name,
-      })
-    
-    # search artists
-    artists = db.session.query(Artist.id, Artist.name).filter(Artist.city.ilike(f'{city}'), Artist.state.ilike(f'{state}'))
-    for artist in artists.all():
-      data.append({
-        'artist_id': artist.id,
-        'artist_name': artist.name,
-      })
-  res = {'count': len(data), 'data': data}
+  res = search_city_and_state(search_term, get_genre_mask())
   return render_template('pages/search_by_city_and_state.html', results=res, search_term=search_term)
 
-@app.route('/venues/<int:venue_id>')
+def search_city_and_state(search_term, genre_mask=0) -> dict:
+  """
+  Venues and artists located in the "City, State" of `search_term`
+  """
+  queries = city_and_state_queries(search_term, genre_mask)
+  if queries is None:
+    return city_and_state_result([], [])
+  venues, artists = queries
+  return city_and_state_result(venues.all(), artists.all())
+
+def city_and_state_queries(search_term, genre_mask=0):
+  """
+  (venues query, artists query) of the "City, State" of `search_term`, None if it is not one
+  """
+  # get city and state
+  splitted = search_term.split(',')
+  if len(splitted) != 2:
+    return None
+  city, state = splitted[0].strip(), splitted[1].strip()
+
+  queries = list()
+  for model in (Venue, Artist):
+    query = db.session.query(model.id, model.name) \
+      .filter(func.lower(model.city) == city.lower(), func.lower(model.state) == state.lower())
+    if genre_mask:
+      query = query.filter(model.has_genres(genre_mask))
+    queries.append(query)
+  return queries
+
+def city_and_state_result(venues, artists) -> dict:
+  data = [{'venue_id': venue.id, 'venue_name': venue.name} for venue in venues]
+  data += [{'artist_id': artist.id, 'artist_name': artist.name} for artist in artists]
+  return {'count': len(data), 'data': data}
+
+@bp.route('/venues/<int:venue_id>')
 def show_venue(venue_id):
   # shows the venue page with the given venue_id
-  venue = Venue.query.get(venue_id)
-  upcoming_shows = db.session.query(Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), Show.start_time) \
-    .join(Artist) \
-    .filter(Show.venue_id==venue_id, Show.start_time >= datetime.now())
-  past_shows = db.session.query(Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), Show.start_time) \
+  return render_venue(venue_id, cached(f'venue:{venue_id}', lambda: get_venue_data(venue_id)))
+
+def render_venue(venue_id, venue_data):
+  if venue_data is None:
+    flash(f'Venue ID {venue_id} does not exist')
+    return render_template('pages/home.html', recent=get_recent_items().items())
+
+  get_recent_items().add(('venue', venue_id), {'venue_id': venue_id, 'venue_name': venue_data['name']})
+
+  return render_template('pages/show_venue.html', venue=venue_data)
+
+def get_venue_data(venue_id) -> dict:
+  """
+  Assemble the venue page data, None if the venue does not exist
+  """
+  if current_app.config['DETAIL_EAGER_LOAD']:
+    # the venue, its shows and their artists in one round-trip
+    venue = db.session.get(Venue, venue_id, options=[joinedload(Venue.shows).joinedload(Show.artist)])
+    if venue is None:
+      return None
+    shows = [{
+      'artist_id': show.artist_id,
+      'artist_name': show.artist.name,
+      'artist_image_link': show.artist.image_link,
+      'start_time': show.start_time
+    } for show in venue.shows]
+  else:
+    venue = db.session.get(Venue, venue_id)
+    if venue is None:
+      return None
+    shows = [show._asdict() for show in venue_shows_query(venue_id)]
+  return venue_page(venue, shows)
+
+def venue_shows_query(venue_id):
+  return db.session.query(Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'), Show.start_time) \
     .join(Artist) \
-    .filter(Show.venue_id==venue_id, Show.start_time < datetime.now())
-  genres = list()
-  if venue.genres is not None:
-     genres = venue.genres.split(',')
-  venue_data = {
+    .filter(Show.venue_id==venue_id) \
+    .order_by(Show.start_time)
+
+def venue_page(venue, shows) -> dict:
+  """
+  Venue page data of a venue and its show dicts ordered by start_time
+  """
+  past_shows, upcoming_shows = split_shows(shows, datetime.now())
+
+  return {
     "id": venue.id,
     "name": venue.name,
-    "genres": genres,
+    "genres": venue.genres,
     "address": venue.address,
     "city": venue.city,
     "state": venue.state,
@@ -236,51 +539,60 @@ def show_venue(venue_id):
     "image_link": venue.image_link,
     "past_shows": past_shows,
     "upcoming_shows": upcoming_shows,
-    "past_shows_count": past_shows.count(),
-    "upcoming_shows_count": upcoming_shows.count(),
+    "past_shows_count": len(past_shows),
+    "upcoming_shows_count": len(upcoming_shows),
   }
 
-  # add to recent queries
-  rec = {'venue_id': venue_id, 'venue_name': venue.name}
-  if rec not in recent_queries:
-    recent_queries.append(rec)
-
-  return render_template('pages/show_venue.html', venue=venue_data)
+def split_shows(shows, now_time) -> tuple[list, list]:
+  """
+  Split shows ordered by start_time into (past, upcoming) at `now_time`
+  """
+  split = bisect_left([show['start_time'] for show in shows], now_time)
+  return shows[:split], shows[split:]
 
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@bp.route('/venues/create', methods=['GET'])
 def create_venue_form():
   form = VenueForm()
   return render_template('forms/new_venue.html', form=form)
 
-@app.route('/venues/create', methods=['POST'])
+@bp.route('/venues/create', methods=['POST'])
 def create_venue_submission():
   form = VenueForm(request.form)
   try:
     venue = Venue()
     form.populate_obj(venue)
-    venue.genres = ','.join(form.genres.data)
     db.session.add(venue)
     db.session.commit()
+    index_entity(Venue, venue)
+    get_cache().delete_prefix('venues:')
     flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  except Exception as e:
-     print(e)
+  except Exception:
+     current_app.logger.exception('Venue could not be created', extra={'venue_name': form.name.data})
      flash('An error occurred. Venue could not be created.')
      db.session.rollback()
   finally:
      db.session.close()
-  return render_template('pages/home.html', recent=recent_queries)
+  return render_template('pages/home.html', recent=get_recent_items().items())
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@bp.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
   try:
-    venue = Venue.query.get(venue_id)
+    venue = db.session.get(Venue, int(venue_id))
+    artist_ids = [artist_id for artist_id, in
+                  db.session.query(Show.artist_id).filter(Show.venue_id == venue.id).distinct()]
     db.session.delete(venue)
+    db.session.flush()
+    # its shows are gone from the counts of the artists that played there
+    refresh_upcoming_shows(Artist, artist_ids)
     db.session.commit()
-  except Exception as e:
-    print(e)
+    invalidate_venue(int(venue_id), artist_ids)
+    remove_entity(Venue, int(venue_id))
+    get_recent_items().discard(('venue', int(venue_id)))
+  except Exception:
+    current_app.logger.exception('Venue could not be deleted')
     flash('An error occurred.')
     db.session.rollback()
   finally:
@@ -289,53 +601,80 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@bp.route('/artists')
 def artists():
-  return render_template('pages/artists.html', artists=Artist.query.order_by('name').all())
+  genre_mask = get_genre_mask()
+  artists = cached(f'artists:{genre_mask}', lambda: get_artist_list(genre_mask))
+  return render_template('pages/artists.html', artists=artists)
+
+def get_artist_list(genre_mask=0) -> list[dict]:
+  query = db.session.query(Artist.id, Artist.name)
+  if genre_mask:
+    query = query.filter(Artist.has_genres(genre_mask))
+  return [artist._asdict() for artist in query.order_by(Artist.name)]
 
-@app.route('/artists/search', methods=['POST'])
+@bp.route('/artists/search', methods=['POST'])
 def search_artists():
-  now_time = datetime.now()
   search_term = request.form.get('search_term', '')
-  search_res = db.session.query(Artist.id, Artist.name).filter(Artist.name.ilike(f'%{search_term}%'))
-  data = list()
-  for artist in search_res.all():
-    data.append({
-      'id': artist.id,
-      'name': artist.name,
-      'num_upcoming_shows': Show.query.filter(Show.artist_id==artist.id, Show.start_time >= now_time).count()
-    })
-  res = {'count': search_res.count(), 'data': data}
+  res = search_by_name(Artist, search_term, genre_mask=get_genre_mask(), **get_search_page())
 
   return render_template('pages/search_artists.html', results=res, search_term=search_term)
 
-@app.route('/artists/<int:artist_id>')
+@bp.route('/artists/<int:artist_id>')
 def show_artist(artist_id):
-  now_time = datetime.now()
-  artist = Artist.query.get(artist_id)
-  if artist is None:
+  return render_artist(artist_id, cached(f'artist:{artist_id}', lambda: get_artist_data(artist_id)))
+
+def render_artist(artist_id, artist_data):
+  if artist_data is None:
     flash(f'Artist ID {artist_id} does not exist')
-    return render_template('pages/home.html', recent=recent_queries)
-  
-  upcoming_shows = db.session.query(Venue.id.label('venue_id'), Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'), Show.start_time) \
-    .join(Show) \
-    .filter(Show.artist_id==artist_id, Show.start_time >= now_time)
-  past_shows = db.session.query(Venue.id.label('venue_id'), Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'), Show.start_time) \
+    return render_template('pages/home.html', recent=get_recent_items().items())
+
+  get_recent_items().add(('artist', artist_id), {'artist_id': artist_id, 'artist_name': artist_data['name']})
+
+  return render_template('pages/show_artist.html', artist=artist_data)
+
+def get_artist_data(artist_id) -> dict:
+  """
+  Assemble the artist page data, None if the artist does not exist
+  """
+  if current_app.config['DETAIL_EAGER_LOAD']:
+    # the artist, its shows and their venues in one round-trip
+    artist = db.session.get(Artist, artist_id, options=[joinedload(Artist.shows).joinedload(Show.venue),
+                                                        selectinload(Artist.availabilities)])
+    if artist is None:
+      return None
+    shows = [{
+      'venue_id': show.venue_id,
+      'venue_name': show.venue.name,
+      'venue_image_link': show.venue.image_link,
+      'start_time': show.start_time
+    } for show in artist.shows]
+  else:
+    artist = db.session.get(Artist, artist_id)
+    if artist is None:
+      return None
+    shows = [show._asdict() for show in artist_shows_query(artist_id)]
+  return artist_page(artist, shows, artist.availabilities)
+
+def artist_shows_query(artist_id):
+  return db.session.query(Venue.id.label('venue_id'), Venue.name.label('venue_name'), Venue.image_link.label('venue_image_link'), Show.start_time) \
     .join(Show) \
-    .filter(Show.artist_id==artist_id, Show.start_time < now_time)
-  
-  # populate genres
-  genres = list()
-  if artist.genres is not None:
-     genres = artist.genres.split(',')
-  
+    .filter(Show.artist_id==artist_id) \
+    .order_by(Show.start_time)
+
+def artist_page(artist, shows, availabilities) -> dict:
+  """
+  Artist page data of an artist, its show dicts ordered by start_time and its availability windows
+  """
+  past_shows, upcoming_shows = split_shows(shows, datetime.now())
+
   # populate availability list
-  availability_list = get_availability_list(artist.availability)
+  availability_list = get_availability_list(availabilities)
 
-  artist_data = {
+  return {
     "id": artist.id,
     "name": artist.name,
-    "genres": genres,
+    "genres": artist.genres,
     "city": artist.city,
     "state": artist.state,
     "phone": artist.phone,
@@ -343,155 +682,289 @@ def show_artist(artist_id):
     "seeking_description": artist.seeking_description,
     "image_link": artist.image_link,
     "upcoming_shows": upcoming_shows,
-    "upcoming_shows_count": upcoming_shows.count(),
+    "upcoming_shows_count": len(upcoming_shows),
     "past_shows": past_shows,
-    "past_shows_count": past_shows.count(),
+    "past_shows_count": len(past_shows),
     "availability": availability_list,
     "website_link": artist.website_link,
     "facebook_link": artist.facebook_link
   }
 
-  # add to recent queries
-  rec = {'artist_id': artist_id, 'artist_name': artist.name}
-  if rec not in recent_queries:
-    recent_queries.append(rec)
-
-  return render_template('pages/show_artist.html', artist=artist_data)
-
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
   try:
     artist = Artist.query.get(artist_id)
     form = ArtistForm(obj=artist)
-    availability_list = get_availability_list(artist.availability)
-
-    if artist.genres is not None:
-      form.genres.data = artist.genres.split(',')
+    availability_list = get_availability_list(artist.availabilities)
 
     return render_template('forms/edit_artist.html', form=form, artist=artist, availability_list=availability_list)
   
   except Exception as e:
-    print(e)
+    current_app.logger.exception('Artist could not be loaded for editing')
     flash(f'An error occurred: {e}')
-    return render_template('pages/home.html', recent=recent_queries)
+    return render_template('pages/home.html', recent=get_recent_items().items())
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
   # artist record with ID <artist_id> using the new attributes
   try:
     form = ArtistForm(request.form)
     artist = Artist.query.get(artist_id)
     form.populate_obj(artist)
-    
-    artist.genres = ','.join(form.genres.data)
 
-    # serialize availability list
+    # replace availability windows
     start_times = request.form.getlist('availabilities[][start_time]')
     end_times = request.form.getlist('availabilities[][end_time]')
-    artist.availability = ','.join([f'{start_time};{end_time}' for start_time, end_time in zip(start_times, end_times)])
+    availability_list = [{'start_time': start_time, 'end_time': end_time}
+                         for start_time, end_time in zip(start_times, end_times)]
+    try:
+      availabilities = [Availability(start_time=datetime.fromisoformat(a['start_time']),
+                                     end_time=datetime.fromisoformat(a['end_time'])) for a in availability_list]
+    except ValueError as e:
+      flash(f'Invalid availability: {e}')
+      return render_template('forms/edit_artist.html', form=form, artist=artist, availability_list=availability_list)
+    for a in availabilities:
+      if a.end_time < a.start_time:
+        flash(f'Invalid availability: {a.start_time} is after {a.end_time}')
+        return render_template('forms/edit_artist.html', form=form, artist=artist, availability_list=availability_list)
+    artist.availabilities = availabilities
+    artist.updated_at = utcnow()
 
     if not form.validate_on_submit():
       flash_form_errors(form)
-      return render_template('forms/edit_artist.html', form=form, artist=artist, availability_list=get_availability_list(artist.availability))
+      return render_template('forms/edit_artist.html', form=form, artist=artist, availability_list=availability_list)
 
     db.session.commit()
+    index_entity(Artist, artist)
+    invalidate_artist(artist_id)
     flash(f'Artist {artist.name} was successfully updated!')
-  except Exception as e:
-    print(e)
+  except Exception:
+    current_app.logger.exception('Artist could not be updated')
     flash('An error occurred. Artist could not be updated.')
     db.session.rollback()
   finally:
     db.session.close()  
 
-  return redirect(url_for('show_artist', artist_id=artist_id))
+  return redirect(url_for('.show_artist', artist_id=artist_id))
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
   try:
     venue = Venue.query.get(venue_id)
     form = VenueForm(obj=venue)
-    if venue.genres is not None:
-      form.genres.data = venue.genres.split(',')
-  except Exception as e:
-     print(e)
+  except Exception:
+     current_app.logger.exception('Venue could not be loaded for editing')
      flash('An error occurred.')
 
   return render_template('forms/edit_venue.html', form=form, venue=venue)
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
   try:
     form = VenueForm(request.form)
     venue = Venue.query.get(venue_id)
     form.populate_obj(venue)
-    venue.genres = ','.join(form.genres.data)
 
     if not form.validate_on_submit():
       flash_form_errors(form)
       return render_template('forms/edit_venue.html', form=form, venue=venue)
 
     db.session.commit()
+    index_entity(Venue, venue)
+    invalidate_venue(venue_id)
     flash('Venue ' + request.form['name'] + ' was successfully updated!')
-  except Exception as e:
-    print(e)
+  except Exception:
+    current_app.logger.exception('Venue could not be updated')
     flash('An error occurred. Venue could not be updated.')
     db.session.rollback()
   finally:
     db.session.close()
 
-  return redirect(url_for('show_venue', venue_id=venue_id))
+  return redirect(url_for('.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
-@app.route('/artists/create', methods=['GET'])
+@bp.route('/artists/create', methods=['GET'])
 def create_artist_form():
   form = ArtistForm()
   return render_template('forms/new_artist.html', form=form)
 
-@app.route('/artists/create', methods=['POST'])
+@bp.route('/artists/create', methods=['POST'])
 def create_artist_submission():
   form = ArtistForm(request.form)
   try:
     artist = Artist()
     form.populate_obj(artist)
-    artist.genres = ','.join(form.genres.data)
     db.session.add(artist)
     db.session.commit()
+    index_entity(Artist, artist)
+    get_cache().delete_prefix('artists:')
     flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  except Exception as e:
-     print(e)
+  except Exception:
+     current_app.logger.exception('Artist could not be created', extra={'artist_name': form.name.data})
      flash('An error occurred. Artist could not be listed.')
      db.session.rollback()
   finally:
      db.session.close()
 
-  return render_template('pages/home.html', recent=recent_queries)
+  return render_template('pages/home.html', recent=get_recent_items().items())
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@bp.route('/shows')
 def shows():
-  # displays list of shows at /shows
-  shows = db.session.query(Show.venue_id, 
-                           Venue.name.label('venue_name'), 
-                           Show.artist_id, 
+  # displays list of shows at /shows, one keyset page at a time
+  filters = get_show_filters()
+  shows = show_listing_query(**filters)
+
+  if request.args.get('stream', 0, type=int):
+    # render every matching show while rows are fetched from a server-side cursor
+    shows = shows.yield_per(current_app.config['SHOWS_STREAM_CHUNK_SIZE'])
+    response = Response(stream_template('pages/shows.html', shows=shows, filters=filters, next_cursor=None))
+    # the dates are formatted after the headers are sent
+    response.vary.add('Accept-Language')
+    # the rows are fetched after the teardown removed the session of the query, its connection
+    # goes back to the pool once the server closes the response
+    response.call_on_close(shows.session.close)
+    return response
+
+  after = get_show_cursor()
+  page = cached(f'shows:{request.query_string.decode()}', lambda: get_shows_page(shows, after))
+  return render_template('pages/shows.html', shows=page['shows'], filters=filters, next_cursor=page['next_cursor'])
+
+def get_show_cursor():
+  """
+  Keyset cursor of the requested show listing page, None for the first page
+  """
+  cursor = request.args.get('after')
+  if cursor:
+    try:
+      return decode_show_cursor(cursor)
+    except ValueError:
+      flash(f'Invalid page cursor: {cursor}')
+  return None
+
+def get_shows_page(shows, after=None) -> dict:
+  """
+  Fetch the page of the show listing query following the `after` keyset cursor
+  """
+  return shows_page_result(shows_page_query(shows, after).all())
+
+def shows_page_query(shows, after=None):
+  if after is not None:
+    shows = shows.filter(tuple_(Show.start_time, Show.venue_id, Show.artist_id) > after)
+  # one more row tells whether there is a next page
+  return shows.limit(current_app.config['SHOWS_PER_PAGE'] + 1)
+
+def shows_page_result(shows) -> dict:
+  per_page = current_app.config['SHOWS_PER_PAGE']
+  next_cursor = None
+  if len(shows) > per_page:
+    shows = shows[:per_page]
+    next_cursor = encode_show_cursor(shows[-1])
+  return {'shows': [show._asdict() for show in shows], 'next_cursor': next_cursor}
+
+def get_show_filters(strict=False) -> dict:
+  """
+  Read the upcoming/date range filters of the show listing from the query string.
+  Invalid dates are flashed and ignored, or raise ValueError when `strict`.
+  """
+  filters = {'upcoming': bool(request.args.get('upcoming', 0, type=int))}
+  for name in ('start', 'end'):
+    value = request.args.get(name)
+    if value:
+      try:
+        filters[name] = datetime.fromisoformat(value)
+      except ValueError:
+        if strict:
+          raise ValueError(f'Invalid {name} date: {value}')
+        flash(f'Invalid {name} date: {value}')
+  return filters
+
+def show_listing_query(upcoming=False, start=None, end=None, venue_id=None, artist_id=None):
+  """
+  Shows joined to their venue and artist, in (start_time, venue_id, artist_id) order
+  """
+  query = db.session.query(Show.venue_id,
+                           Venue.name.label('venue_name'),
+                           Show.artist_id,
                            Artist.name.label('artist_name'),
                            Artist.image_link.label('artist_image_link'),
-                           Show.start_time).join(Venue).join(Artist).all()
-  
-  return render_template('pages/shows.html', shows=shows)
+                           Show.start_time).join(Venue).join(Artist)
+  if upcoming:
+    query = query.filter(Show.start_time >= datetime.now())
+  if start is not None:
+    query = query.filter(Show.start_time >= start)
+  if end is not None:
+    query = query.filter(Show.start_time < end)
+  if venue_id is not None:
+    query = query.filter(Show.venue_id == venue_id)
+  if artist_id is not None:
+    query = query.filter(Show.artist_id == artist_id)
+  return query.order_by(Show.start_time, Show.venue_id, Show.artist_id)
+
+def encode_show_cursor(show) -> str:
+  key = f'{show.start_time.isoformat()}|{show.venue_id}|{show.artist_id}'
+  return base64.urlsafe_b64encode(key.encode()).decode()
+
+def decode_show_cursor(cursor) -> tuple:
+  try:
+    start_time, venue_id, artist_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+  except (binascii.Error, UnicodeDecodeError):
+    raise ValueError(cursor)
+  return datetime.fromisoformat(start_time), int(venue_id), int(artist_id)
+
+#  Export
+#  ----------------------------------------------------------------
+
+@bp.route('/shows/export.<any(csv, jsonl, ics):format>')
+def export_shows(format):
+  return export_response(format, show_listing_query(**get_show_filters()), 'shows')
+
+@bp.route('/venues/<int:venue_id>/shows.<any(csv, jsonl, ics):format>')
+def export_venue_shows(venue_id, format):
+  return export_response(format, show_listing_query(venue_id=venue_id), f'venue-{venue_id}-shows')
+
+@bp.route('/artists/<int:artist_id>/shows.<any(csv, jsonl, ics):format>')
+def export_artist_shows(artist_id, format):
+  return export_response(format, show_listing_query(artist_id=artist_id), f'artist-{artist_id}-shows')
+
+@bp.route('/venues/export.<any(csv, jsonl):format>')
+def export_venues(format):
+  return export_response(format, export_entities_query(Venue), 'venues')
 
-@app.route('/shows/create')
+@bp.route('/artists/export.<any(csv, jsonl):format>')
+def export_artists(format):
+  return export_response(format, export_entities_query(Artist), 'artists')
+
+def export_entities_query(model):
+  """
+  Every column of every row of `model`, by id
+  """
+  return db.session.query(*model.__table__.columns).order_by(model.id)
+
+def export_response(format, query, filename):
+  """
+  Stream `query` as a file download while its rows are fetched
+  """
+  chunks = encode(format, query, timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES']))
+  response = Response(stream_with_context(chunks), mimetype=MIMETYPES[format],
+                      headers={'Content-Disposition': f'attachment; filename={filename}.{format}'})
+  # as for streamed show listings, the query outlives the session teardown
+  response.call_on_close(query.session.close)
+  return response
+
+@bp.route('/shows/create')
 def create_shows():
   # renders form. do not touch.
   form = ShowForm()
   return render_template('forms/new_show.html', form=form)
 
-@app.route('/shows/create', methods=['POST'])
+@bp.route('/shows/create', methods=['POST'])
 def create_show_submission():
   form = ShowForm(request.form)
   try:
@@ -505,52 +978,405 @@ def create_show_submission():
       return render_template('forms/new_show.html', form=form)
     
     # check artist availability
-    availability_list = get_availability_list(artist.availability)
-    available = False
-    for a in availability_list:
-      if datetime.fromisoformat(a['start_time']) <= show.start_time <= datetime.fromisoformat(a['end_time']):
-        available = True
-        break
-    
-    if not available:
+    if show.start_time not in get_availability_index([artist.id])[artist.id]:
       flash('The artist is not available at this time!')
       return render_template('forms/new_show.html', form=form)
 
+    # check double bookings of the artist and the venue
+    conflicts = find_show_conflicts([(int(show.venue_id), artist.id, show.start_time)])[0]
+    if conflicts:
+      for conflict in conflicts:
+        flash(conflict)
+      return render_template('forms/new_show.html', form=form)
+
     db.session.add(show)
+    db.session.flush()
+    refresh_upcoming_shows(Venue, [int(show.venue_id)])
+    refresh_upcoming_shows(Artist, [artist.id])
     db.session.commit()
+    invalidate_show(show.venue_id, show.artist_id)
     flash('Show was successfully listed!')
   except Exception as e:
-     print(e)
+     current_app.logger.exception('Show could not be created',
+                                  extra={'venue_id': form.venue_id.data, 'artist_id': form.artist_id.data})
      flash(f'An error occurred: {e}')
      db.session.rollback()
   finally:
      db.session.close()
 
-  return render_template('pages/home.html', recent=recent_queries)
+  return render_template('pages/home.html', recent=get_recent_items().items())
+
+#  Async views
+#  ----------------------------------------------------------------
+# With ASYNC_VIEWS the read-heavy routes below replace their sync twins under
+# the same endpoints. They run the statements built by the sync data functions
+# on an asyncio engine, independent statements concurrently.
+
+def get_async_db():
+  """
+  Asyncio database of the app, created on first use
+  """
+  if 'async_db' not in current_app.extensions:
+    from aio import AsyncDatabase
+    current_app.extensions['async_db'] = AsyncDatabase(current_app.config['ASYNC_DATABASE_URI'] or
+                                               current_app.config['SQLALCHEMY_DATABASE_URI'],
+                                               current_app.config['DB_REPLICA_URLS'])
+  return current_app.extensions['async_db']
+
+async def cached_async(key, build):
+  """
+  cached() for an async `build`
+  """
+  cache = get_cache()
+  value = cache.get(key)
+  if value is MISSING:
+    value = await build()
+    if value is not None:
+      cache.set(key, value)
+  return value
+
+async def venues_async():
+  genre_mask = get_genre_mask()
+
+  async def build():
+    return group_venue_areas(await get_async_db().all(venue_areas_query(genre_mask).statement))
+  areas = await cached_async(f'venues:{genre_mask}', build)
+  return render_template('pages/venues.html', areas=areas)
+
+async def show_venue_async(venue_id):
+  return render_venue(venue_id, await cached_async(f'venue:{venue_id}', lambda: get_venue_data_async(venue_id)))
+
+async def get_venue_data_async(venue_id) -> dict:
+  """
+  get_venue_data() with the venue and its shows loaded concurrently
+  """
+  import asyncio
+  adb = get_async_db()
+  venue, shows = await asyncio.gather(adb.get(Venue, venue_id), adb.all(venue_shows_query(venue_id).statement))
+  if venue is None:
+    return None
+  return venue_page(venue, [show._asdict() for show in shows])
+
+async def show_artist_async(artist_id):
+  return render_artist(artist_id, await cached_async(f'artist:{artist_id}', lambda: get_artist_data_async(artist_id)))
+
+async def get_artist_data_async(artist_id) -> dict:
+  """
+  get_artist_data() with the artist, its shows and its availability loaded concurrently
+  """
+  import asyncio
+  adb = get_async_db()
+  availabilities = db.select(Availability.start_time, Availability.end_time) \
+    .where(Availability.artist_id == artist_id) \
+    .order_by(Availability.start_time)
+  artist, shows, availabilities = await asyncio.gather(
+    adb.get(Artist, artist_id), adb.all(artist_shows_query(artist_id).statement), adb.all(availabilities))
+  if artist is None:
+    return None
+  return artist_page(artist, [show._asdict() for show in shows], availabilities)
+
+async def shows_async():
+  if request.args.get('stream', 0, type=int):
+    # streaming reads a server-side cursor of the sync engine
+    return shows()
+  filters = get_show_filters()
+  query = shows_page_query(show_listing_query(**filters), get_show_cursor())
+
+  async def build():
+    return shows_page_result(await get_async_db().all(query.statement))
+  page = await cached_async(f'shows:{request.query_string.decode()}', build)
+  return render_template('pages/shows.html', shows=page['shows'], filters=filters, next_cursor=page['next_cursor'])
+
+async def search_venues_async():
+  search_term = request.form.get('search_term', '')
+  res = await search_by_name_async(Venue, search_term, genre_mask=get_genre_mask(), **get_search_page())
+  return render_template('pages/search_venues.html', results=res, search_term=search_term)
+
+async def search_artists_async():
+  search_term = request.form.get('search_term', '')
+  res = await search_by_name_async(Artist, search_term, genre_mask=get_genre_mask(), **get_search_page())
+  return render_template('pages/search_artists.html', results=res, search_term=search_term)
+
+async def search_by_name_async(model, search_term, page=1, per_page=None, genre_mask=0) -> dict:
+  match = get_search_backend().match(model, search_term)
+  if match.ids is None:
+    criterion = and_(match.criterion, model.has_genres(genre_mask)) if genre_mask else match.criterion
+    return await search_with_upcoming_counts_async(model, criterion, page, per_page, order_by=match.order_by)
+
+  matched = match.ids
+  if genre_mask:
+    matched = filter_genres(matched, await get_async_db().all(genre_ids_query(model, genre_mask)))
+  ids = page_ids(matched, page, per_page)
+  res = await search_with_upcoming_counts_async(model, model.id.in_(ids))
+  return rank_results(res, ids, len(matched), page, per_page)
+
+async def search_with_upcoming_counts_async(model, criterion, page=1, per_page=None, order_by=None) -> dict:
+  adb = get_async_db()
+  rows = await adb.all(upcoming_counts_query(model, criterion, page, per_page, order_by).statement)
+  count = None
+  if per_page is not None and not rows and page > 1:
+    count = await adb.scalar(match_count_query(model, criterion))
+  return upcoming_counts_result(rows, page, per_page, count)
+
+async def search_by_city_and_state_async():
+  search_term = request.form.get('search_term', '')
+  queries = city_and_state_queries(search_term, get_genre_mask())
+  if queries is None:
+    res = city_and_state_result([], [])
+  else:
+    # venue and artist matches concurrently
+    res = city_and_state_result(*await get_async_db().gather(*(query.statement for query in queries)))
+  return render_template('pages/search_by_city_and_state.html', results=res, search_term=search_term)
 
-@app.errorhandler(404)
+# endpoint: async view, swapped in by create_app()
+ASYNC_VIEWS = {
+  'venues': venues_async,
+  'show_venue': show_venue_async,
+  'show_artist': show_artist_async,
+  'shows': shows_async,
+  'search_venues': search_venues_async,
+  'search_artists': search_artists_async,
+  'search_by_city_and_state': search_by_city_and_state_async,
+}
+
+#  API
+#  ----------------------------------------------------------------
+
+def table_version(*models, now_time=None) -> tuple:
+  """
+  (last modification, validators) of whole tables in one query: the latest
+  updated_at and the row count of each model, counts catching deletions, and
+  the start of the last show started by `now_time`, which moves shows from
+  upcoming to past. The last modification is always None: deletions leave no
+  timestamp, so only the validators tell whether the data changed.
+  """
+  columns = list()
+  for model in models:
+    columns += [db.select(func.max(model.updated_at)).scalar_subquery(),
+                db.select(func.count()).select_from(model).scalar_subquery()]
+  if now_time is not None:
+    columns.append(db.select(func.max(Show.start_time)).where(Show.start_time <= now_time).scalar_subquery())
+  return None, tuple(db.session.execute(db.select(*columns)).one())
+
+def entity_version(model, entity_id, show_fk, related, related_fk, now_time) -> tuple:
+  """
+  (last modification, validators) of a venue or artist page: its own updated_at,
+  the latest updated_at and count of its shows, the latest updated_at of the
+  artists or venues of these shows and its last show started by `now_time`.
+  As for whole tables the last modification is None, deleted shows leave no
+  timestamp. None when the entity does not exist.
+  """
+  row = tuple(db.session.execute(db.select(
+    db.select(model.updated_at).where(model.id == entity_id).scalar_subquery(),
+    db.select(func.max(Show.updated_at)).where(show_fk == entity_id).scalar_subquery(),
+    db.select(func.count()).select_from(Show).where(show_fk == entity_id).scalar_subquery(),
+    db.select(func.max(related.updated_at)).select_from(related).join(Show, related_fk == related.id)
+      .where(show_fk == entity_id).scalar_subquery(),
+    db.select(func.max(Show.start_time)).where(show_fk == entity_id, Show.start_time <= now_time).scalar_subquery(),
+  )).one())
+  if row[0] is None:
+    return None
+  return None, row
+
+def get_api_genre_mask() -> int:
+  try:
+    return to_genre_mask(request.args.getlist('genre'))
+  except ValueError as e:
+    raise ApiError(str(e))
+
+@bp.route('/api/v1/venues')
+def api_venues():
+  genre_mask = get_api_genre_mask()
+  return conditional_json(table_version(Venue), lambda: {'data': get_venue_areas(genre_mask)}, get_cache())
+
+@bp.route('/api/v1/venues/<int:venue_id>')
+def api_venue(venue_id):
+  version = entity_version(Venue, venue_id, Show.venue_id, Artist, Show.artist_id, datetime.now())
+  if version is None:
+    raise ApiError(f'Venue ID {venue_id} does not exist', 404)
+  return conditional_json(version, lambda: get_venue_data(venue_id), get_cache())
+
+@bp.route('/api/v1/venues/search')
+def api_search_venues():
+  search_term = request.args.get('search_term', '')
+  genre_mask = get_api_genre_mask()
+  page = get_search_page()
+  # upcoming show counts are columns of the rows, refreshing them bumps updated_at
+  return conditional_json(table_version(Venue),
+                          lambda: search_by_name(Venue, search_term, genre_mask=genre_mask, **page), get_cache())
+
+@bp.route('/api/v1/artists')
+def api_artists():
+  genre_mask = get_api_genre_mask()
+  return conditional_json(table_version(Artist), lambda: {'data': get_artist_list(genre_mask)}, get_cache())
+
+@bp.route('/api/v1/artists/<int:artist_id>')
+def api_artist(artist_id):
+  version = entity_version(Artist, artist_id, Show.artist_id, Venue, Show.venue_id, datetime.now())
+  if version is None:
+    raise ApiError(f'Artist ID {artist_id} does not exist', 404)
+  return conditional_json(version, lambda: get_artist_data(artist_id), get_cache())
+
+@bp.route('/api/v1/artists/search')
+def api_search_artists():
+  search_term = request.args.get('search_term', '')
+  genre_mask = get_api_genre_mask()
+  page = get_search_page()
+  # upcoming show counts are columns of the rows, refreshing them bumps updated_at
+  return conditional_json(table_version(Artist),
+                          lambda: search_by_name(Artist, search_term, genre_mask=genre_mask, **page), get_cache())
+
+@bp.route('/api/v1/artists_and_venues/search')
+def api_search_by_city_and_state():
+  search_term = request.args.get('search_term', '')
+  genre_mask = get_api_genre_mask()
+  return conditional_json(table_version(Venue, Artist),
+                          lambda: search_city_and_state(search_term, genre_mask), get_cache())
+
+def get_nearby_args() -> dict:
+  """
+  Origin, radius and result count of a nearby search, from the lat and lng or the
+  "City, ST" `near` arguments
+  """
+  config = current_app.config
+  near = request.args.get('near')
+  if near is not None:
+    origin = gazetteer.parse(near)
+    if origin is None:
+      raise ApiError(f'Unknown place: {near}, expected "City, ST"')
+  else:
+    try:
+      origin = float(request.args['lat']), float(request.args['lng'])
+    except KeyError:
+      raise ApiError('Give either near or both lat and lng')
+    except ValueError:
+      raise ApiError('lat and lng must be numbers')
+    if not (-90 <= origin[0] <= 90 and -180 <= origin[1] <= 180):
+      raise ApiError('lat must be within -90 and 90, lng within -180 and 180')
+  radius_km = request.args.get('radius_km', float(config['GEO_DEFAULT_RADIUS_KM']), type=float)
+  if math.isnan(radius_km):
+    raise ApiError('radius_km must be a number')
+  radius_km = min(max(radius_km, 0), config['GEO_MAX_RADIUS_KM'])
+  limit = request.args.get('limit', config['GEO_DEFAULT_RESULTS'], type=int)
+  limit = min(max(limit, 1), config['GEO_MAX_RESULTS'])
+  return {'lat': origin[0], 'lng': origin[1], 'radius_km': radius_km, 'limit': limit}
+
+def search_nearby(model, lat, lng, radius_km, limit) -> dict:
+  """
+  The `limit` nearest `model` rows within `radius_km` of (lat, lng), nearest first
+  """
+  nearest = get_geo_backend().nearby(model, lat, lng, radius_km, limit)
+  rows = db.session.query(model.id, model.name, model.city, model.state, model.upcoming_show_count) \
+    .filter(model.id.in_([entity_id for entity_id, _ in nearest]))
+  rows = {row.id: row for row in rows}
+  data = [{
+    'id': entity_id,
+    'name': rows[entity_id].name,
+    'city': rows[entity_id].city,
+    'state': rows[entity_id].state,
+    'distance_km': round(distance, 3),
+    'num_upcoming_shows': rows[entity_id].upcoming_show_count,
+  } for entity_id, distance in nearest if entity_id in rows]
+  return {'count': len(data), 'data': data, 'origin': {'lat': lat, 'lng': lng}, 'radius_km': radius_km}
+
+@bp.route('/api/v1/venues/nearby')
+def api_venues_nearby():
+  args = get_nearby_args()
+  # coordinates rarely repeat, bodies are not worth caching
+  return conditional_json(table_version(Venue), lambda: search_nearby(Venue, **args))
+
+@bp.route('/api/v1/artists/nearby')
+def api_artists_nearby():
+  args = get_nearby_args()
+  return conditional_json(table_version(Artist), lambda: search_nearby(Artist, **args))
+
+@bp.route('/api/v1/autocomplete')
+def api_autocomplete():
+  # served from memory, the search boxes request it as the user types
+  config = current_app.config
+  limit = request.args.get('limit', config['AUTOCOMPLETE_RESULTS'], type=int)
+  limit = min(max(limit, 1), config['AUTOCOMPLETE_MAX_RESULTS'])
+  return jsonify(get_autocomplete().complete(request.args.get('q', ''), limit))
+
+@bp.route('/api/v1/shows')
+def api_shows():
+  now = datetime.now()
+  try:
+    filters = get_show_filters(strict=True)
+  except ValueError as e:
+    raise ApiError(str(e))
+  after = None
+  cursor = request.args.get('after')
+  if cursor:
+    try:
+      after = decode_show_cursor(cursor)
+    except ValueError:
+      raise ApiError(f'Invalid page cursor: {cursor}')
+  return conditional_json(table_version(Show, Venue, Artist, now_time=now),
+                          lambda: get_shows_page(show_listing_query(**filters), after), get_cache())
+
+@bp.errorhandler(ApiError)
+def api_error(error):
+  return jsonify({'error': error.message}), error.status
+
+#  Upcoming show counts
+#  ----------------------------------------------------------------
+
+upcoming_cli = AppGroup('upcoming', help='Maintain the upcoming show counts of venues and artists.')
+
+@upcoming_cli.command('roll-forward')
+@click.option('--every', type=int, default=None,
+              help='Keep running, every this many seconds (default: once, e.g. from cron).')
+def roll_forward_command(every):
+  """Recount the venues and artists whose next show has started."""
+  while True:
+    updated = roll_forward_upcoming_shows()
+    db.session.commit()
+    if updated:
+      # only reaches the caches of other processes with the shared redis backend
+      get_cache().delete_prefix('venues:')
+    click.echo(f'{updated} venues and artists recounted')
+    if every is None:
+      return
+    time.sleep(every)
+
+@upcoming_cli.command('refresh')
+def refresh_command():
+  """Recount the upcoming shows of every venue and artist."""
+  refresh_upcoming_shows(Venue)
+  refresh_upcoming_shows(Artist)
+  db.session.commit()
+  get_cache().delete_prefix('venues:')
+  click.echo('Upcoming show counts refreshed')
+
+#  Metrics
+#  ----------------------------------------------------------------
+
+@bp.route('/metrics/cache')
+def cache_metrics():
+  return jsonify(get_cache().info())
+
+@bp.route('/metrics')
+def route_metrics():
+  instrumentation = current_app.extensions.get('instrumentation')
+  return jsonify(instrumentation.metrics() if instrumentation is not None else {})
+
+@bp.route('/metrics/pool')
+def pool_metrics():
+  return jsonify({name: metrics.to_dict() for name, metrics in current_app.extensions['pool_metrics'].items()})
+
+@bp.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
-@app.errorhandler(500)
+@bp.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
@@ -0,0 +1,226 @@
+#----------------------------------------------------------------------------#
+# Static asset pipeline.
+#
+#   flask assets build
+#
+# Bundles and minifies the app's own CSS and JS, copies the vendor files the
+# layout loads, and writes every file to static/dist/ under a name carrying a
+# hash of its content, with .gz and .br (when brotli is installed) copies and
+# a manifest.json mapping source names to built ones. Templates link assets
+# with asset_url(); built files are served precompressed with immutable
+# caching, as a new content always gets a new name. Without a build,
+# asset_url() falls back to the source files, bundles being concatenated on
+# request.
+#----------------------------------------------------------------------------#
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import shutil
+
+import click
+from flask import Response, current_app, request, send_from_directory, url_for
+from flask.cli import AppGroup
+
+try:
+  import brotli
+except ImportError:
+  brotli = None
+
+# built name: source files, in load order, relative to the static folder
+BUNDLES = {
+  'css/app.css': ['css/layout.main.css', 'css/main.css', 'css/main.responsive.css', 'css/main.quickfix.css'],
+  'js/app.js': ['js/plugins.js', 'js/script.js'],
+}
+
+# vendor files, already minified, fingerprinted as they are
+COPIES = (
+  'css/bootstrap.min.css',
+  'js/libs/bootstrap-3.1.1.min.js',
+  'js/libs/jquery-1.11.1.min.js',
+  'js/libs/modernizr-2.8.2.min.js',
+  'js/libs/moment.min.js',
+  'js/libs/respond-1.4.2.min.js',
+)
+
+# precompressed variants, by preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# characters of the content hash in built names
+HASH_LENGTH = 12
+
+DIST = 'dist'
+
+assets_cli = AppGroup('assets', help='Build the fingerprinted and precompressed static assets.')
+
+
+def minify_css(css) -> str:
+  """
+  Drop comments and the whitespace CSS does not need
+  """
+  css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+  css = re.sub(r'\s+', ' ', css)
+  css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+  # a space before a colon may be a descendant combinator, as in `div :hover`
+  css = re.sub(r':\s+', ':', css)
+  return css.replace(';}', '}').strip()
+
+
+def minify_js(js) -> str:
+  """
+  Minify with rjsmin when installed, otherwise only drop comment lines and indentation
+  """
+  try:
+    import rjsmin
+  except ImportError:
+    lines = (line.strip() for line in js.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+  return rjsmin.jsmin(js)
+
+
+def rebase_urls(css, source) -> str:
+  """
+  Make the relative url()s of the CSS file `source` absolute, it is served from another folder
+  """
+  base = posixpath.dirname(posixpath.join(current_app.static_url_path, source))
+
+  def rebase(match):
+    url = match.group(2)
+    if url.startswith(('/', 'data:', 'http:', 'https:', '#')):
+      return match.group(0)
+    return f'url({match.group(1)}{posixpath.normpath(posixpath.join(base, url))}{match.group(1)})'
+  return re.sub(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)', rebase, css)
+
+
+def read_static(name) -> str:
+  with open(os.path.join(current_app.static_folder, name), encoding='utf-8') as f:
+    return f.read()
+
+
+def bundle_source(name) -> str:
+  """
+  Unminified concatenation of the sources of the bundle `name`
+  """
+  parts = list()
+  for source in BUNDLES[name]:
+    text = read_static(source)
+    parts.append(rebase_urls(text, source) if name.endswith('.css') else text)
+  # a newline and, for scripts, a semicolon keep the files apart
+  return ('\n' if name.endswith('.css') else ';\n').join(parts)
+
+
+def fingerprint(name, content) -> str:
+  root, ext = posixpath.splitext(name)
+  return f'{root}.{hashlib.sha256(content).hexdigest()[:HASH_LENGTH]}{ext}'
+
+
+def write_asset(dist, name, content) -> str:
+  """
+  Write `content` and its compressed variants under the fingerprinted `name`
+  """
+  built = fingerprint(name, content)
+  path = os.path.join(dist, built)
+  os.makedirs(os.path.dirname(path), exist_ok=True)
+  with open(path, 'wb') as f:
+    f.write(content)
+  with open(path + '.gz', 'wb') as f:
+    f.write(gzip.compress(content, compresslevel=9, mtime=0))
+  if brotli is not None:
+    with open(path + '.br', 'wb') as f:
+      f.write(brotli.compress(content, quality=11))
+  return built
+
+
+def build(dist) -> dict:
+  """
+  Rebuild `dist` from the sources, returns the manifest
+  """
+  shutil.rmtree(dist, ignore_errors=True)
+  os.makedirs(dist)
+  manifest = dict()
+  for name in BUNDLES:
+    source = bundle_source(name)
+    minified = minify_css(source) if name.endswith('.css') else minify_js(source)
+    manifest[name] = write_asset(dist, name, minified.encode())
+  for name in COPIES:
+    content = read_static(name)
+    if name.endswith('.css'):
+      content = rebase_urls(content, name)
+    manifest[name] = write_asset(dist, name, content.encode())
+  with open(os.path.join(dist, 'manifest.json'), 'w') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+  return manifest
+
+
+@assets_cli.command('build')
+def build_command():
+  """Bundle, minify, fingerprint and precompress the static assets."""
+  dist = os.path.join(current_app.static_folder, DIST)
+  manifest = build(dist)
+  for name, built in manifest.items():
+    size = os.path.getsize(os.path.join(dist, built))
+    gz = os.path.getsize(os.path.join(dist, built + '.gz'))
+    click.echo(f'{name} -> {DIST}/{built} ({size} bytes, {gz} gzipped)')
+  if brotli is None:
+    click.echo('brotli is not installed, no .br files written (pip install brotli)')
+
+
+class Assets:
+  """
+  Manifest lookups and the view serving built assets
+  """
+
+  def __init__(self, app):
+    self.app = app
+    self.dist = os.path.join(app.static_folder, DIST)
+    self.manifest = None
+    self.manifest_mtime = None
+    app.add_url_rule(f'{app.static_url_path}/{DIST}/<path:filename>', 'asset', self.serve)
+    app.add_template_global(self.url, 'asset_url')
+
+  def get_manifest(self) -> dict:
+    # reread after `flask assets build`, one stat per lookup
+    path = os.path.join(self.dist, 'manifest.json')
+    try:
+      mtime = os.stat(path).st_mtime
+    except OSError:
+      return dict()
+    if mtime != self.manifest_mtime:
+      with open(path) as f:
+        self.manifest, self.manifest_mtime = json.load(f), mtime
+    return self.manifest
+
+  def url(self, name) -> str:
+    """
+    url_for() of a static file, its built version when there is one
+    """
+    built = self.get_manifest().get(name)
+    if built is not None or name in BUNDLES:
+      return url_for('asset', filename=built or name)
+    return url_for('static', filename=name)
+
+  def serve(self, filename):
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    # built names change with their content, browsers never have to revalidate them
+    max_age = None if filename == 'manifest.json' else self.app.config['ASSETS_MAX_AGE']
+    if filename in BUNDLES and not os.path.exists(os.path.join(self.dist, filename)):
+      # not built, the sources as they are
+      response = Response(bundle_source(filename), mimetype=mimetype)
+      response.cache_control.no_cache = True
+      return response
+
+    for encoding, suffix in ENCODINGS:
+      if request.accept_encodings[encoding] and os.path.exists(os.path.join(self.dist, filename + suffix)):
+        response = send_from_directory(self.dist, filename + suffix, mimetype=mimetype, max_age=max_age)
+        response.content_encoding = encoding
+        break
+    else:
+      response = send_from_directory(self.dist, filename, mimetype=mimetype, max_age=max_age)
+    response.vary.add('Accept-Encoding')
+    if max_age is not None:
+      response.cache_control.immutable = True
+    return response
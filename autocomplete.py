@@ -0,0 +1,222 @@
+#----------------------------------------------------------------------------#
+# Autocomplete.
+#
+# Completions of the search boxes, served from memory: the venue and artist
+# names with a word starting with the typed prefix, and the "City, ST" areas
+# starting with it. Each process loads its index on first use, and the
+# create/edit/delete handlers keep it current, so completing a keystroke runs
+# no query.
+#----------------------------------------------------------------------------#
+
+import bisect
+import threading
+from collections import Counter
+
+
+def normalize(text) -> str:
+  return ' '.join((text or '').lower().split())
+
+
+class PrefixIndex:
+  """
+  Sorted array of (key, value) pairs: the pairs whose key starts with a prefix
+  are one slice of it, found by binary search
+  """
+
+  def __init__(self, pairs=()):
+    self.pairs = sorted(pairs)
+
+  def add(self, key, value):
+    bisect.insort(self.pairs, (key, value))
+
+  def discard(self, key, value):
+    i = bisect.bisect_left(self.pairs, (key, value))
+    if i < len(self.pairs) and self.pairs[i] == (key, value):
+      del self.pairs[i]
+
+  def prefixed(self, prefix):
+    """
+    Yield the (key, value) pairs whose key starts with `prefix`, in key order
+    """
+    # (prefix,) sorts before every (prefix..., value)
+    i = bisect.bisect_left(self.pairs, (prefix,))
+    while i < len(self.pairs) and self.pairs[i][0].startswith(prefix):
+      yield self.pairs[i]
+      i += 1
+
+
+class NameCompleter:
+  """
+  Names of one model by id. Names starting with the prefix come first, then the
+  names with a later word starting with it, each in alphabetical order.
+  """
+
+  def __init__(self, rows=()):
+    self.names = dict()
+    starts, words = list(), list()
+    for entity_id, name in rows:
+      self.names[entity_id] = name
+      start, *later = self.keys(name)
+      starts.append((start, entity_id))
+      words += [(key, entity_id) for key in later]
+    self.starts = PrefixIndex(starts)
+    self.words = PrefixIndex(words)
+
+  @staticmethod
+  def keys(name) -> list[str]:
+    # the name from each of its words on, so that prefixes can span several words
+    words = (name or '').lower().split() or ['']
+    return [' '.join(words[i:]) for i in range(len(words))]
+
+  def add(self, entity_id, name):
+    self.discard(entity_id)
+    self.names[entity_id] = name
+    start, *later = self.keys(name)
+    self.starts.add(start, entity_id)
+    for key in later:
+      self.words.add(key, entity_id)
+
+  def discard(self, entity_id):
+    name = self.names.pop(entity_id, None)
+    if name is None:
+      return
+    start, *later = self.keys(name)
+    self.starts.discard(start, entity_id)
+    for key in later:
+      self.words.discard(key, entity_id)
+
+  def complete(self, prefix, limit) -> list[dict]:
+    found = dict()
+    for index in (self.starts, self.words):
+      for _, entity_id in index.prefixed(prefix):
+        if len(found) >= limit:
+          break
+        found.setdefault(entity_id, self.names[entity_id])
+    return [{'id': entity_id, 'name': name} for entity_id, name in found.items()]
+
+
+class AreaCompleter:
+  """
+  "City, ST" of the venues and artists, the areas having the most of them first
+  """
+
+  def __init__(self, rows=()):
+    # (model, id) to the key of its area
+    self.areas = dict()
+    self.counts = Counter()
+    self.labels = dict()
+    # rows share few distinct places, each is normalized once
+    areas = dict()
+    for entity, city, state in rows:
+      if (city, state) not in areas:
+        areas[(city, state)] = self.area(city, state)
+      if areas[(city, state)] is not None:
+        key, label = areas[(city, state)]
+        self.areas[entity] = key
+        self.counts[key] += 1
+        # labelled as first spelled
+        self.labels.setdefault(key, label)
+    self.index = PrefixIndex(self.labels.items())
+
+  @staticmethod
+  def area(city, state):
+    """
+    (key, "City, ST" label) of an area, None without both city and state
+    """
+    if not city or not state:
+      return None
+    label = f'{city.strip()}, {state.strip()}'
+    return normalize(label), label
+
+  def add(self, entity, city, state):
+    self.discard(entity)
+    area = self.area(city, state)
+    if area is None:
+      return
+    key, label = area
+    self.areas[entity] = key
+    self.counts[key] += 1
+    if key not in self.labels:
+      self.labels[key] = label
+      self.index.add(key, label)
+
+  def discard(self, entity):
+    key = self.areas.pop(entity, None)
+    if key is None:
+      return
+    self.counts[key] -= 1
+    if not self.counts[key]:
+      del self.counts[key]
+      self.index.discard(key, self.labels.pop(key))
+
+  def complete(self, prefix, limit) -> list[str]:
+    found = sorted(self.index.prefixed(prefix), key=lambda pair: (-self.counts[pair[0]], pair[0]))
+    return [label for _, label in found[:limit]]
+
+
+class Autocomplete:
+  """
+  Completions of the names of `models` and of their areas.
+
+  Like the n-gram search index, it is loaded from the database on first use,
+  kept current through index()/remove(), and only sees the rows written by
+  another process after a reset().
+  """
+
+  def __init__(self, db, models):
+    self.db = db
+    self.models = models
+    self.names = None
+    self.areas = None
+    self.lock = threading.Lock()
+
+  def load(self):
+    if self.names is not None:
+      return
+    rows = {model: self.db.session.query(model.id, model.name, model.city, model.state).all()
+            for model in self.models}
+    with self.lock:
+      if self.names is None:
+        self.areas = AreaCompleter(((model, entity_id), city, state)
+                                   for model, model_rows in rows.items() for entity_id, _, city, state in model_rows)
+        self.names = {model: NameCompleter((entity_id, name) for entity_id, name, _, _ in model_rows)
+                      for model, model_rows in rows.items()}
+
+  def complete(self, prefix, limit) -> dict:
+    """
+    Up to `limit` completions of `prefix` of each model, under its lower-cased
+    plural table name, and of the areas
+    """
+    self.load()
+    prefix = normalize(prefix)
+    results = {f'{model.__tablename__.lower()}s': [] for model in self.models}
+    results['areas'] = []
+    if not prefix:
+      return results
+    with self.lock:
+      for model, names in self.names.items():
+        results[f'{model.__tablename__.lower()}s'] = names.complete(prefix, limit)
+      results['areas'] = self.areas.complete(prefix, limit)
+    return results
+
+  def index(self, model, entity_id, name, city, state):
+    """
+    Called after an entity was created or edited
+    """
+    with self.lock:
+      if self.names is not None:
+        self.names[model].add(entity_id, name)
+        self.areas.add((model, entity_id), city, state)
+
+  def remove(self, model, entity_id):
+    """
+    Called after an entity was deleted
+    """
+    with self.lock:
+      if self.names is not None:
+        self.names[model].discard(entity_id)
+        self.areas.discard((model, entity_id))
+
+  def reset(self):
+    with self.lock:
+      self.names = self.areas = None
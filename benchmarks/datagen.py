@@ -0,0 +1,251 @@
+"""
+Generate a seeded synthetic dataset: venues and artists spread over US cities
+weighted by size, genres weighted by popularity, shows concentrated on the
+busiest venues and artists at evening times over the past three years and
+the next one, and artist availability windows. Past and upcoming are
+relative to --now, by default the start of today, as the views compare the
+show times with the clock.
+
+Usage (from the repository root):
+  python -m benchmarks.datagen --venues 1000 --artists 5000 --shows 50000
+  python -m benchmarks.datagen --url postgresql://localhost/fyyur_bench --seed 7
+
+The target database is dropped and recreated, never point it at real data.
+The same seed, sizes and --now always produce the same rows, a whole day long
+with the default --now.
+"""
+
+import argparse
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import config
+from forms import GenreEnum, StateEnum
+
+# (city, state, relative weight), roughly the population of the metro area in millions
+PLACES = (
+  ('New York', 'NY', 19.8), ('Los Angeles', 'CA', 13.0), ('Chicago', 'IL', 9.4),
+  ('Dallas', 'TX', 7.6), ('Houston', 'TX', 7.1), ('Washington', 'DC', 6.3),
+  ('Philadelphia', 'PA', 6.2), ('Miami', 'FL', 6.1), ('Atlanta', 'GA', 6.1),
+  ('Boston', 'MA', 4.9), ('Phoenix', 'AZ', 4.8), ('San Francisco', 'CA', 4.7),
+  ('Detroit', 'MI', 4.3), ('Seattle', 'WA', 4.0), ('Minneapolis', 'MN', 3.7),
+  ('San Diego', 'CA', 3.3), ('Tampa', 'FL', 3.2), ('Denver', 'CO', 3.0),
+  ('Baltimore', 'MD', 2.8), ('St. Louis', 'MO', 2.8), ('Orlando', 'FL', 2.7),
+  ('Charlotte', 'NC', 2.7), ('Portland', 'OR', 2.5), ('Austin', 'TX', 2.4),
+  ('Pittsburgh', 'PA', 2.4), ('Las Vegas', 'NV', 2.3), ('Cincinnati', 'OH', 2.3),
+  ('Kansas City', 'MO', 2.2), ('Columbus', 'OH', 2.1), ('Nashville', 'TN', 2.0),
+  ('New Orleans', 'LA', 1.3), ('Memphis', 'TN', 1.3), ('Salt Lake City', 'UT', 1.3),
+)
+
+# share of venues and artists in small towns, spread over every state
+SMALL_TOWN_SHARE = 0.1
+SMALL_TOWNS = ('Springfield', 'Franklin', 'Greenville', 'Bristol', 'Clinton', 'Salem', 'Madison')
+
+# relative popularity of each genre, every GenreEnum member defaults to 1
+GENRE_WEIGHTS = {
+  'Rock n Roll': 10, 'Pop': 9, 'Hip-Hop': 8, 'Electronic': 6, 'Country': 6, 'Alternative': 5,
+  'R&B': 5, 'Jazz': 4, 'Folk': 3, 'Soul': 3, 'Punk': 3, 'Heavy Metal': 3,
+  'Blues': 2, 'Classical': 2, 'Reggae': 2, 'Funk': 2,
+}
+
+VENUE_WORDS = (('The', 'Old', 'Blue', 'Velvet', 'Golden', 'Red', 'Silver', 'Grand', 'Little', 'Iron'),
+               ('Lantern', 'Note', 'Owl', 'Anchor', 'Crown', 'Garden', 'Mill', 'Harbor', 'Fox', 'Star'),
+               ('Hall', 'Room', 'Club', 'Theater', 'Lounge', 'Ballroom', 'Tavern', 'Arena', 'Stage', 'Bar'))
+ARTIST_WORDS = (('Midnight', 'Electric', 'Wild', 'Quiet', 'Neon', 'Broken', 'Sunday', 'Lucky', 'Paper', 'Northern'),
+                ('Owls', 'Rivers', 'Hearts', 'Wolves', 'Lights', 'Sparrows', 'Kings', 'Ghosts', 'Echoes', 'Tides'))
+
+# show start hours and their weights, evenings mostly
+SHOW_HOURS = (17, 18, 19, 20, 21, 22, 23)
+SHOW_HOUR_WEIGHTS = (1, 3, 6, 8, 6, 3, 1)
+
+# share of shows in the year after `now`, the others are in the three years before
+UPCOMING_SHARE = 0.25
+
+# rows per INSERT statement
+CHUNK_SIZE = 10000
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--url', help='database url (default: SQLALCHEMY_DATABASE_URI)')
+  parser.add_argument('--venues', type=int, default=1000)
+  parser.add_argument('--artists', type=int, default=5000)
+  parser.add_argument('--shows', type=int, default=50000)
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--now', type=datetime.fromisoformat, default=None,
+                      help='date the shows are upcoming from (default: the start of today)')
+  return parser.parse_args()
+
+
+def today() -> datetime:
+  """
+  The start of the current day: the shows drawn after it are upcoming for the
+  app, and a seed draws the same rows all day
+  """
+  return datetime.combine(date.today(), datetime.min.time())
+
+
+def popularity_weights(n, skew=1.0) -> list[float]:
+  """
+  Zipf-like cumulative weights of n items: a few busy ones and a long tail
+  """
+  weights, total = list(), 0.0
+  for rank in range(n):
+    total += 1 / (rank + 1) ** skew
+    weights.append(total)
+  return weights
+
+
+class Generator:
+  """
+  Rows of the dataset, drawn from one seeded random generator
+  """
+
+  def __init__(self, seed=0, now=None):
+    self.rng = random.Random(seed)
+    self.now = now or today()
+    states = [e.value[0] for e in StateEnum]
+    unknown = {state for _, state, _ in PLACES} - set(states)
+    assert not unknown, f'Unknown states {unknown}'
+    self.places = [(city, state) for city, state, _ in PLACES]
+    self.place_weights = [weight for _, _, weight in PLACES]
+    self.small_towns = [(town, state) for town in SMALL_TOWNS for state in states]
+    self.genres = [e.value[0] for e in GenreEnum]
+    self.genre_weights = [GENRE_WEIGHTS.get(genre, 1) for genre in self.genres]
+
+  def place(self):
+    if self.rng.random() < SMALL_TOWN_SHARE:
+      return self.rng.choice(self.small_towns)
+    return self.rng.choices(self.places, self.place_weights)[0]
+
+  def genre_mask(self) -> int:
+    # one to three distinct genres, bit i for the i-th GenreEnum member
+    count = self.rng.choices((1, 2, 3), (6, 3, 1))[0]
+    indexes = {self.genres.index(genre) for genre in self.rng.choices(self.genres, self.genre_weights, k=count)}
+    return sum(1 << index for index in indexes)
+
+  def phone(self, i) -> str:
+    return f'{self.rng.randint(201, 989)}-555-{i % 10000:04d}'
+
+  def name(self, words) -> str:
+    return ' '.join(self.rng.choice(choices) for choices in words)
+
+  def venues(self, n) -> list[dict]:
+    rows = list()
+    for i in range(n):
+      city, state = self.place()
+      rows.append({
+        'name': self.name(VENUE_WORDS),
+        'city': city,
+        'state': state,
+        'address': f'{self.rng.randint(1, 9999)} {self.rng.choice(("Main", "Oak", "Market", "Broadway", "2nd"))} St',
+        'phone': self.phone(i),
+        'genre_mask': self.genre_mask(),
+        'seeking_talent': self.rng.random() < 0.3,
+        'seeking_description': None,
+      })
+    return rows
+
+  def artists(self, n) -> list[dict]:
+    rows = list()
+    for i in range(n):
+      city, state = self.place()
+      rows.append({
+        'name': self.name(ARTIST_WORDS),
+        'city': city,
+        'state': state,
+        'phone': self.phone(i),
+        'genre_mask': self.genre_mask(),
+        'seeking_venue': self.rng.random() < 0.4,
+        'seeking_description': None,
+      })
+    return rows
+
+  def start_time(self) -> datetime:
+    if self.rng.random() < UPCOMING_SHARE:
+      day = self.rng.randint(0, 364)
+    else:
+      day = -self.rng.randint(1, 3 * 365)
+    hour = self.rng.choices(SHOW_HOURS, SHOW_HOUR_WEIGHTS)[0]
+    return (self.now + timedelta(days=day)).replace(hour=hour, minute=self.rng.choice((0, 30)))
+
+  def shows(self, n, venues, artists) -> list[dict]:
+    """
+    `n` distinct shows, the busiest venues and artists playing the most
+    """
+    venue_weights = popularity_weights(venues, 0.8)
+    artist_weights = popularity_weights(artists, 0.6)
+    # popularity independent of ids, so id ranges do not pick the busiest rows
+    venue_ids = self.rng.sample(range(1, venues + 1), venues)
+    artist_ids = self.rng.sample(range(1, artists + 1), artists)
+    shows = set()
+    while len(shows) < n:
+      venue_id = self.rng.choices(venue_ids, cum_weights=venue_weights)[0]
+      artist_id = self.rng.choices(artist_ids, cum_weights=artist_weights)[0]
+      shows.add((venue_id, artist_id, self.start_time()))
+    return [{'venue_id': v, 'artist_id': a, 'start_time': t} for v, a, t in sorted(shows, key=lambda s: (s[2], s[0], s[1]))]
+
+  def availabilities(self, artists) -> list[dict]:
+    """
+    Zero to two upcoming windows of one week to two months per artist
+    """
+    rows = list()
+    for artist_id in range(1, artists + 1):
+      for _ in range(self.rng.choices((0, 1, 2), (2, 5, 3))[0]):
+        start_time = self.now + timedelta(days=self.rng.randint(0, 300))
+        rows.append({'artist_id': artist_id, 'start_time': start_time,
+                     'end_time': start_time + timedelta(days=self.rng.randint(7, 60))})
+    return rows
+
+
+def insert(db, model, rows):
+  for start in range(0, len(rows), CHUNK_SIZE):
+    db.session.execute(db.insert(model), rows[start:start + CHUNK_SIZE])
+
+
+def generate(venues, artists, shows, seed=0, now=None) -> dict:
+  """
+  Fill the empty tables of the current app with the dataset of these sizes,
+  ids 1..n. Returns the row counts.
+  """
+  from extensions import db
+  from geo import locate_all
+  from models import Artist, Availability, Show, Venue, refresh_upcoming_shows
+
+  generator = Generator(seed, now)
+  rows = {
+    Venue: generator.venues(venues),
+    Artist: generator.artists(artists),
+  }
+  rows[Show] = generator.shows(shows, venues, artists) if venues and artists else []
+  rows[Availability] = generator.availabilities(artists)
+  for model, model_rows in rows.items():
+    insert(db, model, model_rows)
+  refresh_upcoming_shows(Venue)
+  refresh_upcoming_shows(Artist)
+  locate_all(db, Venue)
+  locate_all(db, Artist)
+  db.session.commit()
+  return {model.__tablename__: len(model_rows) for model, model_rows in rows.items()}
+
+
+def main():
+  args = parse_args()
+  if args.url:
+    config.SQLALCHEMY_DATABASE_URI = args.url
+  from app import create_app
+  from extensions import db
+
+  with create_app().app_context():
+    db.drop_all()
+    db.create_all()
+    counts = generate(args.venues, args.artists, args.shows, args.seed, args.now)
+  print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+  main()
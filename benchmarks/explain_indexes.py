@@ -0,0 +1,148 @@
+"""
+Compare the query plans and timings of the hot query paths with and without
+their indexes, those of the hot path indexes migration and the keyset index of
+the show listing, on a generated dataset.
+
+Usage (from the repository root):
+  python -m benchmarks.explain_indexes --venues 5000 --artists 20000 --shows 200000
+  python -m benchmarks.explain_indexes --url postgresql://localhost/fyyur_bench --json plans.json
+
+The target database is dropped and recreated, never point it at real data.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+import config
+from benchmarks.datagen import PLACES, generate, today
+
+HOT_PATH_INDEXES = (
+  'ix_show_start_time_venue_artist',
+  'ix_show_artist_id_start_time',
+  'ix_show_venue_id_start_time',
+  'ix_venue_lower_city_lower_state',
+  'ix_artist_lower_city_lower_state',
+)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--url', help='database url (default: a temporary SQLite file)')
+  parser.add_argument('--venues', type=int, default=2000)
+  parser.add_argument('--artists', type=int, default=10000)
+  parser.add_argument('--shows', type=int, default=100000)
+  parser.add_argument('--repeat', type=int, default=20, help='timed runs per query')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--now', type=datetime.fromisoformat, default=None,
+                      help='date the shows are upcoming from (default: the start of today)')
+  parser.add_argument('--json', help='also write the results to this file')
+  return parser.parse_args()
+
+
+def hot_queries(db, Venue, Artist, Show, args):
+  from sqlalchemy import func
+  from app import show_listing_query, shows_page_query
+  now = args.now
+  artist_id, venue_id = args.artists // 2, args.venues // 2
+  city, state = (part.lower() for part in PLACES[0][:2])
+  return {
+    'show_artist upcoming shows': db.session.query(Show.venue_id, Show.start_time)
+      .filter(Show.artist_id == artist_id, Show.start_time >= now),
+    'show_venue upcoming shows': db.session.query(Show.artist_id, Show.start_time)
+      .filter(Show.venue_id == venue_id, Show.start_time >= now),
+    # the /shows pages: the first one, and one following a keyset cursor
+    'shows first page': shows_page_query(show_listing_query()),
+    'shows page after a cursor': shows_page_query(show_listing_query(), (now, venue_id, artist_id)),
+    'venues by city and state': db.session.query(Venue.id, Venue.name)
+      .filter(func.lower(Venue.city) == city, func.lower(Venue.state) == state),
+    'artists by city and state': db.session.query(Artist.id, Artist.name)
+      .filter(func.lower(Artist.city) == city, func.lower(Artist.state) == state),
+  }
+
+
+def explain(connection, query):
+  compiled = query.statement.compile(dialect=connection.dialect)
+  params = compiled.params
+  if connection.dialect.name == 'sqlite':
+    prefix = 'EXPLAIN QUERY PLAN '
+    params = tuple(str(params[key]) if isinstance(params[key], datetime) else params[key]
+                   for key in compiled.positiontup)
+  else:
+    prefix = 'EXPLAIN '
+  rows = connection.exec_driver_sql(prefix + str(compiled), params).all()
+  return [' '.join(str(column) for column in row) for row in rows]
+
+
+def measure(db, queries, repeat):
+  results = dict()
+  connection = db.session.connection()
+  for name, query in queries.items():
+    timings = list()
+    for _ in range(repeat):
+      started = time.perf_counter()
+      query.all()
+      timings.append((time.perf_counter() - started) * 1000)
+    results[name] = {'plan': explain(connection, query), 'median_ms': round(statistics.median(timings), 3)}
+  db.session.commit()
+  return results
+
+
+def analyze(db):
+  db.session.execute(db.text('ANALYZE'))
+  db.session.commit()
+
+
+def main():
+  args = parse_args()
+  # the queries look for shows upcoming from the date the dataset was drawn around
+  args.now = args.now or today()
+  config.SQLALCHEMY_DATABASE_URI = args.url or f'sqlite:///{tempfile.mkdtemp()}/explain_indexes.db'
+  from app import create_app
+  from extensions import db
+  from models import Artist, Show, Venue
+
+  with create_app().app_context():
+    db.drop_all()
+    db.create_all()
+    indexes = [index for table in db.metadata.tables.values() for index in table.indexes
+               if index.name in HOT_PATH_INDEXES]
+    for index in indexes:
+      index.drop(db.engine)
+
+    generate(args.venues, args.artists, args.shows, args.seed, args.now)
+    queries = hot_queries(db, Venue, Artist, Show, args)
+
+    analyze(db)
+    before = measure(db, queries, args.repeat)
+    for index in indexes:
+      index.create(db.engine)
+    analyze(db)
+    after = measure(db, queries, args.repeat)
+    dialect = db.engine.dialect.name
+
+  results = {
+    'database': dialect,
+    'rows': {'venues': args.venues, 'artists': args.artists, 'shows': args.shows},
+    'queries': {name: {'before': before[name], 'after': after[name]} for name in queries},
+  }
+  for name, result in results['queries'].items():
+    print(f'== {name}')
+    for label in ('before', 'after'):
+      print(f'  {label}: {result[label]["median_ms"]} ms')
+      for line in result[label]['plan']:
+        print(f'    {line}')
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,299 @@
+"""
+Drive every route of app.py through the Flask test client on generated
+datasets of several sizes, and report the latency percentiles, throughput
+and query count of each route.
+
+Usage (from the repository root):
+  python -m benchmarks.routes --sizes small,medium --json results.json
+  python -m benchmarks.routes --url postgresql://localhost/fyyur_bench --cold
+  python -m benchmarks.routes --json new.json --baseline old.json
+
+Requests run one after the other in one process, so throughput is that of a
+single worker. --cold clears the view cache before every request, to measure
+the queries rather than cache hits. With --baseline, routes whose p95 grew by
+more than --threshold are reported and the exit status is 1.
+
+The target database is dropped and recreated, never point it at real data.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, namedtuple
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from sqlalchemy.engine import Engine, make_url
+
+import config
+from benchmarks.datagen import PLACES, generate, today
+
+# venues, artists and shows of each dataset size
+SIZES = {
+  'small': (100, 500, 5000),
+  'medium': (1000, 5000, 50000),
+  'large': (5000, 20000, 200000),
+}
+
+# a route request: `url` and `data` are functions of the request number and
+# the dataset sizes, `share` scales the number of requests of slow routes
+Case = namedtuple('Case', 'label method rule url data share', defaults=(None, 1.0))
+
+# show creation requests book the last artist, available from SHOW_SLOTS_START on
+SHOW_SLOTS_START = datetime(2040, 1, 1)
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--url', help='database url (default: a temporary SQLite file)')
+  parser.add_argument('--sizes', default='small,medium', help=f'comma-separated sizes among {", ".join(SIZES)}')
+  parser.add_argument('--requests', type=int, default=50, help='timed requests per route')
+  parser.add_argument('--warmup', type=int, default=3, help='untimed requests per route')
+  parser.add_argument('--cold', action='store_true', help='clear the view cache before every request')
+  parser.add_argument('--seed', type=int, default=0)
+  parser.add_argument('--json', help='also write the results to this file')
+  parser.add_argument('--baseline', help='results of an earlier run to compare with')
+  parser.add_argument('--threshold', type=float, default=0.2, help='p95 growth reported as a regression')
+  return parser.parse_args()
+
+
+def venue_form(i):
+  city, state, _ = PLACES[i % len(PLACES)]
+  return {'name': f'Bench Venue {i}', 'city': city, 'state': state, 'address': f'{i} Main St',
+          'phone': '415-555-0100', 'genres': ['Jazz', 'Blues'], 'seeking_talent': 'y'}
+
+
+def artist_form(i):
+  city, state, _ = PLACES[i % len(PLACES)]
+  return {'name': f'Bench Artist {i}', 'city': city, 'state': state,
+          'phone': '415-555-0100', 'genres': ['Rock n Roll']}
+
+
+def route_cases() -> list[Case]:
+  city, state, _ = PLACES[0]
+  venue = lambda i, n: i % n['venues'] + 1
+  artist = lambda i, n: i % n['artists'] + 1
+  return [
+    Case('GET /', 'GET', '/', lambda i, n: '/'),
+    Case('GET /venues', 'GET', '/venues', lambda i, n: '/venues'),
+    Case('GET /venues?genre', 'GET', '/venues', lambda i, n: '/venues?genre=Jazz'),
+    Case('POST /venues/search', 'POST', '/venues/search', lambda i, n: '/venues/search',
+         lambda i, n: {'search_term': 'hall'}),
+    Case('POST /artists_and_venues/search', 'POST', '/artists_and_venues/search',
+         lambda i, n: '/artists_and_venues/search', lambda i, n: {'search_term': f'{city}, {state}'}),
+    Case('GET /venues/<id>', 'GET', '/venues/<int:venue_id>', lambda i, n: f'/venues/{venue(i, n)}'),
+    Case('GET /venues/create', 'GET', '/venues/create', lambda i, n: '/venues/create'),
+    Case('POST /venues/create', 'POST', '/venues/create', lambda i, n: '/venues/create',
+         lambda i, n: venue_form(i)),
+    Case('GET /artists', 'GET', '/artists', lambda i, n: '/artists'),
+    Case('POST /artists/search', 'POST', '/artists/search', lambda i, n: '/artists/search',
+         lambda i, n: {'search_term': 'owls'}),
+    Case('GET /artists/<id>', 'GET', '/artists/<int:artist_id>', lambda i, n: f'/artists/{artist(i, n)}'),
+    Case('GET /artists/<id>/edit', 'GET', '/artists/<int:artist_id>/edit',
+         lambda i, n: f'/artists/{artist(i, n)}/edit'),
+    Case('POST /artists/<id>/edit', 'POST', '/artists/<int:artist_id>/edit',
+         lambda i, n: f'/artists/{artist(i, n)}/edit', lambda i, n: artist_form(i)),
+    Case('GET /venues/<id>/edit', 'GET', '/venues/<int:venue_id>/edit',
+         lambda i, n: f'/venues/{venue(i, n)}/edit'),
+    Case('POST /venues/<id>/edit', 'POST', '/venues/<int:venue_id>/edit',
+         lambda i, n: f'/venues/{venue(i, n)}/edit', lambda i, n: venue_form(i)),
+    Case('GET /artists/create', 'GET', '/artists/create', lambda i, n: '/artists/create'),
+    Case('POST /artists/create', 'POST', '/artists/create', lambda i, n: '/artists/create',
+         lambda i, n: artist_form(i)),
+    Case('GET /shows', 'GET', '/shows', lambda i, n: '/shows'),
+    Case('GET /shows?upcoming', 'GET', '/shows', lambda i, n: '/shows?upcoming=1'),
+    Case('GET /shows?stream', 'GET', '/shows', lambda i, n: '/shows?stream=1', share=0.1),
+    Case('GET /shows/export.csv', 'GET', '/shows/export.<any(csv, jsonl, ics):format>',
+         lambda i, n: '/shows/export.csv', share=0.1),
+    Case('GET /venues/<id>/shows.ics', 'GET', '/venues/<int:venue_id>/shows.<any(csv, jsonl, ics):format>',
+         lambda i, n: f'/venues/{venue(i, n)}/shows.ics'),
+    Case('GET /artists/<id>/shows.jsonl', 'GET', '/artists/<int:artist_id>/shows.<any(csv, jsonl, ics):format>',
+         lambda i, n: f'/artists/{artist(i, n)}/shows.jsonl'),
+    Case('GET /venues/export.csv', 'GET', '/venues/export.<any(csv, jsonl):format>',
+         lambda i, n: '/venues/export.csv', share=0.1),
+    Case('GET /artists/export.jsonl', 'GET', '/artists/export.<any(csv, jsonl):format>',
+         lambda i, n: '/artists/export.jsonl', share=0.1),
+    Case('GET /shows/create', 'GET', '/shows/create', lambda i, n: '/shows/create'),
+    Case('POST /shows/create', 'POST', '/shows/create', lambda i, n: '/shows/create',
+         lambda i, n: {'venue_id': venue(i, n), 'artist_id': n['artists'],
+                       'start_time': (SHOW_SLOTS_START + timedelta(hours=3 * i)).strftime('%Y-%m-%d %H:%M:%S')}),
+    Case('GET /api/v1/venues', 'GET', '/api/v1/venues', lambda i, n: '/api/v1/venues'),
+    Case('GET /api/v1/venues/<id>', 'GET', '/api/v1/venues/<int:venue_id>',
+         lambda i, n: f'/api/v1/venues/{venue(i, n)}'),
+    Case('GET /api/v1/venues/search', 'GET', '/api/v1/venues/search',
+         lambda i, n: '/api/v1/venues/search?search_term=hall'),
+    Case('GET /api/v1/artists', 'GET', '/api/v1/artists', lambda i, n: '/api/v1/artists'),
+    Case('GET /api/v1/artists/<id>', 'GET', '/api/v1/artists/<int:artist_id>',
+         lambda i, n: f'/api/v1/artists/{artist(i, n)}'),
+    Case('GET /api/v1/artists/search', 'GET', '/api/v1/artists/search',
+         lambda i, n: '/api/v1/artists/search?search_term=owls'),
+    Case('GET /api/v1/artists_and_venues/search', 'GET', '/api/v1/artists_and_venues/search',
+         lambda i, n: f'/api/v1/artists_and_venues/search?search_term={city}, {state}'),
+    Case('GET /api/v1/venues/nearby', 'GET', '/api/v1/venues/nearby',
+         lambda i, n: f'/api/v1/venues/nearby?lat={40.7 + i % 50 / 100}&lng={-74.0 - i % 30 / 100}'),
+    Case('GET /api/v1/artists/nearby', 'GET', '/api/v1/artists/nearby',
+         lambda i, n: f'/api/v1/artists/nearby?near={city}, {state}&radius_km=200&limit=50'),
+    Case('GET /api/v1/autocomplete', 'GET', '/api/v1/autocomplete',
+         lambda i, n: f'/api/v1/autocomplete?q={("b", "bl", "blu", "blue", "blue l")[i % 5]}'),
+    Case('GET /api/v1/shows', 'GET', '/api/v1/shows', lambda i, n: '/api/v1/shows?upcoming=1'),
+    Case('GET /metrics', 'GET', '/metrics', lambda i, n: '/metrics'),
+    Case('GET /metrics/cache', 'GET', '/metrics/cache', lambda i, n: '/metrics/cache'),
+    Case('GET /metrics/pool', 'GET', '/metrics/pool', lambda i, n: '/metrics/pool'),
+    # last, it deletes the venues with the highest ids
+    Case('DELETE /venues/<id>', 'DELETE', '/venues/<venue_id>', lambda i, n: f'/venues/{n["venues"] - i}'),
+  ]
+
+
+def uncovered_routes(app, cases) -> list[str]:
+  routes = {f'{method} {rule.rule}' for rule in app.url_map.iter_rules() if rule.endpoint not in ('static', 'asset')
+            for method in rule.methods - {'HEAD', 'OPTIONS'}}
+  return sorted(routes - {f'{case.method} {case.rule}' for case in cases})
+
+
+def percentile(values, p):
+  """
+  Nearest-rank percentile of sorted `values`
+  """
+  return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def summarize(timings, queries, statuses) -> dict:
+  timings = sorted(timings)
+  return {
+    'requests': len(timings),
+    'p50_ms': round(percentile(timings, 50), 3),
+    'p95_ms': round(percentile(timings, 95), 3),
+    'p99_ms': round(percentile(timings, 99), 3),
+    'mean_ms': round(sum(timings) / len(timings), 3),
+    'rps': round(len(timings) / (sum(timings) / 1000), 1),
+    'queries': round(sum(queries) / len(queries), 2),
+    'statuses': dict(sorted(Counter(statuses).items())),
+  }
+
+
+def run_case(app, client, case, sizes, args) -> dict:
+  from app import get_cache
+  from querycount import QueryCounter
+
+  requests = max(1, round(args.requests * case.share))
+  warmup = min(args.warmup, requests)
+  timings, queries, statuses = list(), list(), list()
+  for i in range(warmup + requests):
+    url = case.url(i, sizes)
+    data = case.data(i, sizes) if case.data else None
+    if args.cold:
+      with app.app_context():
+        get_cache().clear()
+    # every engine: the primary, the replicas and the asyncio engine of the async views
+    with QueryCounter(Engine) as counter:
+      started = time.perf_counter()
+      response = client.open(url, method=case.method, data=data)
+      response.get_data()
+      # as WSGI servers do, ends the app context of streamed responses and frees their connection
+      response.close()
+      elapsed = (time.perf_counter() - started) * 1000
+    if i >= warmup:
+      timings.append(elapsed)
+      queries.append(counter.count)
+      statuses.append(response.status_code)
+  return summarize(timings, queries, statuses)
+
+
+def run_size(app, db, name, args) -> dict:
+  from models import Availability
+
+  venues, artists, shows = SIZES[name]
+  with app.app_context():
+    db.drop_all()
+    db.create_all()
+    # around the start of today: the views compare the show times with the clock
+    rows = generate(venues, artists, shows, args.seed, today())
+    db.session.add(Availability(artist_id=artists, start_time=SHOW_SLOTS_START,
+                                end_time=SHOW_SLOTS_START + timedelta(days=3650)))
+    db.session.commit()
+  # per-process state built from the previous dataset
+  for extension in ('search', 'geo', 'autocomplete', 'cache', 'recent'):
+    app.extensions.pop(extension, None)
+
+  sizes = {'venues': venues, 'artists': artists, 'shows': shows}
+  client = app.test_client()
+  results = dict()
+  for case in route_cases():
+    stats = results[case.label] = run_case(app, client, case, sizes, args)
+    print(f'  {case.label:<40} p50 {stats["p50_ms"]:>9} ms  p95 {stats["p95_ms"]:>9} ms  p99 {stats["p99_ms"]:>9} ms  '
+          f'{stats["rps"]:>8} req/s  {stats["queries"]:>6} queries  {stats["statuses"]}')
+  return {'rows': rows, 'routes': results}
+
+
+def git_revision():
+  try:
+    return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                          check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+  except (OSError, subprocess.CalledProcessError):
+    return None
+
+
+def compare(results, baseline, threshold) -> list[str]:
+  """
+  Routes of both runs whose p95 grew by more than `threshold`
+  """
+  regressions = list()
+  for size, result in results['sizes'].items():
+    old_routes = baseline.get('sizes', {}).get(size, {}).get('routes', {})
+    for label, stats in result['routes'].items():
+      old = old_routes.get(label)
+      if old and old['p95_ms'] and stats['p95_ms'] > old['p95_ms'] * (1 + threshold):
+        regressions.append(f'{size} {label}: p95 {old["p95_ms"]} ms -> {stats["p95_ms"]} ms')
+  return regressions
+
+
+def main():
+  args = parse_args()
+  sizes = args.sizes.split(',')
+  unknown = set(sizes) - set(SIZES)
+  if unknown:
+    sys.exit(f'Unknown sizes: {", ".join(sorted(unknown))}')
+  config.SQLALCHEMY_DATABASE_URI = args.url or f'sqlite:///{tempfile.mkdtemp()}/routes.db'
+  config.WTF_CSRF_ENABLED = False
+  from app import create_app
+  from extensions import db
+  app = create_app()
+
+  cases = route_cases()
+  uncovered = uncovered_routes(app, cases)
+  if uncovered:
+    print(f'Routes without a benchmark case: {", ".join(uncovered)}')
+
+  results = {
+    'revision': git_revision(),
+    'time': datetime.now().isoformat(timespec='seconds'),
+    'python': platform.python_version(),
+    'database': make_url(config.SQLALCHEMY_DATABASE_URI).get_backend_name(),
+    'options': {'requests': args.requests, 'warmup': args.warmup, 'cold': args.cold, 'seed': args.seed},
+    'uncovered': uncovered,
+    'sizes': dict(),
+  }
+  for name in sizes:
+    print(f'== {name}: {SIZES[name][0]} venues, {SIZES[name][1]} artists, {SIZES[name][2]} shows')
+    results['sizes'][name] = run_size(app, db, name, args)
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(results, f, indent=2)
+  if args.baseline:
+    with open(args.baseline) as f:
+      regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+      print(f'REGRESSION {regression}')
+    if regressions:
+      sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
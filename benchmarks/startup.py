@@ -0,0 +1,143 @@
+"""
+Measure the boot time of a worker: a fresh interpreter importing app.py and
+calling create_app(), and break the import time down by package with
+`python -X importtime`.
+
+Usage (from the repository root):
+  python -m benchmarks.startup
+  python -m benchmarks.startup --runs 20 --budget 800 --json startup.json
+
+Every run is a new process, so nothing is warm but the OS file cache. The
+median boot time is checked against --budget: over it, the exit status is 1.
+The database is never connected to, a connection made while booting is
+reported as an error.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir)))
+
+from benchmarks.routes import git_revision, percentile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
+
+# median milliseconds from interpreter start to a ready app
+BUDGET_MS = 1000
+
+# run in each child, prints its timings as JSON
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+print(json.dumps({
+  'import_ms': (imported - started) * 1000,
+  'create_app_ms': (created - imported) * 1000,
+  'connections': sum(metrics.connects for metrics in flask_app.extensions['pool_metrics'].values()),
+  'modules': len(sys.modules),
+}))
+'''
+
+
+def parse_args():
+  parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument('--url', help='database url (default: DATABASE_URL, or a SQLite file never created)')
+  parser.add_argument('--runs', type=int, default=10, help='timed boots')
+  parser.add_argument('--budget', type=float, default=BUDGET_MS, help='median boot time limit in milliseconds')
+  parser.add_argument('--top', type=int, default=15, help='packages listed in the import time breakdown')
+  parser.add_argument('--json', help='also write the results to this file')
+  return parser.parse_args()
+
+
+def boot(env, importtime=False) -> tuple[dict, float, str]:
+  """
+  Boot the app in a new interpreter, returns its timings, the wall time in
+  milliseconds and the -X importtime report
+  """
+  command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+  started = time.perf_counter()
+  child = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+  wall_ms = (time.perf_counter() - started) * 1000
+  if child.returncode:
+    sys.exit(f'Boot failed:\n{child.stderr}')
+  return json.loads(child.stdout.splitlines()[-1]), wall_ms, child.stderr
+
+
+def import_breakdown(report) -> dict:
+  """
+  Self import time in milliseconds of each top-level package of an importtime report
+  """
+  packages = defaultdict(float)
+  for line in report.splitlines():
+    if not line.startswith('import time:') or 'imported package' in line:
+      continue
+    _, self_us, _, name = (field.strip() for field in line.replace('import time:', '|').split('|'))
+    packages[name.split('.')[0]] += int(self_us) / 1000
+  return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+
+def main():
+  args = parse_args()
+  env = dict(os.environ)
+  env['DATABASE_URL'] = args.url or env.get('DATABASE_URL') or f'sqlite:///{tempfile.mkdtemp()}/startup.db'
+  env.pop('PYTHONDONTWRITEBYTECODE', None)
+
+  # untimed, writes the bytecode caches
+  boot(env)
+  runs = [boot(env) for _ in range(args.runs)]
+  timings = [timing for timing, _, _ in runs]
+  walls = sorted(wall_ms for _, wall_ms, _ in runs)
+  imports = sorted(timing['import_ms'] for timing in timings)
+  creates = sorted(timing['create_app_ms'] for timing in timings)
+  _, _, report = boot(env, importtime=True)
+  packages = import_breakdown(report)
+  total_ms = sum(packages.values())
+
+  results = {
+    'revision': git_revision(),
+    'time': datetime.now().isoformat(timespec='seconds'),
+    'python': platform.python_version(),
+    'runs': args.runs,
+    'boot_ms': {'p50': round(percentile(walls, 50), 1), 'p95': round(percentile(walls, 95), 1)},
+    'import_ms': {'p50': round(percentile(imports, 50), 1), 'p95': round(percentile(imports, 95), 1)},
+    'create_app_ms': {'p50': round(percentile(creates, 50), 1), 'p95': round(percentile(creates, 95), 1)},
+    'modules': timings[0]['modules'],
+    'connections': max(timing['connections'] for timing in timings),
+    'packages_ms': {name: round(ms, 1) for name, ms in packages.items()},
+    'budget_ms': args.budget,
+  }
+
+  print(f'boot        p50 {results["boot_ms"]["p50"]:8.1f} ms   p95 {results["boot_ms"]["p95"]:8.1f} ms')
+  print(f'import app  p50 {results["import_ms"]["p50"]:8.1f} ms   p95 {results["import_ms"]["p95"]:8.1f} ms')
+  print(f'create_app  p50 {results["create_app_ms"]["p50"]:8.1f} ms   p95 {results["create_app_ms"]["p95"]:8.1f} ms')
+  print(f'{results["modules"]} modules loaded, import time by package (-X importtime, self time):')
+  for name, ms in list(packages.items())[:args.top]:
+    print(f'  {name:24} {ms:8.1f} ms {ms / total_ms:6.1%}')
+
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump(results, f, indent=2)
+  failures = list()
+  if results['connections']:
+    failures.append(f'{results["connections"]} database connections made while booting')
+  if results['boot_ms']['p50'] > args.budget:
+    failures.append(f'median boot time {results["boot_ms"]["p50"]} ms over the {args.budget:g} ms budget')
+  for failure in failures:
+    print(f'FAIL {failure}')
+  if failures:
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+  main()
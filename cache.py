@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------#
+# View data caches.
+#
+# Both backends store the assembled view dicts under string keys such as
+# 'venues:0', 'venue:3' or 'shows:upcoming=1', and are invalidated by the
+# create/edit/delete handlers through delete() and delete_prefix().
+#----------------------------------------------------------------------------#
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class CacheStats:
+  """
+  Hit/miss/eviction counters of a cache
+  """
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def incr(self, counter, n=1):
+    with self.lock:
+      setattr(self, counter, getattr(self, counter) + n)
+
+  def to_dict(self) -> dict:
+    with self.lock:
+      return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
+
+
+class LRUCache:
+  """
+  In-process cache bounded to `max_entries`, evicting the least recently used
+  entry first. Entries older than `ttl` seconds are treated as misses.
+  """
+
+  def __init__(self, max_entries=1024, ttl=60):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+    self.stats = CacheStats()
+
+  def get(self, key):
+    with self.lock:
+      entry = self.entries.get(key)
+      if entry is not None and entry[0] < time.monotonic():
+        del self.entries[key]
+        entry = None
+      if entry is None:
+        self.stats.incr('misses')
+        return MISSING
+      self.entries.move_to_end(key)
+    self.stats.incr('hits')
+    return entry[1]
+
+  def set(self, key, value):
+    with self.lock:
+      self.entries[key] = (time.monotonic() + self.ttl, value)
+      self.entries.move_to_end(key)
+      evicted = 0
+      while len(self.entries) > self.max_entries:
+        self.entries.popitem(last=False)
+        evicted += 1
+    if evicted:
+      self.stats.incr('evictions', evicted)
+
+  def delete(self, *keys):
+    with self.lock:
+      for key in keys:
+        self.entries.pop(key, None)
+
+  def delete_prefix(self, prefix):
+    with self.lock:
+      for key in [key for key in self.entries if key.startswith(prefix)]:
+        del self.entries[key]
+
+  def clear(self):
+    with self.lock:
+      self.entries.clear()
+
+  def info(self) -> dict:
+    info = self.stats.to_dict()
+    info.update({'backend': 'lru', 'entries': len(self.entries), 'max_entries': self.max_entries})
+    return info
+
+
+class RedisCache:
+  """
+  Cache shared by every worker, stored in Redis or anything speaking its client
+  API (a local redis-server, fakeredis in development). Size is bounded by the
+  server's maxmemory policy, its evicted_keys counter is reported as evictions.
+  """
+
+  def __init__(self, client, ttl=60, namespace='fyyur:'):
+    self.client = client
+    self.ttl = ttl
+    self.namespace = namespace
+    self.stats = CacheStats()
+
+  def get(self, key):
+    value = self.client.get(self.namespace + key)
+    if value is None:
+      self.stats.incr('misses')
+      return MISSING
+    self.stats.incr('hits')
+    return pickle.loads(value)
+
+  def set(self, key, value):
+    self.client.set(self.namespace + key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+
+  def delete(self, *keys):
+    if keys:
+      self.client.delete(*[self.namespace + key for key in keys])
+
+  def delete_prefix(self, prefix):
+    keys = list(self.client.scan_iter(match=self.namespace + prefix + '*'))
+    if keys:
+      self.client.delete(*keys)
+
+  def clear(self):
+    self.delete_prefix('')
+
+  def info(self) -> dict:
+    info = self.stats.to_dict()
+    info['backend'] = 'redis'
+    try:
+      info['evictions'] = self.client.info('stats').get('evicted_keys', 0)
+    except Exception:
+      pass
+    return info
+
+
+def create_cache(config):
+  """
+  Build the cache configured by CACHE_BACKEND: 'lru' or 'redis'
+  """
+  backend = config['CACHE_BACKEND']
+  if backend == 'lru':
+    return LRUCache(config['CACHE_MAX_ENTRIES'], config['CACHE_TTL'])
+  if backend == 'redis':
+    import redis
+    return RedisCache(redis.Redis.from_url(config['CACHE_REDIS_URL']), config['CACHE_TTL'])
+  raise ValueError(f'Unknown cache backend: {backend}')
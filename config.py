@@ -1,13 +1,133 @@
 import os
-SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
 # Enable debug mode.
 DEBUG = True
 
+# Signs sessions and CSRF tokens, the same for every worker and across restarts.
+# Required without DEBUG, a debug server makes up a random one.
+SECRET_KEY = os.environ.get('SECRET_KEY')
+
 # Connect to the database
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = '<Put your local database url>'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', '<Put your local database url>')
+
+# Connection pool of server databases (SQLite keeps its default pools), see engines.py
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 5))
+DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+# seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+# seconds after which connections are replaced, below server and proxy idle timeouts
+DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+# test connections before each checkout, dropping the ones the server closed
+DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+# PostgreSQL statement_timeout in milliseconds, 0 disables it
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 0))
+
+# Comma-separated read replica urls: GET and HEAD requests read from one of them
+DB_REPLICA_URLS = [url for url in os.environ.get('DB_REPLICA_URLS', '').split(',') if url]
+# seconds a client reads from the primary after committing a write, to see its own writes
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get('DB_REPLICA_STICKY_SECONDS', 10))
+
+
+# Maximum number of rows per page of venue/artist search results
+SEARCH_RESULTS_PER_PAGE = 50
+
+# Name search backend: 'postgres' (pg_trgm/tsvector indexes), 'ngram' (in-process
+# n-gram index) or 'auto' to pick postgres on PostgreSQL and ngram otherwise
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'auto')
+
+# Nearby venue and artist search (see geo.py): 'postgis' (GiST indexes), 'grid'
+# (in-process grid of cells) or 'auto' to pick postgis when the database has the extension
+GEO_BACKEND = os.environ.get('GEO_BACKEND', 'auto')
+# side of the grid cells in degrees, 0.5 is about 55 km north to south
+GEO_GRID_CELL_DEGREES = 0.5
+# radius searched and results returned when the request does not say, and at most
+GEO_DEFAULT_RADIUS_KM = 50
+GEO_MAX_RADIUS_KM = 500
+GEO_DEFAULT_RESULTS = 20
+GEO_MAX_RESULTS = 100
+
+# Completions of each kind (venues, artists, "City, ST" areas) returned by the
+# autocomplete API of the search boxes, by default and at most
+AUTOCOMPLETE_RESULTS = 8
+AUTOCOMPLETE_MAX_RESULTS = 20
+
+# Show listing: shows per keyset page, and rows fetched per round-trip when streaming
+SHOWS_PER_PAGE = 60
+SHOWS_STREAM_CHUNK_SIZE = 500
+
+# View data cache: 'lru' (per process) or 'redis' (shared by every worker)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'lru')
+CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_MAX_ENTRIES = 1024
+# seconds, bounds how stale upcoming/past splits and show counts can get
+CACHE_TTL = 60
+
+# Load venue/artist pages with their shows in a single joined query
+DETAIL_EAGER_LOAD = True
+
+# Length assumed for every show when checking artist and venue double bookings
+SHOW_DURATION_MINUTES = int(os.environ.get('SHOW_DURATION_MINUTES', 120))
+
+# Rows validated and inserted per transaction by `flask import`
+IMPORT_CHUNK_SIZE = 5000
+
+# Rows fetched per round-trip from the server-side cursor of exports
+EXPORT_YIELD_PER = 1000
+
+# Recently viewed venues and artists on the home page: 'memory' (per process)
+# or 'shared' (one list for every worker of the host, served over RECENT_SOCKET;
+# unix only)
+RECENT_BACKEND = os.environ.get('RECENT_BACKEND', 'memory')
+RECENT_MAX_ITEMS = 10
+# in a directory created with mode 0700, the shared backend refuses one that other users
+# can enter; defaults to a fyyur-<uid> directory of the temp directory
+RECENT_SOCKET = os.environ.get('RECENT_SOCKET')
+# authenticates the workers to the socket, derived from SECRET_KEY when unset
+RECENT_AUTHKEY = os.environ.get('RECENT_AUTHKEY')
+
+# Locales of the dates on the pages, negotiated from Accept-Language; the first is the default
+LOCALES = os.environ.get('LOCALES', 'en,es,fr,de,it,pt').split(',')
+# Formatted dates memoized by the `datetime` template filter
+DATE_FORMAT_CACHE_SIZE = 4096
+
+# Serve the listing, detail, show and search pages from async views on an asyncio
+# engine (asyncpg for PostgreSQL, aiosqlite for SQLite; needs `pip install "flask[async]"`).
+# Each view runs in an event loop of its own on the WSGI worker thread, which it keeps
+# busy: the independent queries of a page overlap, workers serve no more requests.
+# Reads go to DB_REPLICA_URLS (with the asyncio driver) as for the sync views.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '').lower() in ('1', 'true', 'yes')
+# defaults to SQLALCHEMY_DATABASE_URI with the asyncio driver of its backend
+ASYNC_DATABASE_URI = os.environ.get('ASYNC_DATABASE_URI')
+
+# Application log: JSON lines written by a background thread, see logs.py ('' disables it)
+LOG_FILE = os.environ.get('LOG_FILE', os.path.join(basedir, 'fyyur.log'))
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+# one INFO record per request, with its route, status and duration
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', 'true').lower() in ('1', 'true', 'yes')
+# share of INFO and DEBUG records written, warnings and errors are always written
+LOG_INFO_SAMPLE_RATE = float(os.environ.get('LOG_INFO_SAMPLE_RATE', 1.0))
+# rotate at LOG_MAX_BYTES (0: never) and at LOG_ROTATE_WHEN, a TimedRotatingFileHandler
+# `when` ('midnight', 'H', 'W0'...; '': never), keeping LOG_BACKUP_COUNT files
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 50 * 1024 * 1024))
+LOG_ROTATE_WHEN = os.environ.get('LOG_ROTATE_WHEN', 'midnight')
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 14))
+# records waiting for the writer thread, more are dropped rather than blocking requests
+LOG_QUEUE_SIZE = 10000
+
+# Per-request SQL, template and latency instrumentation: Server-Timing headers,
+# /metrics route histograms and one JSONL line per request in INSTRUMENTATION_LOG
+INSTRUMENTATION = os.environ.get('INSTRUMENTATION', '').lower() in ('1', 'true', 'yes')
+INSTRUMENTATION_LOG = os.environ.get('INSTRUMENTATION_LOG', os.path.join(basedir, 'instrumentation.jsonl'))
+# slowest statements of each request written to the log
+INSTRUMENTATION_SLOW_STATEMENTS = 5
+# share of instrumented requests run under cProfile, dumped as .prof files to PROFILE_DIR
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'profiles'))
+
+# seconds browsers cache the fingerprinted files of `flask assets build`, see assets.py
+ASSETS_MAX_AGE = 365 * 24 * 3600
@@ -0,0 +1,144 @@
+#----------------------------------------------------------------------------#
+# Date formatting for the templates.
+#
+# babel.dates.format_datetime() resolves the locale, looks the pattern up and
+# formats every field of every value. Pages list up to thousands of show
+# times falling on far fewer distinct days and times of day, so the formatter
+# below compiles each (format, locale) pattern once, formats its date fields
+# once per distinct date and its time fields once per distinct time, and
+# memoizes recently formatted values.
+#----------------------------------------------------------------------------#
+
+import re
+import threading
+from collections import OrderedDict
+from datetime import date, datetime
+from functools import lru_cache
+
+import babel.dates
+import dateutil.parser
+from babel import Locale
+
+# named formats of the `datetime` filter, any other format is a babel pattern
+# or one of babel's named formats of the locale
+FORMATS = {
+  'full': "EEEE MMMM, d, y 'at' h:mma",
+  'medium': "EE MM, dd, y h:mma",
+}
+BABEL_FORMATS = ('short', 'medium', 'long', 'full')
+
+# babel pattern fields, by their first letter, depending only on the date or only on the time of day
+DATE_FIELDS = frozenset('GyYuQqMLwWdDFEec')
+TIME_FIELDS = frozenset('abBhHKkmsSA')
+
+# distinct dates and times whose fields are kept per compiled format
+MAX_PARTS = 10000
+
+
+def to_datetime(value):
+  if isinstance(value, str):
+    return dateutil.parser.parse(value)
+  return value
+
+
+def babel_pattern(format, locale) -> str:
+  """
+  Pattern of a babel named format in `locale`: its date and time patterns
+  joined as babel.dates.format_datetime() joins them, the rest quoted
+  """
+  parts = re.split(r'(\{[01]\})', babel.dates.get_datetime_format(format, locale).replace("'", ''))
+  patterns = {
+    '{0}': babel.dates.get_time_format(format, locale).pattern,
+    '{1}': babel.dates.get_date_format(format, locale).pattern,
+  }
+  return ''.join(patterns.get(part) or (f"'{part}'" if part else '') for part in parts)
+
+
+class CompiledFormat:
+  """
+  A babel pattern for one locale, with the formatted fields of the dates and
+  times seen so far
+  """
+
+  def __init__(self, format, locale):
+    self.locale = Locale.parse(locale)
+    if format in FORMATS:
+      format = FORMATS[format]
+    elif format in BABEL_FORMATS:
+      format = babel_pattern(format, self.locale)
+    self.pattern = babel.dates.parse_pattern(format)
+    fields = re.findall(r'%\((\w+)\)s', self.pattern.format)
+    self.date_fields = [field for field in fields if field[0] in DATE_FIELDS]
+    self.time_fields = [field for field in fields if field[0] in TIME_FIELDS]
+    # time zone fields depend on the whole value
+    self.splittable = len(self.date_fields) + len(self.time_fields) == len(fields)
+    self.dates = dict()
+    self.times = dict()
+
+  def _parts(self, cache, key, value, fields) -> dict:
+    parts = cache.get(key)
+    if parts is None:
+      if len(cache) >= MAX_PARTS:
+        cache.clear()
+      formatter = babel.dates.DateTimeFormat(value, self.locale)
+      parts = cache[key] = {field: formatter[field] for field in fields}
+    return parts
+
+  def __call__(self, value) -> str:
+    value = to_datetime(value)
+    if not self.splittable or not isinstance(value, date):
+      return self.pattern.apply(value, self.locale)
+    fields = self._parts(self.dates, value.toordinal(), value, self.date_fields)
+    if self.time_fields:
+      if not isinstance(value, datetime):
+        return self.pattern.apply(value, self.locale)
+      fields = {**fields, **self._parts(self.times, value.time(), value, self.time_fields)}
+    return self.pattern.format % fields
+
+
+@lru_cache(maxsize=256)
+def compile_format(format, locale) -> CompiledFormat:
+  return CompiledFormat(format, locale)
+
+
+class DateFormatter:
+  """
+  Format dates and datetimes, or strings parsed as such, remembering the
+  `max_values` most recently formatted (value, format, locale)
+  """
+
+  def __init__(self, max_values=4096):
+    self.max_values = max_values
+    self.values = OrderedDict()
+    self.lock = threading.Lock()
+
+  def format(self, value, format='medium', locale='en') -> str:
+    if value is None:
+      return ''
+    key = (value, format, locale)
+    with self.lock:
+      text = self.values.get(key)
+      if text is not None:
+        self.values.move_to_end(key)
+        return text
+    text = compile_format(format, locale)(value)
+    with self.lock:
+      self.values[key] = text
+      if len(self.values) > self.max_values:
+        self.values.popitem(last=False)
+    return text
+
+  def format_many(self, values, format='medium', locale='en') -> list[str]:
+    """
+    Format a column of values in one pass: the pattern is looked up once and
+    each distinct value formatted once
+    """
+    compiled = compile_format(format, locale)
+    texts = {None: ''}
+    result = list()
+    for value in values:
+      text = texts.get(value)
+      if text is None:
+        text = texts[value] = compiled(value)
+      result.append(text)
+    return result
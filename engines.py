@@ -0,0 +1,221 @@
+#----------------------------------------------------------------------------#
+# Database engines.
+#
+# Pool options come from the DB_* settings of config.py. Every engine reports
+# its pool checkouts, checkout waits and connection hold times at
+# /metrics/pool, to size pools from data. With DB_REPLICA_URLS the reads of
+# GET and HEAD requests go to a read replica, unless the client committed a
+# write in the last DB_REPLICA_STICKY_SECONDS.
+#----------------------------------------------------------------------------#
+
+import random
+import threading
+import time
+from bisect import bisect_left
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+# upper bounds of the histogram buckets of checkout waits and hold times
+BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# session key holding the time until which a client reads from the primary, in the
+# session cookie signed with SECRET_KEY so that clients cannot pin themselves there
+STICKY_SESSION_KEY = 'primary_until'
+
+
+class Histogram:
+  """
+  Count, total, max and bucket counts of durations in milliseconds
+  """
+
+  def __init__(self):
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+    self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+  def observe(self, ms):
+    self.count += 1
+    self.total += ms
+    self.max = max(self.max, ms)
+    self.buckets[bisect_left(BUCKETS_MS, ms)] += 1
+
+  def to_dict(self) -> dict:
+    return {
+      'count': self.count,
+      'mean_ms': round(self.total / self.count, 3) if self.count else None,
+      'max_ms': round(self.max, 3),
+      'buckets': {f'le_{bound}': n for bound, n in zip(BUCKETS_MS, self.buckets)} | {'inf': self.buckets[-1]},
+    }
+
+
+class PoolMetrics:
+  """
+  Checkouts, timeouts, checkout waits and hold times of the pool of an engine
+  """
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.lock = threading.Lock()
+    self.connects = 0
+    self.checkouts = 0
+    self.timeouts = 0
+    self.wait = Histogram()
+    self.hold = Histogram()
+    # pool events are carried over when the pool is recreated
+    event.listen(engine, 'connect', self.on_connect)
+    event.listen(engine, 'checkout', self.on_checkout)
+    event.listen(engine, 'checkin', self.on_checkin)
+    engine.pool.metrics = self
+
+  def on_connect(self, dbapi_connection, record):
+    with self.lock:
+      self.connects += 1
+
+  def on_checkout(self, dbapi_connection, record, proxy):
+    record.info['checked_out_at'] = time.perf_counter()
+    with self.lock:
+      self.checkouts += 1
+
+  def on_checkin(self, dbapi_connection, record):
+    checked_out_at = record.info.pop('checked_out_at', None)
+    if checked_out_at is not None:
+      with self.lock:
+        self.hold.observe((time.perf_counter() - checked_out_at) * 1000)
+
+  def observe_wait(self, seconds, timed_out=False):
+    with self.lock:
+      self.wait.observe(seconds * 1000)
+      if timed_out:
+        self.timeouts += 1
+
+  def to_dict(self) -> dict:
+    pool = self.engine.pool
+    with self.lock:
+      info = {
+        'pool': type(pool).__name__,
+        'connects': self.connects,
+        'checkouts': self.checkouts,
+        'timeouts': self.timeouts,
+        'checkout_wait': self.wait.to_dict(),
+        'hold': self.hold.to_dict(),
+      }
+    if isinstance(pool, QueuePool):
+      info.update({'size': pool.size(), 'checked_out': pool.checkedout(), 'overflow': pool.overflow()})
+    return info
+
+
+class TimedQueuePool(QueuePool):
+  """
+  QueuePool timing how long checkouts wait for a free connection
+  """
+  metrics = None
+
+  def _do_get(self):
+    started = time.perf_counter()
+    try:
+      connection = super()._do_get()
+    except PoolTimeoutError:
+      if self.metrics is not None:
+        self.metrics.observe_wait(time.perf_counter() - started, timed_out=True)
+      raise
+    if self.metrics is not None:
+      self.metrics.observe_wait(time.perf_counter() - started)
+    return connection
+
+  def recreate(self):
+    pool = super().recreate()
+    pool.metrics = self.metrics
+    return pool
+
+
+def engine_options(config, url) -> dict:
+  """
+  create_engine() options of the DB_* settings. SQLite only gets its default
+  pool timed: file connections are cheap and memory databases use one connection.
+  """
+  url = make_url(url)
+  if url.get_backend_name() == 'sqlite':
+    return {'poolclass': TimedQueuePool} if url.database not in (None, '', ':memory:') else {}
+  options = {
+    'poolclass': TimedQueuePool,
+    'pool_size': config['DB_POOL_SIZE'],
+    'max_overflow': config['DB_MAX_OVERFLOW'],
+    'pool_timeout': config['DB_POOL_TIMEOUT'],
+    'pool_recycle': config['DB_POOL_RECYCLE'],
+    'pool_pre_ping': config['DB_POOL_PRE_PING'],
+  }
+  if config['DB_STATEMENT_TIMEOUT_MS'] and url.get_backend_name() == 'postgresql':
+    options['connect_args'] = {'options': f'-c statement_timeout={config["DB_STATEMENT_TIMEOUT_MS"]}'}
+  return options
+
+
+def create_replica_engines(config) -> list:
+  return [create_engine(url, **engine_options(config, url)) for url in config['DB_REPLICA_URLS']]
+
+
+def reads_primary() -> bool:
+  """
+  Whether the current request must read its own writes from the primary
+  """
+  if g.get('db_committed'):
+    return True
+  return session.get(STICKY_SESSION_KEY, 0) > time.time()
+
+
+def current_replica():
+  """
+  Replica engine serving the reads of the current request, None for the primary
+  """
+  replicas = current_app.extensions.get('replicas') if has_request_context() else None
+  if not replicas or request.method not in ('GET', 'HEAD') or reads_primary():
+    return None
+  if 'replica' not in g:
+    g.replica = random.choice(replicas)
+  return g.replica
+
+
+class RoutingSession(Session):
+  """
+  Session reading from a replica during GET and HEAD requests. Flushes, other
+  requests and requests following a recent commit of the client use the primary.
+  """
+
+  def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+    if bind is None and not self._flushing:
+      replica = current_replica()
+      if replica is not None:
+        return replica
+    return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def mark_committed(session):
+  if has_request_context():
+    g.db_committed = True
+
+
+def stick_to_primary(response):
+  """
+  after_request hook: send the next reads of a client that just wrote to the primary
+  """
+  if g.get('db_committed') and current_app.extensions.get('replicas'):
+    session[STICKY_SESSION_KEY] = time.time() + current_app.config['DB_REPLICA_STICKY_SECONDS']
+  return response
+
+
+def init_engines(app, primary):
+  """
+  Create the replica engines of `app`, record the pool metrics of every
+  engine and pin clients to the primary after writes
+  """
+  replicas = app.extensions['replicas'] = create_replica_engines(app.config)
+  metrics = app.extensions['pool_metrics'] = {'primary': PoolMetrics(primary)}
+  for index, replica in enumerate(replicas):
+    metrics[f'replica{index}'] = PoolMetrics(replica)
+  app.after_request(stick_to_primary)
@@ -0,0 +1,198 @@
+#----------------------------------------------------------------------------#
+# Streaming export.
+#
+# The encoders turn an iterable of rows into an iterable of text chunks, so
+# that fed from a server-side cursor (Query.yield_per) the first bytes go out
+# as soon as the first rows are fetched and memory does not depend on the
+# number of rows. They back both the export endpoints and `flask export`:
+#
+#   flask export shows --format ics --upcoming -o shows.ics
+#   flask export venues --format jsonl > venues.jsonl
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import sys
+from datetime import datetime, timedelta, timezone
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+from genres import from_genre_mask
+
+export_cli = AppGroup('export', help='Export shows, venues and artists as CSV, JSONL or iCalendar.')
+
+MIMETYPES = {
+  'csv': 'text/csv',
+  'jsonl': 'application/x-ndjson',
+  'ics': 'text/calendar',
+}
+
+# rows encoded per chunk handed to the response or the output file
+ROWS_PER_CHUNK = 500
+
+
+def csv_value(value):
+  # lists are comma-separated and booleans 'y' or empty, as `flask import` reads them
+  if isinstance(value, list):
+    return ','.join(value)
+  if isinstance(value, bool):
+    return 'y' if value else ''
+  return value
+
+
+def encode_csv(columns, rows):
+  buffer = io.StringIO()
+  writer = csv.writer(buffer)
+  writer.writerow(columns)
+  for i, row in enumerate(rows, 1):
+    writer.writerow([csv_value(row[column]) for column in columns])
+    if i % ROWS_PER_CHUNK == 0:
+      yield buffer.getvalue()
+      buffer.seek(0)
+      buffer.truncate()
+  yield buffer.getvalue()
+
+
+def json_default(value):
+  if isinstance(value, datetime):
+    return value.isoformat()
+  return str(value)
+
+
+def encode_jsonl(columns, rows):
+  lines = list()
+  for row in rows:
+    lines.append(json.dumps({column: row[column] for column in columns}, default=json_default))
+    if len(lines) == ROWS_PER_CHUNK:
+      yield '\n'.join(lines) + '\n'
+      lines = list()
+  if lines:
+    yield '\n'.join(lines) + '\n'
+
+
+def escape_ics(text):
+  return (text or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold_ics(line) -> str:
+  """
+  Fold a content line after every 75 octets, continued on lines starting
+  with a space (RFC 5545 3.1), never inside a UTF-8 character
+  """
+  encoded = line.encode()
+  if len(encoded) <= 75:
+    return line
+  parts = list()
+  start, limit = 0, 75
+  while start < len(encoded):
+    end = min(start + limit, len(encoded))
+    while end < len(encoded) and encoded[end] & 0xC0 == 0x80:
+      end -= 1
+    parts.append(encoded[start:end].decode())
+    # the leading space of continuation lines counts
+    start, limit = end, 74
+  return '\r\n '.join(parts)
+
+
+def encode_ics(shows, duration):
+  """
+  iCalendar events of shows with venue_id, venue_name, artist_id, artist_name and start_time
+  """
+  stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+  lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//Fyyur//Shows//EN']
+  for i, show in enumerate(shows, 1):
+    start = show['start_time'].strftime('%Y%m%dT%H%M%S')
+    lines += [
+      'BEGIN:VEVENT',
+      f'UID:{show["venue_id"]}-{show["artist_id"]}-{start}@fyyur',
+      f'DTSTAMP:{stamp}',
+      f'DTSTART:{start}',
+      f'DTEND:{(show["start_time"] + duration).strftime("%Y%m%dT%H%M%S")}',
+      fold_ics(f'SUMMARY:{escape_ics(show["artist_name"])} at {escape_ics(show["venue_name"])}'),
+      'END:VEVENT',
+    ]
+    if i % ROWS_PER_CHUNK == 0:
+      yield '\r\n'.join(lines) + '\r\n'
+      lines = list()
+  lines.append('END:VCALENDAR')
+  yield '\r\n'.join(lines) + '\r\n'
+
+
+def with_genres(rows):
+  """
+  Rows with their genre_mask column decoded to a list of genre names
+  """
+  for row in rows:
+    row = dict(row)
+    row['genres'] = from_genre_mask(row.pop('genre_mask'))
+    yield row
+
+
+def encode(format, query, duration):
+  """
+  Encode the rows of `query`, fetched from a server-side cursor
+  """
+  columns = [column['name'] for column in query.column_descriptions]
+  rows = (row._mapping for row in query.yield_per(current_app.config['EXPORT_YIELD_PER']))
+  if 'genre_mask' in columns:
+    columns[columns.index('genre_mask')] = 'genres'
+    rows = with_genres(rows)
+  if format == 'csv':
+    return encode_csv(columns, rows)
+  if format == 'jsonl':
+    return encode_jsonl(columns, rows)
+  if format == 'ics':
+    return encode_ics(rows, duration)
+  raise ValueError(f'Unknown export format: {format}')
+
+
+def write(chunks, output):
+  out = open(output, 'w', newline='') if output else sys.stdout
+  try:
+    for chunk in chunks:
+      out.write(chunk)
+  finally:
+    if output:
+      out.close()
+
+
+format_option = click.option('--format', 'format', type=click.Choice(['csv', 'jsonl']), default='csv')
+output_option = click.option('-o', '--output', type=click.Path(dir_okay=False), help='Output file (default: stdout).')
+
+
+@export_cli.command('shows')
+@click.option('--format', 'format', type=click.Choice(['csv', 'jsonl', 'ics']), default='csv')
+@output_option
+@click.option('--upcoming', is_flag=True, help='Only shows starting from now.')
+@click.option('--start', type=click.DateTime(), help='Only shows starting at or after this date.')
+@click.option('--end', type=click.DateTime(), help='Only shows starting before this date.')
+@click.option('--venue-id', type=int)
+@click.option('--artist-id', type=int)
+def export_shows(format, output, upcoming, start, end, venue_id, artist_id):
+  """Export shows with their venue and artist names."""
+  from app import show_listing_query
+  query = show_listing_query(upcoming=upcoming, start=start, end=end, venue_id=venue_id, artist_id=artist_id)
+  write(encode(format, query, timedelta(minutes=current_app.config['SHOW_DURATION_MINUTES'])), output)
+
+
+@export_cli.command('venues')
+@format_option
+@output_option
+def export_venues(format, output):
+  """Export every venue."""
+  from app import export_entities_query
+  from models import Venue
+  write(encode(format, export_entities_query(Venue), None), output)
+
+
+@export_cli.command('artists')
+@format_option
+@output_option
+def export_artists(format, output):
+  """Export every artist."""
+  from app import export_entities_query
+  from models import Artist
+  write(encode(format, export_entities_query(Artist), None), output)
@@ -0,0 +1,11 @@
+#----------------------------------------------------------------------------#
+# Flask extensions, created unbound and initialized by create_app() in app.py.
+#----------------------------------------------------------------------------#
+
+from flask_moment import Moment
+from flask_sqlalchemy import SQLAlchemy
+
+from engines import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+moment = Moment()
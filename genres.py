@@ -0,0 +1,44 @@
+#----------------------------------------------------------------------------#
+# Genre bitmasks.
+#
+# Venue and artist genres are stored as one integer column where bit i stands
+# for the i-th member of GenreEnum. Bits are positional: new genres must be
+# appended to GenreEnum, never inserted or reordered.
+#----------------------------------------------------------------------------#
+
+from functools import lru_cache
+
+from forms import GenreEnum
+
+GENRES = tuple(genre.value[0] for genre in GenreEnum)
+GENRE_BITS = {genre: 1 << i for i, genre in enumerate(GENRES)}
+
+
+def to_genre_mask(genres) -> int:
+  """
+  Bitmask of genre names, given as an iterable or a comma-separated string
+  """
+  if isinstance(genres, str):
+    genres = genres.split(',')
+  mask = 0
+  for genre in genres or ():
+    genre = genre.strip()
+    if not genre:
+      continue
+    try:
+      mask |= GENRE_BITS[genre]
+    except KeyError:
+      raise ValueError(f'Unknown genre: {genre}') from None
+  return mask
+
+
+@lru_cache(maxsize=4096)
+def _genre_names(mask) -> tuple:
+  return tuple(genre for genre, bit in GENRE_BITS.items() if mask & bit)
+
+
+def from_genre_mask(mask) -> list[str]:
+  """
+  Genre names of a bitmask, in GenreEnum order
+  """
+  return list(_genre_names(mask or 0))
@@ -0,0 +1,336 @@
+#----------------------------------------------------------------------------#
+# Locations.
+#
+# Venues and artists are placed at the center of their city, looked up in the
+# gazetteer.csv bundled with the app: no network, and the same city always
+# gets the same point. A geo backend answers "the nearest venues or artists
+# within a radius": PostGIS and a GiST index on PostgreSQL, an in-process grid
+# of cells elsewhere.
+#----------------------------------------------------------------------------#
+
+import bisect
+import csv
+import math
+import os
+import re
+import threading
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import func, text
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gazetteer.csv')
+
+# mean radius of the earth
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# spellings of the same word in city names
+CITY_ALIASES = {'saint': 'st', 'ft': 'fort', 'mt': 'mount'}
+
+geo_cli = AppGroup('geo', help='Maintain the locations of venues and artists.')
+
+
+def normalize_city(city) -> str:
+  """
+  Gazetteer key of a city name: case, periods, hyphens, spacing and the CITY_ALIASES do not matter
+  """
+  words = re.sub(r'[.\-]', ' ', city or '').lower().split()
+  return ' '.join(CITY_ALIASES.get(word, word) for word in words)
+
+
+class Gazetteer:
+  """
+  (city, state) to (latitude, longitude) of the city center, read from a CSV file
+  with city, state, latitude and longitude columns on first use
+  """
+
+  def __init__(self, path):
+    self.path = path
+    self.places = None
+    self.lock = threading.Lock()
+
+  def load(self) -> dict:
+    if self.places is None:
+      with self.lock:
+        if self.places is None:
+          with open(self.path, newline='') as f:
+            self.places = {(normalize_city(row['city']), row['state'].upper()):
+                           (float(row['latitude']), float(row['longitude'])) for row in csv.DictReader(f)}
+    return self.places
+
+  def locate(self, city, state):
+    """
+    (latitude, longitude) of a city, None when the gazetteer does not have it
+    """
+    return self.load().get((normalize_city(city), (state or '').strip().upper()))
+
+  def parse(self, place):
+    """
+    (latitude, longitude) of a "City, ST" or "City ST" string, None when unknown
+    """
+    city, _, state = place.rpartition(',')
+    if not city:
+      city, _, state = place.strip().rpartition(' ')
+    return self.locate(city, state) if city else None
+
+
+gazetteer = Gazetteer(GAZETTEER_PATH)
+
+
+def geocode(city, state):
+  """
+  (latitude, longitude) of the center of a city of the bundled gazetteer, None when unknown
+  """
+  return gazetteer.locate(city, state)
+
+
+def haversine_km(lat1, lng1, lat2, lng2) -> float:
+  lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+  a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+  return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+  """
+  Points bucketed in cells of `cell_degrees` by `cell_degrees`, each point with the
+  sorted ids located there. A search only measures the distance to the points of
+  the cells overlapping the bounding box of its circle, and once per point however
+  many ids share it, as the entities of a city do.
+  """
+
+  def __init__(self, cell_degrees):
+    self.cell_degrees = cell_degrees
+    self.rows = math.ceil(180 / cell_degrees)
+    self.columns = math.ceil(360 / cell_degrees)
+    self.locations = dict()
+    self.points = dict()
+    self.cells = dict()
+
+  def cell(self, lat, lng) -> tuple:
+    return (min(math.floor((lat + 90) / self.cell_degrees), self.rows - 1),
+            math.floor((lng + 180) / self.cell_degrees) % self.columns)
+
+  def add(self, entity_id, lat, lng):
+    self.discard(entity_id)
+    if lat is None or lng is None:
+      return
+    point = (lat, lng)
+    self.locations[entity_id] = point
+    ids = self.points.get(point)
+    if ids is None:
+      ids = self.points[point] = list()
+      self.cells.setdefault(self.cell(lat, lng), set()).add(point)
+    bisect.insort(ids, entity_id)
+
+  def discard(self, entity_id):
+    point = self.locations.pop(entity_id, None)
+    if point is None:
+      return
+    ids = self.points[point]
+    del ids[bisect.bisect_left(ids, entity_id)]
+    if not ids:
+      del self.points[point]
+      cell = self.cell(*point)
+      self.cells[cell].discard(point)
+      if not self.cells[cell]:
+        del self.cells[cell]
+
+  def candidate_cells(self, lat, lng, radius_km):
+    dlat = radius_km / KM_PER_DEGREE
+    first_row, last_row = self.cell(max(lat - dlat, -90), 0)[0], self.cell(min(lat + dlat, 90), 0)[0]
+    # longitude span at the latitude of the box farthest from the equator
+    cos_lat = math.cos(math.radians(min(abs(lat) + dlat, 90)))
+    if cos_lat < 1e-9 or dlat / cos_lat >= 180:
+      columns = range(self.columns)
+    else:
+      dlng = dlat / cos_lat
+      first = math.floor((lng - dlng + 180) / self.cell_degrees)
+      last = math.floor((lng + dlng + 180) / self.cell_degrees)
+      columns = {column % self.columns for column in range(first, last + 1)}
+
+    if (last_row - first_row + 1) * len(columns) > len(self.cells):
+      # wider than the occupied cells, filtering them is cheaper
+      return [points for (row, column), points in self.cells.items()
+              if first_row <= row <= last_row and column in columns]
+    return [self.cells[(row, column)] for row in range(first_row, last_row + 1) for column in columns
+            if (row, column) in self.cells]
+
+  def within(self, lat, lng, radius_km) -> list:
+    """
+    (distance in km, point) of the points within `radius_km` of (lat, lng), nearest first
+    """
+    found = list()
+    for points in self.candidate_cells(lat, lng, radius_km):
+      for point in points:
+        distance = haversine_km(lat, lng, *point)
+        if distance <= radius_km:
+          found.append((distance, point))
+    found.sort()
+    return found
+
+  def nearest(self, lat, lng, radius_km, limit) -> list:
+    """
+    (id, distance in km) of the `limit` nearest ids within `radius_km`, nearest
+    first. Searches a cell wide circle first and doubles it until it holds
+    enough ids, so that nearest-N searches over a wide radius stay local.
+    """
+    radius = min(self.cell_degrees * KM_PER_DEGREE, radius_km)
+    found = self.within(lat, lng, radius)
+    while radius < radius_km and sum(len(self.points[point]) for _, point in found) < limit:
+      radius = min(radius * 2, radius_km)
+      found = self.within(lat, lng, radius)
+
+    results = list()
+    for distance, point in found:
+      for entity_id in self.points[point][:limit - len(results)]:
+        results.append((entity_id, distance))
+      if len(results) >= limit:
+        break
+    return results
+
+
+class GeoBackend:
+  """
+  Base class of the geo backends
+  """
+
+  def nearby(self, model, lat, lng, radius_km, limit) -> list:
+    """
+    (id, distance in km) of the `limit` nearest `model` rows within `radius_km`, nearest first
+    """
+    raise NotImplementedError
+
+  def index(self, model, entity_id, latitude, longitude):
+    """
+    Called after an entity was created or moved
+    """
+
+  def remove(self, model, entity_id):
+    """
+    Called after an entity was deleted
+    """
+
+
+def geography(longitude, latitude):
+  # the expression of the GiST indexes of the locations migration, queries must repeat it to use them
+  return func.geography(func.ST_SetSRID(func.ST_MakePoint(longitude, latitude), 4326))
+
+
+class PostgisGeoBackend(GeoBackend):
+  """
+  Distances on the spheroid, served by the GiST indexes of the locations migration:
+  ST_DWithin filters with the index, `<->` orders with an index KNN scan.
+  """
+
+  def __init__(self, db):
+    self.db = db
+
+  def nearby(self, model, lat, lng, radius_km, limit) -> list:
+    location = geography(model.longitude, model.latitude)
+    origin = geography(lng, lat)
+    rows = self.db.session.query(model.id, func.ST_Distance(location, origin)) \
+      .filter(func.ST_DWithin(location, origin, radius_km * 1000)) \
+      .order_by(location.op('<->')(origin), model.id) \
+      .limit(limit)
+    return [(entity_id, meters / 1000) for entity_id, meters in rows]
+
+
+class GridGeoBackend(GeoBackend):
+  """
+  In-process GridIndex of the located rows, for SQLite and dev setups.
+
+  Like the n-gram search index, each model's grid is loaded on first use and
+  kept current through index()/remove(), and rows written by another process
+  only show up after this process's grids are reset().
+  """
+
+  def __init__(self, db, cell_degrees):
+    self.db = db
+    self.cell_degrees = cell_degrees
+    self.indexes = dict()
+    self.lock = threading.Lock()
+
+  def get_index(self, model) -> GridIndex:
+    index = self.indexes.get(model)
+    if index is None:
+      rows = self.db.session.query(model.id, model.latitude, model.longitude) \
+        .filter(model.latitude.isnot(None), model.longitude.isnot(None)).all()
+      with self.lock:
+        index = self.indexes.get(model)
+        if index is None:
+          index = GridIndex(self.cell_degrees)
+          for row in rows:
+            index.add(row.id, row.latitude, row.longitude)
+          self.indexes[model] = index
+    return index
+
+  def nearby(self, model, lat, lng, radius_km, limit) -> list:
+    index = self.get_index(model)
+    with self.lock:
+      return index.nearest(lat, lng, radius_km, limit)
+
+  def index(self, model, entity_id, latitude, longitude):
+    with self.lock:
+      if model in self.indexes:
+        self.indexes[model].add(entity_id, latitude, longitude)
+
+  def remove(self, model, entity_id):
+    with self.lock:
+      if model in self.indexes:
+        self.indexes[model].discard(entity_id)
+
+  def reset(self):
+    with self.lock:
+      self.indexes.clear()
+
+
+def has_postgis(db) -> bool:
+  if db.engine.dialect.name != 'postgresql':
+    return False
+  with db.engine.connect() as connection:
+    return connection.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'postgis'")).first() is not None
+
+
+def create_geo_backend(name, db, cell_degrees) -> GeoBackend:
+  """
+  Build the backend configured by GEO_BACKEND: 'postgis', 'grid' or 'auto'
+  (postgis when the database has the extension, grid otherwise)
+  """
+  if name == 'auto':
+    name = 'postgis' if has_postgis(db) else 'grid'
+  if name == 'postgis':
+    return PostgisGeoBackend(db)
+  if name == 'grid':
+    return GridGeoBackend(db, cell_degrees)
+  raise ValueError(f'Unknown geo backend: {name}')
+
+
+def locate_all(db, model) -> int:
+  """
+  Geocode the `model` rows with one UPDATE per distinct city and state, clearing the
+  locations of the cities the gazetteer does not have. Returns the rows located.
+  """
+  located = 0
+  for city, state in db.session.query(model.city, model.state).distinct().all():
+    latitude, longitude = geocode(city, state) or (None, None)
+    result = db.session.execute(
+      db.update(model).where(model.city == city, model.state == state)
+        .values(latitude=latitude, longitude=longitude)
+        .execution_options(synchronize_session=False))
+    if latitude is not None:
+      located += result.rowcount
+  return located
+
+
+@geo_cli.command('locate')
+def locate_command():
+  """Geocode every venue and artist from the bundled gazetteer."""
+  from extensions import db
+  from models import Artist, Venue
+
+  for model in (Venue, Artist):
+    located = locate_all(db, model)
+    total = db.session.query(func.count(model.id)).scalar()
+    click.echo(f'{located} of {total} {model.__tablename__.lower()} rows located')
+  db.session.commit()
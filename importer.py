@@ -0,0 +1,252 @@
+#----------------------------------------------------------------------------#
+# Bulk import.
+#
+#   flask import venues venues.csv
+#   flask import artists artists.jsonl --chunk-size 20000
+#   flask import shows shows.csv --check-availability --check-conflicts
+#
+# Rows are validated with the forms of forms.py outside of any request,
+# inserted one chunk per transaction (PostgreSQL COPY when available,
+# executemany otherwise), and rejected rows are written next to the input
+# file as <file>.rejects.jsonl.
+#----------------------------------------------------------------------------#
+
+import csv
+import io
+import json
+import time
+from itertools import islice
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from werkzeug.datastructures import MultiDict
+
+from genres import to_genre_mask
+from geo import geocode
+
+import_cli = AppGroup('import', help='Bulk import venues, artists and shows from CSV or JSONL files.')
+
+
+def read_rows(path):
+  """
+  Yield (line number, row dict) from a CSV file with a header line or a JSONL file
+  """
+  with open(path, newline='') as f:
+    if path.endswith('.jsonl') or path.endswith('.json'):
+      for number, line in enumerate(f, 1):
+        if line.strip():
+          yield number, json.loads(line)
+    else:
+      for number, row in enumerate(csv.DictReader(f), 2):
+        yield number, row
+
+
+def chunks(iterable, size):
+  iterator = iter(iterable)
+  while True:
+    chunk = list(islice(iterator, size))
+    if not chunk:
+      return
+    yield chunk
+
+
+def to_formdata(row, multiple=()) -> MultiDict:
+  """
+  Turn a row into form data. Fields in `multiple` are lists in JSONL and
+  comma-separated in CSV.
+  """
+  formdata = MultiDict()
+  for key, value in row.items():
+    if value is None or value == '':
+      continue
+    if key in multiple:
+      values = value if isinstance(value, list) else value.split(',')
+      for v in values:
+        formdata.add(key, v.strip())
+    elif isinstance(value, bool):
+      # a BooleanField is checked by any non-false value
+      if value:
+        formdata.add(key, 'y')
+    else:
+      formdata.add(key, str(value))
+  return formdata
+
+
+class RowValidator:
+  """
+  Validate rows with one form instance, re-processed for every row: binding
+  the fields of a new form per row costs more than validating it
+  """
+
+  def __init__(self, form_class, multiple=()):
+    self.form = form_class(formdata=None, meta={'csrf': False})
+    self.multiple = multiple
+
+  def __call__(self, row):
+    """
+    Return (column values, errors) of a row
+    """
+    self.form.process(formdata=to_formdata(row, self.multiple))
+    if not self.form.validate():
+      return None, self.form.errors
+    return dict(self.form.data), None
+
+
+def insert_chunk(db, model, mappings):
+  """
+  Insert a chunk of rows in a single round-trip: COPY on PostgreSQL with
+  psycopg2, executemany otherwise
+  """
+  if not mappings:
+    return
+  connection = db.session.connection()
+  if connection.dialect.driver == 'psycopg2':
+    columns = list(mappings[0])
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for mapping in mappings:
+      writer.writerow([mapping[column] for column in columns])
+    buffer.seek(0)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    cursor = connection.connection.cursor()
+    cursor.copy_expert(f'COPY "{model.__tablename__}" ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+  else:
+    connection.execute(model.__table__.insert(), mappings)
+
+
+def run_import(path, model, validate_chunk, chunk_size, on_insert=None):
+  """
+  Stream `path` through `validate_chunk` and insert the accepted rows chunk by chunk.
+  `on_insert(rows)` runs in the transaction of each inserted chunk.
+  """
+  from app import get_cache
+  from extensions import db
+
+  rejects_path = f'{path}.rejects.jsonl'
+  started = time.perf_counter()
+  imported = rejected = 0
+  with open(rejects_path, 'w') as rejects:
+    for chunk in chunks(read_rows(path), chunk_size):
+      accepted = list()
+      for (number, row), (mapping, errors) in zip(chunk, validate_chunk([row for _, row in chunk])):
+        if errors:
+          rejects.write(json.dumps({'line': number, 'row': row, 'errors': errors}, default=str) + '\n')
+          rejected += 1
+        else:
+          accepted.append(mapping)
+      try:
+        insert_chunk(db, model, accepted)
+        if on_insert is not None and accepted:
+          on_insert(accepted)
+        db.session.commit()
+      except Exception as e:
+        db.session.rollback()
+        for mapping in accepted:
+          rejects.write(json.dumps({'row': mapping, 'errors': {'database': [str(e)]}}, default=str) + '\n')
+        rejected += len(accepted)
+      else:
+        imported += len(accepted)
+      elapsed = time.perf_counter() - started
+      click.echo(f'{imported} rows imported, {rejected} rejected, {imported / elapsed:.0f} rows/s')
+
+  db.session.close()
+  # imported rows bypass the write-through invalidation of the web handlers
+  get_cache().clear()
+  click.echo(f'Done in {time.perf_counter() - started:.1f}s, rejected rows in {rejects_path}'
+             if rejected else f'Done in {time.perf_counter() - started:.1f}s')
+
+
+def entity_validator(form_class):
+  validate_row = RowValidator(form_class, multiple=('genres',))
+
+  def validate_chunk(rows):
+    results = list()
+    for row in rows:
+      mapping, errors = validate_row(row)
+      if mapping is not None:
+        mapping['genre_mask'] = to_genre_mask(mapping.pop('genres'))
+        # bulk inserts skip the model events that locate new rows
+        mapping['latitude'], mapping['longitude'] = geocode(mapping['city'], mapping['state']) or (None, None)
+      results.append((mapping, errors))
+    return results
+  return validate_chunk
+
+
+chunk_size_option = click.option('--chunk-size', type=int, default=None,
+                                 help='Rows per transaction (default: IMPORT_CHUNK_SIZE).')
+
+
+@import_cli.command('venues')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@chunk_size_option
+def import_venues(path, chunk_size):
+  """Import venues from a CSV or JSONL file with VenueForm fields."""
+  from models import Venue
+  from forms import VenueForm
+  run_import(path, Venue, entity_validator(VenueForm), chunk_size or current_app.config['IMPORT_CHUNK_SIZE'])
+
+
+@import_cli.command('artists')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@chunk_size_option
+def import_artists(path, chunk_size):
+  """Import artists from a CSV or JSONL file with ArtistForm fields."""
+  from models import Artist
+  from forms import ArtistForm
+  run_import(path, Artist, entity_validator(ArtistForm), chunk_size or current_app.config['IMPORT_CHUNK_SIZE'])
+
+
+@import_cli.command('shows')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@chunk_size_option
+@click.option('--check-availability', is_flag=True, help='Reject shows outside of the artist availability.')
+@click.option('--check-conflicts', is_flag=True, help='Reject shows double-booking an artist or a venue.')
+def import_shows(path, chunk_size, check_availability, check_conflicts):
+  """Import shows from a CSV or JSONL file with artist_id, venue_id and start_time."""
+  from app import find_show_conflicts, get_availability_index
+  from extensions import db
+  from models import Artist, Show, Venue, refresh_upcoming_shows
+  from forms import ShowForm
+
+  validate_row = RowValidator(ShowForm)
+
+  def validate_chunk(rows):
+    results = list()
+    for row in rows:
+      mapping, errors = validate_row(row)
+      if mapping is not None:
+        try:
+          mapping['venue_id'], mapping['artist_id'] = int(mapping['venue_id']), int(mapping['artist_id'])
+        except (TypeError, ValueError):
+          mapping, errors = None, {'venue_id, artist_id': ['Not a valid id']}
+      results.append((mapping, errors))
+
+    # the checks below run once per chunk, not once per row
+    valid = [mapping for mapping, _ in results if mapping is not None]
+    venue_ids = {id for id, in db.session.query(Venue.id).filter(Venue.id.in_({m['venue_id'] for m in valid}))}
+    artist_ids = {id for id, in db.session.query(Artist.id).filter(Artist.id.in_({m['artist_id'] for m in valid}))}
+    availability = get_availability_index(artist_ids) if check_availability else None
+    for i, (mapping, errors) in enumerate(results):
+      if mapping is None:
+        continue
+      if mapping['venue_id'] not in venue_ids:
+        results[i] = (None, {'venue_id': [f'Venue ID {mapping["venue_id"]} does not exist']})
+      elif mapping['artist_id'] not in artist_ids:
+        results[i] = (None, {'artist_id': [f'Artist ID {mapping["artist_id"]} does not exist']})
+      elif availability is not None and mapping['start_time'] not in availability[mapping['artist_id']]:
+        results[i] = (None, {'start_time': ['The artist is not available at this time']})
+
+    if check_conflicts:
+      indexes = [i for i, (mapping, _) in enumerate(results) if mapping is not None]
+      proposals = [(results[i][0]['venue_id'], results[i][0]['artist_id'], results[i][0]['start_time']) for i in indexes]
+      for i, conflicts in zip(indexes, find_show_conflicts(proposals)):
+        if conflicts:
+          results[i] = (None, {'start_time': conflicts})
+    return results
+
+  def refresh_counts(shows):
+    refresh_upcoming_shows(Venue, {show['venue_id'] for show in shows})
+    refresh_upcoming_shows(Artist, {show['artist_id'] for show in shows})
+
+  run_import(path, Show, validate_chunk, chunk_size or current_app.config['IMPORT_CHUNK_SIZE'], refresh_counts)
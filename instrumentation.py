@@ -0,0 +1,189 @@
+#----------------------------------------------------------------------------#
+# Per-request instrumentation, enabled by INSTRUMENTATION.
+#
+# Every request records its SQL statements (count, total time, slowest ones)
+# and template render time. A PROFILE_SAMPLE_RATE share of the requests also
+# runs under cProfile. Each request gets a Server-Timing header and one line
+# in the INSTRUMENTATION_LOG JSONL file, written by the background thread of
+# logs.py with the rotation of the app log, and /metrics serves latency
+# histograms per route. Streamed bodies are rendered after the response is
+# returned, so their render and SQL time is not counted.
+#----------------------------------------------------------------------------#
+
+import cProfile
+import heapq
+import logging
+import os
+import random
+import threading
+import time
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from engines import Histogram
+from logs import rotating_file_handler, start_queue_logging
+
+# characters of a statement kept in the log
+MAX_STATEMENT_LENGTH = 500
+
+
+class RequestStats:
+  """
+  SQL and template timings of one request
+  """
+
+  def __init__(self):
+    self.started = time.perf_counter()
+    self.sql_count = 0
+    self.sql_ms = 0.0
+    self.statements = list()
+    self.render_ms = 0.0
+    self.render_started = list()
+    self.profiler = None
+
+  def add_statement(self, statement, ms):
+    self.sql_count += 1
+    self.sql_ms += ms
+    self.statements.append((ms, statement))
+
+  def slowest(self, n) -> list:
+    return [{'ms': round(ms, 3), 'statement': statement[:MAX_STATEMENT_LENGTH]}
+            for ms, statement in heapq.nlargest(n, self.statements, key=lambda item: item[0])]
+
+
+class RouteStats:
+  """
+  Latency and SQL time histograms of one route
+  """
+
+  def __init__(self):
+    self.latency = Histogram()
+    self.sql = Histogram()
+    self.queries = 0
+    self.errors = 0
+
+  def to_dict(self) -> dict:
+    return {
+      'latency': self.latency.to_dict(),
+      'sql': self.sql.to_dict(),
+      'queries': self.queries,
+      'errors': self.errors,
+    }
+
+
+def current_stats():
+  return g.get('request_stats') if has_request_context() else None
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  if current_stats() is not None:
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+  stats = current_stats()
+  started = conn.info.get('query_started')
+  if stats is not None and started:
+    stats.add_statement(statement, (time.perf_counter() - started.pop()) * 1000)
+
+
+def before_render(app, template, context):
+  stats = current_stats()
+  if stats is not None:
+    stats.render_started.append(time.perf_counter())
+
+
+def after_render(app, template, context):
+  stats = current_stats()
+  if stats is not None and stats.render_started:
+    stats.render_ms += (time.perf_counter() - stats.render_started.pop()) * 1000
+
+
+class Instrumentation:
+  """
+  Request hooks, route metrics and JSONL log of an app
+  """
+
+  def __init__(self, app):
+    self.app = app
+    self.sample_rate = app.config['PROFILE_SAMPLE_RATE']
+    self.profile_dir = app.config['PROFILE_DIR']
+    self.slow_statements = app.config['INSTRUMENTATION_SLOW_STATEMENTS']
+    self.routes = dict()
+    self.lock = threading.Lock()
+    self.log = None
+    if app.config['INSTRUMENTATION_LOG']:
+      self.log = logging.getLogger('instrumentation')
+      self.log.setLevel(logging.INFO)
+      self.log.propagate = False
+      start_queue_logging(self.log, rotating_file_handler(app.config['INSTRUMENTATION_LOG'], app.config),
+                          app.config['LOG_QUEUE_SIZE'])
+    app.before_request(self.before_request)
+    app.after_request(self.after_request)
+    before_render_template.connect(before_render, app)
+    template_rendered.connect(after_render, app)
+
+  def before_request(self):
+    stats = g.request_stats = RequestStats()
+    if self.sample_rate and random.random() < self.sample_rate:
+      profiler = cProfile.Profile()
+      try:
+        profiler.enable()
+      except ValueError:
+        # another request of this process is being profiled
+        return
+      stats.profiler = profiler
+
+  def after_request(self, response):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+      return response
+    duration_ms = (time.perf_counter() - stats.started) * 1000
+    route = f'{request.method} {request.url_rule.rule if request.url_rule else "<unmatched>"}'
+    profile = self.save_profile(stats.profiler, request.endpoint) if stats.profiler else None
+
+    with self.lock:
+      route_stats = self.routes.get(route)
+      if route_stats is None:
+        route_stats = self.routes[route] = RouteStats()
+      route_stats.latency.observe(duration_ms)
+      route_stats.sql.observe(stats.sql_ms)
+      route_stats.queries += stats.sql_count
+      route_stats.errors += response.status_code >= 500
+
+    response.headers.add('Server-Timing', ', '.join([
+      f'sql;dur={stats.sql_ms:.3f};desc="{stats.sql_count} queries"',
+      f'render;dur={stats.render_ms:.3f}',
+      f'total;dur={duration_ms:.3f}',
+    ]))
+
+    if self.log is not None:
+      # method, path, route and entity ids are added by logs.py
+      self.log.info('request', extra={
+        'query': request.query_string.decode(),
+        'status': response.status_code,
+        'duration_ms': round(duration_ms, 3),
+        'sql_count': stats.sql_count,
+        'sql_ms': round(stats.sql_ms, 3),
+        'render_ms': round(stats.render_ms, 3),
+        'slowest': stats.slowest(self.slow_statements),
+        'profile': profile,
+      })
+    return response
+
+  def save_profile(self, profiler, endpoint) -> str:
+    """
+    Stop `profiler` and dump its stats where pstats and snakeviz can load them
+    """
+    profiler.disable()
+    os.makedirs(self.profile_dir, exist_ok=True)
+    path = os.path.join(self.profile_dir, f'{time.time():.6f}-{endpoint or "unmatched"}.prof')
+    profiler.dump_stats(path)
+    return path
+
+  def metrics(self) -> dict:
+    with self.lock:
+      return {route: stats.to_dict() for route, stats in sorted(self.routes.items())}
@@ -0,0 +1,219 @@
+#----------------------------------------------------------------------------#
+# Logging.
+#
+# Records are put on a queue by the request threads and written by a
+# background QueueListener thread, so logging on the request path costs an
+# enqueue: no formatting and no disk I/O. Each record is one JSON line with
+# the route, method, path, entity ids (the *_id view arguments) and elapsed
+# time of its request, its `extra` fields and, for exceptions, the traceback.
+# Files rotate by size, by time or both. INFO and DEBUG records can be
+# sampled, warnings and errors are always written.
+#----------------------------------------------------------------------------#
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+# attributes of every LogRecord, the others come from `extra`
+RECORD_ATTRIBUTES = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'context'}
+
+# running listeners, flushed and stopped at exit
+listeners = set()
+listeners_lock = threading.Lock()
+
+
+def request_context() -> dict:
+  """
+  Route, entity ids and elapsed time of the current request, taken on the request thread
+  """
+  if not has_request_context():
+    return {}
+  context = {'method': request.method, 'path': request.path}
+  if request.url_rule is not None:
+    context['route'] = request.url_rule.rule
+    context['endpoint'] = request.endpoint
+  for name, value in (request.view_args or {}).items():
+    if name.endswith('_id'):
+      context[name] = value
+  started = g.get('log_started')
+  if started is not None:
+    context['elapsed_ms'] = round((time.perf_counter() - started) * 1000, 3)
+  return context
+
+
+class JsonFormatter(logging.Formatter):
+  """
+  One JSON object per record
+  """
+
+  def format(self, record) -> str:
+    entry = {
+      'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+      'level': record.levelname,
+      'logger': record.name,
+      'message': record.getMessage(),
+    }
+    entry.update(getattr(record, 'context', {}))
+    entry.update((name, value) for name, value in record.__dict__.items() if name not in RECORD_ATTRIBUTES)
+    if record.exc_info:
+      entry['exc_type'] = record.exc_info[0].__name__
+      entry['traceback'] = self.formatException(record.exc_info)
+    return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+  """
+  Keep a `rate` share of the records below WARNING
+  """
+
+  def __init__(self, rate):
+    super().__init__()
+    self.rate = rate
+
+  def filter(self, record) -> bool:
+    if record.levelno >= logging.WARNING:
+      return True
+    if random.random() >= self.rate:
+      return False
+    record.sample_rate = self.rate
+    return True
+
+
+class RequestQueueHandler(QueueHandler):
+  """
+  QueueHandler leaving formatting to the listener thread, and dropping records rather
+  than blocking when the queue is full
+  """
+
+  def __init__(self, queue):
+    super().__init__(queue)
+    self.listener = None
+    self.dropped = 0
+
+  def prepare(self, record):
+    # a copy, other handlers of the logger see the record unchanged
+    record = copy.copy(record)
+    record.context = request_context()
+    return record
+
+  def enqueue(self, record):
+    try:
+      self.queue.put_nowait(record)
+    except queue.Full:
+      self.dropped += 1
+
+
+class SizedTimedRotatingFileHandler(TimedRotatingFileHandler):
+  """
+  TimedRotatingFileHandler also rotating once the file reaches `max_bytes`
+  """
+
+  def __init__(self, filename, when, max_bytes, backup_count):
+    super().__init__(filename, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+    self.max_bytes = max_bytes
+
+  def shouldRollover(self, record) -> bool:
+    if super().shouldRollover(record):
+      return True
+    if self.stream is None:
+      self.stream = self._open()
+    return self.stream.tell() >= self.max_bytes
+
+  def rotation_filename(self, default_name) -> str:
+    # several size rotations in one interval get .001, .002, ... instead of replacing each
+    # other, padded so that backupCount clean-ups, sorting names, remove the oldest
+    name, n = default_name, 0
+    while os.path.exists(name):
+      n += 1
+      name = f'{default_name}.{n:03d}'
+    return name
+
+
+def rotating_file_handler(path, config) -> logging.Handler:
+  """
+  JSON lines file handler of `path`, rotated as LOG_MAX_BYTES and LOG_ROTATE_WHEN say
+  """
+  when, max_bytes, backup_count = config['LOG_ROTATE_WHEN'], config['LOG_MAX_BYTES'], config['LOG_BACKUP_COUNT']
+  if when and max_bytes:
+    handler = SizedTimedRotatingFileHandler(path, when, max_bytes, backup_count)
+  elif when:
+    handler = TimedRotatingFileHandler(path, when=when, backupCount=backup_count, encoding='utf-8', delay=True)
+  else:
+    handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True)
+  handler.setFormatter(JsonFormatter())
+  return handler
+
+
+def stop_listener(listener):
+  with listeners_lock:
+    if listener not in listeners:
+      return
+    listeners.discard(listener)
+  # writes the queued records before returning
+  listener.stop()
+
+
+@atexit.register
+def stop_listeners():
+  for listener in list(listeners):
+    stop_listener(listener)
+
+
+def start_queue_logging(logger, handler, queue_size, sample_rate=1.0) -> RequestQueueHandler:
+  """
+  Send the records of `logger` to `handler` through a queue and a writer thread,
+  replacing a previous queue of the logger
+  """
+  for previous in [h for h in logger.handlers if isinstance(h, RequestQueueHandler)]:
+    logger.removeHandler(previous)
+    stop_listener(previous.listener)
+
+  queue_handler = RequestQueueHandler(queue.Queue(queue_size))
+  if sample_rate < 1:
+    queue_handler.addFilter(SamplingFilter(sample_rate))
+  queue_handler.listener = QueueListener(queue_handler.queue, handler, respect_handler_level=True)
+  with listeners_lock:
+    listeners.add(queue_handler.listener)
+  queue_handler.listener.start()
+  logger.addHandler(queue_handler)
+  return queue_handler
+
+
+def init_logging(app):
+  """
+  Log app.logger records to LOG_FILE, and every request at INFO with LOG_REQUESTS
+  """
+  logger = app.logger
+  logger.setLevel(app.config['LOG_LEVEL'])
+  if app.debug:
+    # the debug server prints requests already, its console shows warnings and errors
+    default_handler.setLevel(logging.WARNING)
+  else:
+    # the console handler writes on the request thread
+    logger.removeHandler(default_handler)
+  if app.config['LOG_FILE']:
+    start_queue_logging(logger, rotating_file_handler(app.config['LOG_FILE'], app.config),
+                        app.config['LOG_QUEUE_SIZE'], app.config['LOG_INFO_SAMPLE_RATE'])
+
+  @app.before_request
+  def start_request_timer():
+    g.log_started = time.perf_counter()
+
+  if app.config['LOG_REQUESTS']:
+    @app.after_request
+    def log_request(response):
+      # streamed bodies are sent after this, elapsed_ms ends with the headers
+      logger.info('%s %s %s', request.method, request.path, response.status_code,
+                  extra={'status': response.status_code})
+      return response
@@ -0,0 +1,41 @@
+"""name search indexes
+
+Revision ID: 3f2a9c1d7e4b
+Revises: 671d3164ad5f
+Create Date: 2026-10-18 10:41:27.503318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7e4b'
+down_revision = '671d3164ad5f'
+branch_labels = None
+depends_on = None
+
+# trigram indexes serve ILIKE '%term%' and similarity(), the tsvector
+# indexes serve word matches; other databases use the in-process index
+TABLES = ('Venue', 'Artist')
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in TABLES:
+        op.create_index(f'ix_{table.lower()}_name_trgm', table, ['name'],
+                        postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+        op.create_index(f'ix_{table.lower()}_name_tsv', table,
+                        [sa.text("to_tsvector('simple', name)")],
+                        postgresql_using='gin')
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in TABLES:
+        op.drop_index(f'ix_{table.lower()}_name_tsv', table_name=table)
+        op.drop_index(f'ix_{table.lower()}_name_trgm', table_name=table)
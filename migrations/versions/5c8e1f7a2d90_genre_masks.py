@@ -0,0 +1,81 @@
+"""genre masks
+
+Revision ID: 5c8e1f7a2d90
+Revises: bf3fe94fb1c4
+Create Date: 2026-10-18 15:02:11.482310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c8e1f7a2d90'
+down_revision = 'bf3fe94fb1c4'
+branch_labels = None
+depends_on = None
+
+# GenreEnum at the time of this revision, bit i is GENRES[i]
+GENRES = ('Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk', 'Hip-Hop',
+          'Heavy Metal', 'Instrumental', 'Jazz', 'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae',
+          'Rock n Roll', 'Soul', 'Other')
+GENRE_BITS = {genre: 1 << i for i, genre in enumerate(GENRES)}
+
+TABLES = ('Venue', 'Artist')
+
+
+def entity_table(name):
+    return sa.table(name,
+                    sa.column('id', sa.Integer),
+                    sa.column('genres', sa.String),
+                    sa.column('genre_mask', sa.Integer))
+
+
+def to_mask(value):
+    """
+    Bitmask of a legacy comma-separated genres string, skipping unknown genres
+    """
+    mask = 0
+    for genre in (value or '').split(','):
+        mask |= GENRE_BITS.get(genre.strip(), 0)
+    return mask
+
+
+def recreate_table(name, operation):
+    # SQLite batch mode copies the table and cannot carry expression indexes over
+    index = f'ix_{name.lower()}_lower_city_lower_state'
+    op.drop_index(index, table_name=name)
+    with op.batch_alter_table(name, schema=None) as batch_op:
+        operation(batch_op)
+    op.create_index(index, name, [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
+
+
+def upgrade():
+    connection = op.get_bind()
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('genre_mask', sa.Integer(), server_default='0', nullable=False))
+
+        table = entity_table(name)
+        for entity_id, value in connection.execute(sa.select(table.c.id, table.c.genres)
+                                                   .where(table.c.genres.isnot(None))):
+            mask = to_mask(value)
+            if mask:
+                connection.execute(table.update().where(table.c.id == entity_id).values(genre_mask=mask))
+
+        recreate_table(name, lambda batch_op: batch_op.drop_column('genres'))
+
+
+def downgrade():
+    connection = op.get_bind()
+    for name in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('genres', sa.VARCHAR(), nullable=True))
+
+        table = entity_table(name)
+        for entity_id, mask in connection.execute(sa.select(table.c.id, table.c.genre_mask)
+                                                  .where(table.c.genre_mask != 0)):
+            genres = ','.join(genre for genre, bit in GENRE_BITS.items() if mask & bit)
+            connection.execute(table.update().where(table.c.id == entity_id).values(genres=genres))
+
+        recreate_table(name, lambda batch_op: batch_op.drop_column('genre_mask'))
@@ -0,0 +1,50 @@
+"""updated_at columns
+
+Revision ID: 8d41c6b0e2f3
+Revises: 5c8e1f7a2d90
+Create Date: 2026-10-18 16:24:37.115902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d41c6b0e2f3'
+down_revision = '5c8e1f7a2d90'
+branch_labels = None
+depends_on = None
+
+# (table, its expression index on lower(city), lower(state) if any)
+TABLES = (('Show', None),
+          ('Venue', 'ix_venue_lower_city_lower_state'),
+          ('Artist', 'ix_artist_lower_city_lower_state'))
+
+
+def alter_table(name, expression_index, operation):
+    # SQLite cannot add a column with a CURRENT_TIMESTAMP default in place, the
+    # table is copied instead and its expression index recreated afterwards
+    recreate = 'always' if op.get_bind().dialect.name == 'sqlite' else 'auto'
+    if expression_index and recreate == 'always':
+        op.drop_index(expression_index, table_name=name)
+    with op.batch_alter_table(name, schema=None, recreate=recreate) as batch_op:
+        operation(batch_op)
+    if expression_index and recreate == 'always':
+        op.create_index(expression_index, name, [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
+
+
+def upgrade():
+    for name, expression_index in TABLES:
+        def add_updated_at(batch_op, name=name):
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=False,
+                                          server_default=sa.text('CURRENT_TIMESTAMP')))
+            batch_op.create_index(f'ix_{name.lower()}_updated_at', ['updated_at'], unique=False)
+        alter_table(name, expression_index, add_updated_at)
+
+
+def downgrade():
+    for name, expression_index in TABLES:
+        def drop_updated_at(batch_op, name=name):
+            batch_op.drop_index(f'ix_{name.lower()}_updated_at')
+            batch_op.drop_column('updated_at')
+        alter_table(name, expression_index, drop_updated_at)
@@ -0,0 +1,26 @@
+"""show listing keyset index
+
+Revision ID: 9b7e2d4c5a18
+Revises: 3f2a9c1d7e4b
+Create Date: 2026-10-18 11:36:52.271904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7e2d4c5a18'
+down_revision = '3f2a9c1d7e4b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.create_index('ix_show_start_time_venue_artist', ['start_time', 'venue_id', 'artist_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_index('ix_show_start_time_venue_artist')
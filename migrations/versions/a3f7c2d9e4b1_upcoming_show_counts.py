@@ -0,0 +1,53 @@
+"""upcoming show counts of venues and artists
+
+Revision ID: a3f7c2d9e4b1
+Revises: 8d41c6b0e2f3
+Create Date: 2026-10-18 18:41:09.532170
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f7c2d9e4b1'
+down_revision = '8d41c6b0e2f3'
+branch_labels = None
+depends_on = None
+
+# (table, show column referencing it, its expression index on lower(city), lower(state))
+TABLES = (('Venue', 'venue_id', 'ix_venue_lower_city_lower_state'),
+          ('Artist', 'artist_id', 'ix_artist_lower_city_lower_state'))
+
+
+def upgrade():
+    for name, show_fk, _ in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('upcoming_show_count', sa.Integer(), nullable=False,
+                                          server_default='0'))
+            batch_op.add_column(sa.Column('next_show_at', sa.DateTime(), nullable=True))
+            batch_op.create_index(f'ix_{name.lower()}_next_show_at', ['next_show_at'], unique=False)
+
+        # counted as of now, `flask upcoming roll-forward` keeps them current afterwards
+        table = sa.table(name, sa.column('id'), sa.column('upcoming_show_count'), sa.column('next_show_at'))
+        show = sa.table('Show', sa.column(show_fk), sa.column('start_time'))
+        upcoming = sa.and_(show.c[show_fk] == table.c.id, show.c.start_time >= datetime.now())
+        op.execute(table.update().values(
+            upcoming_show_count=sa.select(sa.func.count()).select_from(show).where(upcoming).scalar_subquery(),
+            next_show_at=sa.select(sa.func.min(show.c.start_time)).where(upcoming).scalar_subquery()))
+
+
+def downgrade():
+    sqlite = op.get_bind().dialect.name == 'sqlite'
+    for name, _, expression_index in TABLES:
+        # dropping columns copies SQLite tables, losing their expression index
+        if sqlite:
+            op.drop_index(expression_index, table_name=name)
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{name.lower()}_next_show_at')
+            batch_op.drop_column('next_show_at')
+            batch_op.drop_column('upcoming_show_count')
+        if sqlite:
+            op.create_index(expression_index, name, [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
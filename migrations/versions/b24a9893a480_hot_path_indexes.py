@@ -0,0 +1,37 @@
+"""hot path indexes
+
+Revision ID: b24a9893a480
+Revises: 9b7e2d4c5a18
+Create Date: 2026-10-18 12:08:15.640927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b24a9893a480'
+down_revision = '9b7e2d4c5a18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.create_index('ix_show_artist_id_start_time', ['artist_id', 'start_time'], unique=False)
+        batch_op.create_index('ix_show_venue_id_start_time', ['venue_id', 'start_time'], unique=False)
+
+    # expression indexes, autogenerate cannot compare these
+    op.create_index('ix_venue_lower_city_lower_state', 'Venue',
+                    [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
+    op.create_index('ix_artist_lower_city_lower_state', 'Artist',
+                    [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_artist_lower_city_lower_state', table_name='Artist')
+    op.drop_index('ix_venue_lower_city_lower_state', table_name='Venue')
+
+    with op.batch_alter_table('Show', schema=None) as batch_op:
+        batch_op.drop_index('ix_show_venue_id_start_time')
+        batch_op.drop_index('ix_show_artist_id_start_time')
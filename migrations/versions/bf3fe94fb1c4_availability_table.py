@@ -0,0 +1,92 @@
+"""availability table
+
+Revision ID: bf3fe94fb1c4
+Revises: b24a9893a480
+Create Date: 2026-10-18 13:20:44.903617
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'bf3fe94fb1c4'
+down_revision = 'b24a9893a480'
+branch_labels = None
+depends_on = None
+
+artist = sa.table('Artist',
+                  sa.column('id', sa.Integer),
+                  sa.column('availability', sa.String))
+availability = sa.table('Availability',
+                        sa.column('artist_id', sa.Integer),
+                        sa.column('start_time', sa.DateTime),
+                        sa.column('end_time', sa.DateTime))
+
+
+def parse_availability(value):
+    """
+    Windows of a legacy 'start;end,start;end' availability string, skipping invalid entries
+    """
+    windows = list()
+    for window in (value or '').split(','):
+        try:
+            start_time, end_time = window.split(';')
+            windows.append((datetime.fromisoformat(start_time), datetime.fromisoformat(end_time)))
+        except ValueError:
+            continue
+    return windows
+
+
+def recreate_artist_table(operation):
+    # SQLite batch mode copies the table and cannot carry expression indexes over
+    op.drop_index('ix_artist_lower_city_lower_state', table_name='Artist')
+    with op.batch_alter_table('Artist', schema=None) as batch_op:
+        operation(batch_op)
+    op.create_index('ix_artist_lower_city_lower_state', 'Artist',
+                    [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
+
+
+def upgrade():
+    op.create_table('Availability',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('start_time', sa.DateTime(), nullable=False),
+    sa.Column('end_time', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('Availability', schema=None) as batch_op:
+        batch_op.create_index('ix_availability_artist_id_start_time_end_time', ['artist_id', 'start_time', 'end_time'], unique=False)
+
+    connection = op.get_bind()
+    rows = list()
+    for artist_id, value in connection.execute(sa.select(artist.c.id, artist.c.availability)
+                                               .where(artist.c.availability.isnot(None))):
+        rows.extend({'artist_id': artist_id, 'start_time': start_time, 'end_time': end_time}
+                    for start_time, end_time in parse_availability(value))
+    if rows:
+        connection.execute(availability.insert(), rows)
+
+    recreate_artist_table(lambda batch_op: batch_op.drop_column('availability'))
+
+
+def downgrade():
+    recreate_artist_table(lambda batch_op: batch_op.add_column(sa.Column('availability', sa.VARCHAR(), nullable=True)))
+
+    connection = op.get_bind()
+    windows = dict()
+    for artist_id, start_time, end_time in connection.execute(
+            sa.select(availability.c.artist_id, availability.c.start_time, availability.c.end_time)
+            .order_by(availability.c.artist_id, availability.c.start_time)):
+        windows.setdefault(artist_id, list()).append(
+            f"{start_time.isoformat(timespec='minutes')};{end_time.isoformat(timespec='minutes')}")
+    for artist_id, values in windows.items():
+        connection.execute(artist.update().where(artist.c.id == artist_id).values(availability=','.join(values)))
+
+    with op.batch_alter_table('Availability', schema=None) as batch_op:
+        batch_op.drop_index('ix_availability_artist_id_start_time_end_time')
+
+    op.drop_table('Availability')
@@ -0,0 +1,62 @@
+"""venue and artist locations
+
+Revision ID: d6b1e8f3a257
+Revises: a3f7c2d9e4b1
+Create Date: 2026-10-18 21:12:45.870311
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6b1e8f3a257'
+down_revision = 'a3f7c2d9e4b1'
+branch_labels = None
+depends_on = None
+
+# (table, its expression index on lower(city), lower(state))
+TABLES = (('Venue', 'ix_venue_lower_city_lower_state'),
+          ('Artist', 'ix_artist_lower_city_lower_state'))
+
+# the expression of geo.geography(), which nearby queries repeat to use the indexes
+GEOGRAPHY = 'geography(ST_SetSRID(ST_MakePoint(longitude, latitude), 4326))'
+
+
+def has_postgis():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bind.execute(sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")).first() is not None
+
+
+def upgrade():
+    # filled in by `flask geo locate`, and by the models for new and moved rows
+    for name, _ in TABLES:
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('latitude', sa.Float(), nullable=True))
+            batch_op.add_column(sa.Column('longitude', sa.Float(), nullable=True))
+
+    # without PostGIS, nearby searches use the in-process grid of geo.py
+    if not has_postgis():
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS postgis')
+    for name, _ in TABLES:
+        op.execute(f'CREATE INDEX ix_{name.lower()}_location ON "{name}" USING gist (({GEOGRAPHY}))')
+
+
+def downgrade():
+    bind = op.get_bind()
+    sqlite = bind.dialect.name == 'sqlite'
+    for name, expression_index in TABLES:
+        # the extension stays, other database objects may use it
+        if bind.dialect.name == 'postgresql':
+            op.execute(f'DROP INDEX IF EXISTS ix_{name.lower()}_location')
+        # dropping columns copies SQLite tables, losing their expression index
+        if sqlite:
+            op.drop_index(expression_index, table_name=name)
+        with op.batch_alter_table(name, schema=None) as batch_op:
+            batch_op.drop_column('longitude')
+            batch_op.drop_column('latitude')
+        if sqlite:
+            op.create_index(expression_index, name, [sa.text('lower(city)'), sa.text('lower(state)')], unique=False)
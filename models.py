@@ -0,0 +1,186 @@
+#----------------------------------------------------------------------------#
+# Models.
+#
+# The schema is managed by the migrations in migrations/ only: `flask db
+# upgrade` creates and updates the tables, the app never creates them.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, event, func, inspect
+
+from extensions import db
+from genres import from_genre_mask, to_genre_mask
+from geo import geocode
+
+def utcnow():
+  return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class TimestampMixin:
+  # naive UTC, part of the ETags of the JSON API
+  updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow,
+                         server_default=func.current_timestamp())
+
+class Show(TimestampMixin, db.Model):
+  __tablename__ = 'Show'
+  __table_args__ = (
+    # keyset pagination order of the show listing
+    db.Index('ix_show_start_time_venue_artist', 'start_time', 'venue_id', 'artist_id'),
+    # upcoming/past shows of one artist or venue
+    db.Index('ix_show_artist_id_start_time', 'artist_id', 'start_time'),
+    db.Index('ix_show_venue_id_start_time', 'venue_id', 'start_time'),
+    # latest modification, read by every JSON API request
+    db.Index('ix_show_updated_at', 'updated_at'),
+  )
+  venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), primary_key=True, nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), primary_key=True, nullable=False)
+  start_time = db.Column(db.DateTime, primary_key=True)
+  venue = db.relationship('Venue', back_populates='shows')
+  artist = db.relationship('Artist', back_populates='shows')
+
+class GenreMixin:
+  # bit i is the i-th GenreEnum member, see genres.py
+  genre_mask = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+  @property
+  def genres(self) -> list[str]:
+    return from_genre_mask(self.genre_mask)
+
+  @genres.setter
+  def genres(self, genres):
+    self.genre_mask = to_genre_mask(genres)
+
+  @classmethod
+  def has_genres(cls, mask):
+    """
+    Criterion matching rows having every genre of `mask`, a bitwise test on one integer column
+    """
+    return cls.genre_mask.op('&')(mask) == mask
+
+class UpcomingShowsMixin:
+  # denormalized from Show for the listings and searches, see refresh_upcoming_shows()
+  upcoming_show_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+  next_show_at = db.Column(db.DateTime)
+
+class LocationMixin:
+  # center of the city, from the bundled gazetteer (see geo.py); NULL for unknown cities
+  latitude = db.Column(db.Float)
+  longitude = db.Column(db.Float)
+
+  def locate(self):
+    self.latitude, self.longitude = geocode(self.city, self.state) or (None, None)
+
+@event.listens_for(LocationMixin, 'before_insert', propagate=True)
+def locate_new(mapper, connection, target):
+  target.locate()
+
+@event.listens_for(LocationMixin, 'before_update', propagate=True)
+def locate_moved(mapper, connection, target):
+  state = inspect(target)
+  if state.attrs.city.history.has_changes() or state.attrs.state.history.has_changes():
+    target.locate()
+
+class Venue(LocationMixin, UpcomingShowsMixin, GenreMixin, TimestampMixin, db.Model):
+  __tablename__ = 'Venue'
+  id = db.Column(db.Integer, primary_key=True, nullable=False)
+  name = db.Column(db.String)
+  city = db.Column(db.String(120))
+  state = db.Column(db.String(120))
+  address = db.Column(db.String(120))
+  phone = db.Column(db.String(120))
+  image_link = db.Column(db.String(500))
+  facebook_link = db.Column(db.String(120))
+  website_link = db.Column(db.String(120))
+  seeking_talent = db.Column(db.Boolean())
+  seeking_description = db.Column(db.String)
+  shows = db.relationship('Show', back_populates='venue', order_by='Show.start_time',
+                          cascade='all, delete-orphan')
+
+  def __repr__(self):
+    return (f'<Venue id={self.id} name={self.name} city={self.city} state={self.state} '
+            f'address={self.address} phone={self.phone} genres={self.genres} '
+            f'image_link={self.image_link} facebook_link={self.facebook_link} '
+            f'website_link={self.website_link} seeking_talent={self.seeking_talent} '
+            f'seeking_description={self.seeking_description}>')
+
+# case-insensitive (city, state) lookups
+db.Index('ix_venue_lower_city_lower_state', func.lower(Venue.city), func.lower(Venue.state))
+db.Index('ix_venue_updated_at', Venue.updated_at)
+# rows whose next show has started, recounted by roll_forward_upcoming_shows()
+db.Index('ix_venue_next_show_at', Venue.next_show_at)
+       
+class Artist(LocationMixin, UpcomingShowsMixin, GenreMixin, TimestampMixin, db.Model):
+  __tablename__ = 'Artist'
+  id = db.Column(db.Integer, primary_key=True, nullable=False)
+  name = db.Column(db.String)
+  city = db.Column(db.String(120))
+  state = db.Column(db.String(120))
+  phone = db.Column(db.String(120))
+  image_link = db.Column(db.String(500))
+  facebook_link = db.Column(db.String(120))
+  website_link = db.Column(db.String(120))
+  seeking_venue = db.Column(db.Boolean())
+  seeking_description = db.Column(db.String)
+  shows = db.relationship('Show', back_populates='artist', order_by='Show.start_time',
+                          cascade='all, delete-orphan')
+  availabilities = db.relationship('Availability', order_by='Availability.start_time',
+                                   cascade='all, delete-orphan')
+
+  def __repr__(self):
+    return (
+        f"<Artist id={self.id}, name={self.name}, city={self.city}, state={self.state}, "
+        f"phone={self.phone}, genres={self.genres}, image_link={self.image_link}, "
+        f"facebook_link={self.facebook_link}, website_link={self.website_link}, "
+        f"seeking_venue={self.seeking_venue}, seeking_description={self.seeking_description}>"
+    )
+
+db.Index('ix_artist_lower_city_lower_state', func.lower(Artist.city), func.lower(Artist.state))
+db.Index('ix_artist_updated_at', Artist.updated_at)
+db.Index('ix_artist_next_show_at', Artist.next_show_at)
+
+class Availability(db.Model):
+  __tablename__ = 'Availability'
+  __table_args__ = (
+    db.Index('ix_availability_artist_id_start_time_end_time', 'artist_id', 'start_time', 'end_time'),
+  )
+  id = db.Column(db.Integer, primary_key=True, nullable=False)
+  artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
+  start_time = db.Column(db.DateTime, nullable=False)
+  end_time = db.Column(db.DateTime, nullable=False)
+
+  def __repr__(self):
+    return f'<Availability artist_id={self.artist_id} start_time={self.start_time} end_time={self.end_time}>'
+
+def upcoming_shows_update(model, now_time):
+  """
+  UPDATE of the upcoming show count and next show time of `model` rows, counted
+  from their shows by correlated subqueries on the (id, start_time) show indexes
+  """
+  show_fk = Show.venue_id if model is Venue else Show.artist_id
+  upcoming = and_(show_fk == model.id, Show.start_time >= now_time)
+  return db.update(model) \
+    .values(upcoming_show_count=db.select(func.count()).select_from(Show).where(upcoming).scalar_subquery(),
+            next_show_at=db.select(func.min(Show.start_time)).where(upcoming).scalar_subquery()) \
+    .execution_options(synchronize_session=False)
+
+def refresh_upcoming_shows(model, ids=None, now_time=None):
+  """
+  Recount the upcoming shows of the `model` rows of `ids`, of every row when None.
+  Runs in the current transaction, so counts commit together with the show changes.
+  """
+  statement = upcoming_shows_update(model, now_time or datetime.now())
+  if ids is not None:
+    statement = statement.where(model.id.in_(ids))
+  db.session.execute(statement)
+
+def roll_forward_upcoming_shows(now_time=None) -> int:
+  """
+  Recount the venues and artists whose next show has started, the only rows whose
+  counts went stale with time. Returns the number of rows updated.
+  """
+  now_time = now_time or datetime.now()
+  updated = 0
+  for model in (Venue, Artist):
+    statement = upcoming_shows_update(model, now_time).where(model.next_show_at < now_time)
+    updated += db.session.execute(statement).rowcount
+  return updated
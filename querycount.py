@@ -0,0 +1,52 @@
+#----------------------------------------------------------------------------#
+# Query counting.
+#
+# Counts the SQL statements an engine executes while a block runs: the route
+# benchmark reports them per route, and the tests use assert_num_queries() to
+# hold listings to a fixed number of queries whatever the number of rows.
+#----------------------------------------------------------------------------#
+
+from contextlib import contextmanager
+from sqlalchemy import event
+
+
+class QueryCounter:
+  """
+  Count the SQL statements executed on an engine while active, or on every
+  engine given the Engine class
+  """
+
+  def __init__(self, engine):
+    self.engine = engine
+    self.statements = list()
+
+  @property
+  def count(self):
+    return len(self.statements)
+
+  def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+    self.statements.append(statement)
+
+  def __enter__(self):
+    event.listen(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+    return self
+
+  def __exit__(self, *exc):
+    event.remove(self.engine, 'before_cursor_execute', self._before_cursor_execute)
+    return False
+
+
+@contextmanager
+def assert_num_queries(engine, expected):
+  """
+  Fail if the wrapped block does not execute exactly `expected` statements.
+
+  Usage:
+    with app.test_client() as client, assert_num_queries(db.engine, 1):
+      client.get('/venues')
+  """
+  with QueryCounter(engine) as counter:
+    yield counter
+  if counter.count != expected:
+    executed = '\n'.join(counter.statements)
+    raise AssertionError(f'Expected {expected} queries, got {counter.count}:\n{executed}')
@@ -0,0 +1,170 @@
+#----------------------------------------------------------------------------#
+# Recently viewed venues and artists.
+#
+# Items are stored under a key such as ('venue', 3), so that viewing a page
+# again moves its item to the front instead of adding a duplicate. The
+# 'shared' backend keeps one list for every worker of a host: the first
+# worker to need it serves it over a local socket, the others connect to it.
+# Managers exchange pickles, so the socket lives in a directory only the
+# app's user can enter and connections must know a key derived from
+# SECRET_KEY. The shared backend needs unix sockets and fcntl, the memory one
+# runs anywhere.
+#----------------------------------------------------------------------------#
+
+import getpass
+import hashlib
+import hmac
+import os
+import stat
+import tempfile
+import threading
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+
+class RecentItems:
+  """
+  The `max_items` most recently added items, newest first. Adding and
+  deduplicating are O(1) dictionary operations under a lock.
+  """
+
+  def __init__(self, max_items=10):
+    self.max_items = max_items
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+
+  def add(self, key, item):
+    with self.lock:
+      self.entries[key] = item
+      self.entries.move_to_end(key, last=False)
+      while len(self.entries) > self.max_items:
+        self.entries.popitem()
+
+  def discard(self, key):
+    with self.lock:
+      self.entries.pop(key, None)
+
+  def items(self) -> list:
+    with self.lock:
+      return list(self.entries.values())
+
+
+class _RecentServer(BaseManager):
+  pass
+
+
+class _RecentClient(BaseManager):
+  pass
+
+
+_RecentClient.register('recent_items')
+
+
+class SharedRecentItems:
+  """
+  RecentItems shared by the processes of a host through a manager listening
+  on the unix socket `address`. Whichever process finds no live server starts
+  one in a background thread and uses its list directly; when that process
+  exits, the next call of another process takes over with an empty list.
+  """
+
+  def __init__(self, address, authkey, max_items=10):
+    self.address = address
+    self.authkey = authkey
+    self.max_items = max_items
+    self.lock = threading.Lock()
+    self.pid = None
+    self.target = None
+
+  def _connect(self):
+    client = _RecentClient(address=self.address, authkey=self.authkey)
+    client.connect()
+    return client.recent_items()
+
+  def _serve(self):
+    items = RecentItems(self.max_items)
+    _RecentServer.register('recent_items', callable=lambda: items)
+    if os.path.exists(self.address):
+      # left behind by a server that is gone, we could not connect to it
+      os.unlink(self.address)
+    # listening from here on, connections wait for the thread to accept them
+    server = _RecentServer(address=self.address, authkey=self.authkey).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True, name='recent-items-server').start()
+    return items
+
+  def _check_directory(self):
+    directory = os.path.dirname(os.path.abspath(self.address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+      raise RuntimeError(f'The recent items socket directory {directory} must be a directory '
+                         'owned by this user with mode 0700')
+
+  def _elect(self):
+    import fcntl
+
+    self._check_directory()
+    # serialize the processes racing to replace a missing server
+    with open(self.address + '.lock', 'w') as lock:
+      fcntl.flock(lock, fcntl.LOCK_EX)
+      try:
+        return self._connect()
+      except (OSError, EOFError):
+        return self._serve()
+
+  def _call(self, method, *args):
+    with self.lock:
+      if self.pid != os.getpid():
+        # never reuse a connection inherited from the parent of a forked worker
+        self.pid, self.target = os.getpid(), None
+      for attempt in range(2):
+        if self.target is None:
+          self.target = self._elect()
+        try:
+          return getattr(self.target, method)(*args)
+        except (OSError, EOFError):
+          self.target = None
+          if attempt:
+            raise
+
+  def add(self, key, item):
+    self._call('add', key, item)
+
+  def discard(self, key):
+    self._call('discard', key)
+
+  def items(self) -> list:
+    return self._call('items')
+
+
+def default_socket() -> str:
+  """
+  Socket of the shared server in a directory of the current user under the temp directory
+  """
+  user = os.getuid() if hasattr(os, 'getuid') else getpass.getuser()
+  return os.path.join(tempfile.gettempdir(), f'fyyur-{user}', 'recent.sock')
+
+
+def derive_authkey(secret_key) -> bytes:
+  """
+  Key of the shared recent items server, the same for every worker sharing SECRET_KEY
+  """
+  if not secret_key:
+    raise RuntimeError('Set SECRET_KEY or RECENT_AUTHKEY to use the shared recent items backend')
+  if isinstance(secret_key, str):
+    secret_key = secret_key.encode()
+  return hmac.new(secret_key, b'fyyur recent items', hashlib.sha256).digest()
+
+
+def create_recent_items(config):
+  """
+  Build the recent items store configured by RECENT_BACKEND: 'memory' or 'shared'
+  """
+  backend = config['RECENT_BACKEND']
+  if backend == 'memory':
+    return RecentItems(config['RECENT_MAX_ITEMS'])
+  if backend == 'shared':
+    authkey = config['RECENT_AUTHKEY']
+    authkey = authkey.encode() if authkey else derive_authkey(config['SECRET_KEY'])
+    return SharedRecentItems(config['RECENT_SOCKET'] or default_socket(), authkey, config['RECENT_MAX_ITEMS'])
+  raise ValueError(f'Unknown recent items backend: {backend}')
@@ -0,0 +1,88 @@
+#----------------------------------------------------------------------------#
+# Booking checks.
+#----------------------------------------------------------------------------#
+
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+
+
+class IntervalSet:
+  """
+  Set of closed [start, end] intervals, merged and sorted so that membership
+  of a point is a binary search
+  """
+
+  def __init__(self, intervals=()):
+    self.starts = list()
+    self.ends = list()
+    for start, end in sorted(intervals):
+      if self.ends and start <= self.ends[-1]:
+        self.ends[-1] = max(self.ends[-1], end)
+      else:
+        self.starts.append(start)
+        self.ends.append(end)
+
+  def __len__(self):
+    return len(self.starts)
+
+  def __contains__(self, point):
+    i = bisect_right(self.starts, point) - 1
+    return i >= 0 and point <= self.ends[i]
+
+  def covers(self, start, end) -> bool:
+    """
+    Whether [start, end] lies within a single interval
+    """
+    i = bisect_right(self.starts, start) - 1
+    return i >= 0 and end <= self.ends[i]
+
+
+class Timeline:
+  """
+  Sorted start times of the shows of one artist or venue
+  """
+
+  def __init__(self):
+    self.starts = list()
+
+  def add(self, start):
+    insort(self.starts, start)
+
+  def overlapping(self, start, duration) -> list:
+    """
+    Start times of the shows overlapping a show of `duration` starting at `start`
+    """
+    return self.starts[bisect_right(self.starts, start - duration):bisect_left(self.starts, start + duration)]
+
+
+class ConflictDetector:
+  """
+  Per-artist and per-venue timelines of shows lasting `duration`. Checking a
+  proposed show is two binary searches, so validating a batch of n shows
+  costs O(n log n) comparisons instead of comparing every pair.
+  """
+
+  def __init__(self, duration):
+    self.duration = duration
+    self.timelines = defaultdict(Timeline)
+
+  def add(self, venue_id, artist_id, start_time):
+    self.timelines['venue', venue_id].add(start_time)
+    self.timelines['artist', artist_id].add(start_time)
+
+  def conflicts(self, venue_id, artist_id, start_time) -> list[str]:
+    messages = list()
+    for other in self.timelines['artist', artist_id].overlapping(start_time, self.duration):
+      messages.append(f'Artist {artist_id} is already booked for a show at {other}')
+    for other in self.timelines['venue', venue_id].overlapping(start_time, self.duration):
+      messages.append(f'Venue {venue_id} already hosts a show at {other}')
+    return messages
+
+  def check_and_add(self, venue_id, artist_id, start_time) -> list[str]:
+    """
+    Conflicts of a proposed show, which is added to the timelines when there are none
+    """
+    messages = self.conflicts(venue_id, artist_id, start_time)
+    if not messages:
+      self.add(venue_id, artist_id, start_time)
+    return messages
@@ -0,0 +1,170 @@
+#----------------------------------------------------------------------------#
+# Name search backends.
+#
+# A backend turns a search term into a NameMatch for a model (Venue or Artist):
+# either an SQL criterion plus relevance ordering to run against the database,
+# or a list of ids already ranked by an in-process index.
+#----------------------------------------------------------------------------#
+
+import threading
+from collections import namedtuple
+from sqlalchemy import desc, func, literal_column, or_
+
+NameMatch = namedtuple('NameMatch', ['criterion', 'order_by', 'ids'])
+
+
+class SearchBackend:
+  """
+  Base class of name search backends
+  """
+
+  def match(self, model, term) -> NameMatch:
+    raise NotImplementedError
+
+  def index(self, model, entity_id, name):
+    """
+    Called after an entity was created or renamed
+    """
+
+  def remove(self, model, entity_id):
+    """
+    Called after an entity was deleted
+    """
+
+
+class PostgresSearchBackend(SearchBackend):
+  """
+  Substring search served by pg_trgm GIN indexes, ranked by trigram similarity
+  and full-text rank. Requires the search indexes migration.
+  """
+
+  def match(self, model, term) -> NameMatch:
+    tsvector = func.to_tsvector(literal_column("'simple'"), model.name)
+    tsquery = func.plainto_tsquery(literal_column("'simple'"), term)
+    criterion = or_(model.name.ilike(f'%{term}%'), tsvector.op('@@')(tsquery))
+    order_by = [desc(func.similarity(model.name, term)), desc(func.ts_rank(tsvector, tsquery)), model.name]
+    return NameMatch(criterion, order_by, None)
+
+
+class NgramIndex:
+  """
+  Inverted index from lower-cased 1- to 3-grams to the ids of the names containing them
+  """
+
+  max_n = 3
+
+  def __init__(self):
+    self.names = dict()
+    self.postings = dict()
+
+  def grams(self, name):
+    return {name[i:i + n] for n in range(1, self.max_n + 1) for i in range(len(name) - n + 1)}
+
+  def add(self, entity_id, name):
+    self.discard(entity_id)
+    name = (name or '').lower()
+    self.names[entity_id] = name
+    for gram in self.grams(name):
+      self.postings.setdefault(gram, set()).add(entity_id)
+
+  def discard(self, entity_id):
+    name = self.names.pop(entity_id, None)
+    if name is None:
+      return
+    for gram in self.grams(name):
+      ids = self.postings.get(gram)
+      if ids is not None:
+        ids.discard(entity_id)
+        if not ids:
+          del self.postings[gram]
+
+  def candidates(self, term):
+    if not term:
+      return set(self.names)
+    if len(term) <= self.max_n:
+      # the term is itself an indexed gram, its posting list is the exact answer
+      return set(self.postings.get(term, ()))
+    postings = sorted((self.postings.get(term[i:i + self.max_n], set())
+                       for i in range(len(term) - self.max_n + 1)), key=len)
+    candidates = set(postings[0]).intersection(*postings[1:])
+    return {i for i in candidates if term in self.names[i]}
+
+  def rank(self, entity_id, term):
+    name = self.names[entity_id]
+    position = name.find(term)
+    if name == term:
+      kind = 0
+    elif position == 0:
+      kind = 1
+    elif name[position - 1] == ' ':
+      kind = 2
+    else:
+      kind = 3
+    return (kind, position, len(name), name, entity_id)
+
+  def search(self, term) -> list:
+    term = term.lower()
+    return sorted(self.candidates(term), key=lambda entity_id: self.rank(entity_id, term))
+
+
+class NgramSearchBackend(SearchBackend):
+  """
+  In-process inverted n-gram index over names, for SQLite and dev setups.
+
+  Each model's index is loaded from the database on first use and then kept
+  current through index()/remove(), which the create/edit/delete handlers call.
+  The index is per process: rows written by another process only show up after
+  that process's indexes are reset().
+  """
+
+  def __init__(self, db):
+    self.db = db
+    self.indexes = dict()
+    self.lock = threading.Lock()
+
+  def get_index(self, model) -> NgramIndex:
+    index = self.indexes.get(model)
+    if index is None:
+      rows = self.db.session.query(model.id, model.name).all()
+      with self.lock:
+        index = self.indexes.get(model)
+        if index is None:
+          index = NgramIndex()
+          for row in rows:
+            index.add(row.id, row.name)
+          self.indexes[model] = index
+    return index
+
+  def match(self, model, term) -> NameMatch:
+    index = self.get_index(model)
+    with self.lock:
+      ids = index.search(term)
+    return NameMatch(model.id.in_(ids), None, ids)
+
+  def index(self, model, entity_id, name):
+    with self.lock:
+      if model in self.indexes:
+        self.indexes[model].add(entity_id, name)
+
+  def remove(self, model, entity_id):
+    with self.lock:
+      if model in self.indexes:
+        self.indexes[model].discard(entity_id)
+
+  def reset(self):
+    with self.lock:
+      self.indexes.clear()
+
+
+def create_search_backend(name, db) -> SearchBackend:
+  """
+  Build the backend configured by SEARCH_BACKEND: 'postgres', 'ngram' or 'auto'
+  (postgres when the database is PostgreSQL, ngram otherwise)
+  """
+  if name == 'auto':
+    name = 'postgres' if db.engine.dialect.name == 'postgresql' else 'ngram'
+  if name == 'postgres':
+    return PostgresSearchBackend()
+  if name == 'ngram':
+    return NgramSearchBackend(db)
+  raise ValueError(f'Unknown search backend: {name}')
@@ -2,3 +2,71 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// Completions of the search boxes having a data-autocomplete attribute ("venues",
+// "artists" or "areas"), fetched once typing pauses and shown in a datalist.
+(function () {
+  var AUTOCOMPLETE_DELAY_MS = 150;
+
+  function attach(input, n) {
+    var kind = input.getAttribute('data-autocomplete');
+    var list = document.createElement('datalist');
+    var completions = {};
+    var timer = null;
+    var current = '';
+
+    list.id = 'autocomplete-' + n;
+    input.parentNode.appendChild(list);
+    input.setAttribute('list', list.id);
+    input.setAttribute('autocomplete', 'off');
+
+    function show(prefix) {
+      // a late response to an earlier keystroke
+      if (prefix !== current) {
+        return;
+      }
+      list.innerHTML = '';
+      completions[prefix].forEach(function (value) {
+        var option = document.createElement('option');
+        option.value = value;
+        list.appendChild(option);
+      });
+    }
+
+    input.addEventListener('input', function (event) {
+      var prefix = input.value.trim().toLowerCase();
+      clearTimeout(timer);
+      // picked from the list: search it right away
+      if (!event.inputType || event.inputType === 'insertReplacementText') {
+        if ((completions[current] || []).indexOf(input.value) !== -1) {
+          input.form.submit();
+          return;
+        }
+      }
+      current = prefix;
+      if (!prefix) {
+        list.innerHTML = '';
+      } else if (completions[prefix]) {
+        show(prefix);
+      } else {
+        timer = setTimeout(function () {
+          fetch('/api/v1/autocomplete?q=' + encodeURIComponent(prefix))
+            .then(function (response) {
+              return response.ok ? response.json() : Promise.reject(response.status);
+            })
+            .then(function (data) {
+              completions[prefix] = data[kind].map(function (item) {
+                return typeof item === 'string' ? item : item.name;
+              });
+              show(prefix);
+            })
+            .catch(function () {});
+        }, AUTOCOMPLETE_DELAY_MS);
+      }
+    });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    [].forEach.call(document.querySelectorAll('input[data-autocomplete]'), attach);
+  });
+})();
@@ -0,0 +1,42 @@
+import pytest
+
+import config
+from app import create_app
+from extensions import db as _db
+
+
+@pytest.fixture
+def settings():
+  """
+  Settings of the app overriding config.py, test modules override this fixture
+  """
+  return {}
+
+
+@pytest.fixture
+def app(settings):
+  """
+  The app on an in-memory SQLite database with the schema created, no log file and no CSRF
+  """
+  settings = {
+    **{name: getattr(config, name) for name in dir(config) if name.isupper()},
+    'SQLALCHEMY_DATABASE_URI': 'sqlite://', 'SECRET_KEY': 'test', 'WTF_CSRF_ENABLED': False,
+    'LOG_FILE': '', 'TESTING': True,
+    **settings,
+  }
+  app = create_app(type('TestConfig', (), settings))
+  with app.app_context():
+    _db.create_all()
+    yield app
+    _db.session.remove()
+    _db.drop_all()
+
+
+@pytest.fixture
+def db(app):
+  return _db
+
+
+@pytest.fixture
+def client(app):
+  return app.test_client()
@@ -0,0 +1,24 @@
+from models import Venue
+
+
+def test_collections_change_when_a_row_is_deleted(db, client):
+  venues = [Venue(name=f'Venue {i}', city='San Francisco', state='CA', address=f'{i} Folsom Street')
+            for i in range(2)]
+  db.session.add_all(venues)
+  db.session.commit()
+  venue_id = venues[1].id
+
+  response = client.get('/api/v1/venues')
+  assert response.status_code == 200
+  # a deletion does not advance any timestamp, Last-Modified could not tell it
+  assert response.last_modified is None
+  etag = response.get_etag()[0]
+  assert client.get('/api/v1/venues', headers={'If-None-Match': f'"{etag}"'}).status_code == 304
+
+  assert client.delete(f'/venues/{venue_id}').json == {'success': True}
+  headers = {'If-None-Match': f'"{etag}"', 'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'}
+  response = client.get('/api/v1/venues', headers=headers)
+  assert response.status_code == 200
+  assert len(response.json['data'][0]['venues']) == 1
+  response = client.get('/api/v1/venues', headers={'If-Modified-Since': 'Fri, 01 Jan 2100 00:00:00 GMT'})
+  assert response.status_code == 200
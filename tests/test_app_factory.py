@@ -0,0 +1,15 @@
+import pytest
+
+
+@pytest.mark.parametrize('method, path, search', [
+  ('get', '/', 'areas'),
+  ('post', '/artists_and_venues/search', 'areas'),
+  ('get', '/venues', 'venues'),
+  ('post', '/venues/search', 'venues'),
+  ('get', '/artists', 'artists'),
+  ('post', '/artists/search', 'artists'),
+])
+def test_navbar_search_boxes_match_blueprint_endpoints(client, method, path, search):
+  response = getattr(client, method)(path, data={'search_term': 'a'})
+  assert response.status_code == 200
+  assert f'data-autocomplete="{search}"'.encode() in response.data
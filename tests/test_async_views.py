@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy.engine import Engine
+
+from models import Venue
+from querycount import QueryCounter
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('asgiref')
+
+
+@pytest.fixture
+def settings(tmp_path):
+  # aiosqlite connections cannot share a memory database, both sides are files
+  return {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/primary.db',
+          'DB_REPLICA_URLS': [f'sqlite:///{tmp_path}/replica.db'], 'ASYNC_VIEWS': True}
+
+
+@pytest.fixture
+def replica(app, db):
+  engine = app.extensions['replicas'][0]
+  db.metadata.create_all(engine)
+  with engine.begin() as connection:
+    connection.execute(db.insert(Venue), [{'name': 'Replica Venue', 'city': 'San Francisco', 'state': 'CA',
+                                           'address': '1 Replica Street'}])
+  db.session.add(Venue(name='Primary Venue', city='San Francisco', state='CA', address='1 Primary Street'))
+  db.session.commit()
+  return engine
+
+
+def test_async_views_read_from_the_replicas(app, client, replica):
+  with QueryCounter(Engine) as counter:
+    page = client.get('/venues').get_data(as_text=True)
+  assert 'Replica Venue' in page and 'Primary Venue' not in page
+  assert counter.count == 1
+
+
+def test_async_views_read_their_writes_from_the_primary(app, client, replica):
+  response = client.post('/venues/create', data={
+    'name': 'New Venue', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+    'phone': '123-123-1234', 'genres': ['Jazz']})
+  assert b'was successfully listed' in response.data
+  page = client.get('/venues/2').get_data(as_text=True)
+  assert 'New Venue' in page
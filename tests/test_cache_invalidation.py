@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+import app as fyyur
+from models import Artist, Show, Venue
+
+
+def test_deleting_a_venue_drops_the_cached_pages_once_it_is_gone(db, client, monkeypatch):
+  venue = Venue(name='The Dueling Pianos Bar', city='New York', state='NY', address='335 Delancey Street')
+  artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+  db.session.add_all([venue, artist])
+  db.session.flush()
+  db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=datetime.now() + timedelta(days=7)))
+  db.session.commit()
+  venue_id, artist_id = venue.id, artist.id
+  assert b'The Dueling Pianos Bar' in client.get(f'/artists/{artist_id}').data
+
+  # a request refilling the cache before the commit would cache the deleted venue again
+  committed = list()
+  invalidate_venue = fyyur.invalidate_venue
+  def check_committed(*args, **kwargs):
+    committed.append(not db.session.query(Venue.query.filter_by(id=venue_id).exists()).scalar())
+    invalidate_venue(*args, **kwargs)
+  monkeypatch.setattr(fyyur, 'invalidate_venue', check_committed)
+
+  assert client.delete(f'/venues/{venue_id}').json == {'success': True}
+  assert committed == [True]
+  assert b'The Dueling Pianos Bar' not in client.get(f'/artists/{artist_id}').data
@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import babel.dates
+import pytest
+
+from dates import FORMATS, DateFormatter
+
+VALUES = [datetime(2035, 4, 1, 20, 0), datetime(2035, 4, 1, 9, 30), datetime(2019, 6, 15, 23, 5)]
+
+
+@pytest.mark.parametrize('locale', ['en', 'es', 'fr', 'de', 'it', 'pt'])
+@pytest.mark.parametrize('format', ['short', 'medium', 'long', 'full'])
+def test_named_formats_match_babel(format, locale):
+  expected = [babel.dates.format_datetime(value, FORMATS.get(format, format), locale=locale) for value in VALUES]
+  formatter = DateFormatter()
+  assert [formatter.format(value, format, locale) for value in VALUES] == expected
+  # formatted again from the memoized date and time fields
+  assert formatter.format_many(VALUES + VALUES, format, locale) == expected + expected
+
+
+
+@pytest.fixture
+def show(db):
+  from models import Artist, Show, Venue
+  venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street')
+  artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+  db.session.add_all([venue, artist])
+  db.session.flush()
+  db.session.add(Show(venue_id=venue.id, artist_id=artist.id, start_time=datetime(2035, 4, 1, 20, 0)))
+  db.session.commit()
+  return artist.id
+
+
+def get_page(client, url, language):
+  response = client.get(url, headers={'Accept-Language': language})
+  text = response.get_data(as_text=True)
+  response.close()
+  return response.vary, text
+
+
+@pytest.mark.parametrize('url', ['/shows', '/shows?stream=1', '/artists/{artist_id}'])
+def test_pages_vary_by_locale(client, show, url):
+  url = url.format(artist_id=show)
+  english_vary, english = get_page(client, url, 'en')
+  # the second request is served from the view cache filled by the first
+  french_vary, french = get_page(client, url, 'fr')
+  assert 'Accept-Language' in english_vary and 'Accept-Language' in french_vary
+  assert 'Sunday' in english and 'Sunday' not in french
+  assert 'dimanche' in french
@@ -0,0 +1,36 @@
+import time
+
+import pytest
+from flask import session
+
+from engines import STICKY_SESSION_KEY, current_replica
+
+
+@pytest.fixture
+def settings():
+  return {'DB_REPLICA_URLS': ['sqlite://']}
+
+
+def test_get_requests_read_from_a_replica(app):
+  with app.test_request_context('/venues'):
+    assert current_replica() is app.extensions['replicas'][0]
+
+
+def test_clients_read_from_the_primary_after_a_write(app, client):
+  response = client.post('/venues/create', data={
+    'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+    'phone': '123-123-1234', 'genres': ['Jazz']})
+  assert b'was successfully listed' in response.data
+  with client.session_transaction() as sess:
+    assert sess[STICKY_SESSION_KEY] > time.time()
+
+  with app.test_request_context('/venues'):
+    session[STICKY_SESSION_KEY] = time.time() + 10
+    assert current_replica() is None
+
+
+def test_clients_cannot_pin_themselves_to_the_primary(app):
+  until = str(time.time() + 3600)
+  forged = f'fyyur_primary_until={until}; session={{"{STICKY_SESSION_KEY}": {until}}}'
+  with app.test_request_context('/venues', headers={'Cookie': forged}):
+    assert current_replica() is app.extensions['replicas'][0]
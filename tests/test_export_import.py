@@ -0,0 +1,37 @@
+import pytest
+
+from models import Venue
+
+VENUES = [
+  {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+   'phone': '123-123-1234', 'genres': ['Jazz', 'Reggae', 'Folk'], 'seeking_talent': True,
+   'seeking_description': 'We are on the lookout for a local artist to play every two weeks.'},
+  {'name': 'Park Square Live Music & Coffee', 'city': 'San Francisco', 'state': 'CA',
+   'address': '34 Whiskey Moore Ave', 'phone': '415-000-1234', 'genres': ['Rock n Roll', 'Jazz'],
+   'seeking_talent': False, 'seeking_description': None},
+]
+COLUMNS = ('name', 'city', 'state', 'address', 'phone', 'genres', 'seeking_talent', 'seeking_description')
+
+
+def venue_fields(db):
+  return [{column: getattr(venue, column) for column in COLUMNS}
+          for venue in db.session.query(Venue).order_by(Venue.name)]
+
+
+@pytest.mark.parametrize('format', ['csv', 'jsonl'])
+def test_exported_venues_import_unchanged(app, db, tmp_path, format):
+  db.session.add_all([Venue(**venue) for venue in VENUES])
+  db.session.commit()
+  exported = venue_fields(db)
+
+  path = str(tmp_path / f'venues.{format}')
+  runner = app.test_cli_runner()
+  result = runner.invoke(args=['export', 'venues', '--format', format, '-o', path])
+  assert result.exit_code == 0, result.output
+  db.session.query(Venue).delete()
+  db.session.commit()
+
+  result = runner.invoke(args=['import', 'venues', path])
+  assert result.exit_code == 0, result.output
+  assert 'rejected' not in result.output.splitlines()[-1]
+  assert venue_fields(db) == exported
@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from exporter import encode_ics
+
+
+def unfold(text):
+  return text.replace('\r\n ', '')
+
+
+def test_ics_lines_are_folded_at_75_octets():
+  show = {'venue_id': 1, 'artist_id': 2, 'start_time': datetime(2035, 4, 1, 20, 0),
+          'artist_name': 'Sigur Rós and the Ensemble of the Extremely Long Names ' * 3,
+          'venue_name': 'Café Überlänge, Düsseldorf'}
+  calendar = ''.join(encode_ics([show], timedelta(hours=2)))
+  lines = calendar.split('\r\n')
+  assert all(len(line.encode()) <= 75 for line in lines)
+  assert any(line.startswith(' ') for line in lines)
+  summary = [line for line in unfold(calendar).split('\r\n') if line.startswith('SUMMARY:')]
+  assert summary == [f'SUMMARY:{show["artist_name"]} at Café Überlänge\\, Düsseldorf']
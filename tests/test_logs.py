@@ -0,0 +1,20 @@
+import logging
+
+import pytest
+
+
+@pytest.mark.parametrize('path, kind, flashed', [
+  ('/venues/create', 'Venue', 'An error occurred. Venue could not be created.'),
+  ('/artists/create', 'Artist', 'An error occurred. Artist could not be listed.'),
+])
+def test_failed_creates_are_logged_with_the_submitted_name(client, caplog, path, kind, flashed):
+  # an unknown genre makes the model reject the form
+  form = {'name': 'The Musical Hop', 'city': 'San Francisco', 'state': 'CA', 'address': '1015 Folsom Street',
+          'phone': '123-123-1234', 'genres': ['Swing']}
+  with caplog.at_level(logging.ERROR):
+    response = client.post(path, data=form)
+  assert response.status_code == 200
+  assert flashed.encode() in response.data
+  record, = [record for record in caplog.records if record.getMessage() == f'{kind} could not be created']
+  assert getattr(record, f'{kind.lower()}_name') == 'The Musical Hop'
+  assert record.exc_info is not None
@@ -0,0 +1,27 @@
+import pytest
+
+from app import get_cache
+from benchmarks.datagen import generate
+from querycount import QueryCounter, assert_num_queries
+
+# venues, artists and shows of the two datasets, the second ten times the first
+SIZES = ((20, 100, 1000), (200, 1000, 10000))
+
+
+def reseed(db, venues, artists, shows):
+  db.drop_all()
+  db.create_all()
+  generate(venues, artists, shows)
+  get_cache().clear()
+
+
+@pytest.mark.parametrize('url', ['/venues', '/artists'])
+def test_listing_queries_do_not_grow_with_rows(app, db, client, url):
+  small, large = SIZES
+  reseed(db, *small)
+  with QueryCounter(db.engine) as counter:
+    assert client.get(url).status_code == 200
+
+  reseed(db, *large)
+  with assert_num_queries(db.engine, counter.count):
+    assert client.get(url).status_code == 200
@@ -0,0 +1,30 @@
+import os
+
+import pytest
+
+from recent import create_recent_items
+
+CONFIG = {'RECENT_BACKEND': 'shared', 'RECENT_MAX_ITEMS': 2, 'RECENT_AUTHKEY': None, 'SECRET_KEY': 'test'}
+
+
+def test_shared_items_are_served_from_a_private_directory(tmp_path):
+  socket = tmp_path / 'recent' / 'recent.sock'
+  recent = create_recent_items({**CONFIG, 'RECENT_SOCKET': str(socket)})
+  for i in range(3):
+    recent.add(('venue', i), {'venue_id': i})
+  assert recent.items() == [{'venue_id': 2}, {'venue_id': 1}]
+  assert os.stat(socket.parent).st_mode & 0o777 == 0o700
+
+
+def test_shared_items_refuse_a_directory_others_can_enter(tmp_path):
+  directory = tmp_path / 'recent'
+  directory.mkdir(mode=0o755)
+  directory.chmod(0o755)
+  recent = create_recent_items({**CONFIG, 'RECENT_SOCKET': str(directory / 'recent.sock')})
+  with pytest.raises(RuntimeError):
+    recent.items()
+
+
+def test_shared_items_need_a_key():
+  with pytest.raises(RuntimeError):
+    create_recent_items({**CONFIG, 'SECRET_KEY': None, 'RECENT_SOCKET': 'recent.sock'})
@@ -0,0 +1,39 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import Artist, Show, Venue
+
+
+@pytest.fixture
+def settings(tmp_path):
+  # a file database has a pool of connections, the memory one shares a single connection
+  return {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{tmp_path}/fyyur.db'}
+
+
+@pytest.fixture
+def shows(db):
+  venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street')
+  artist = Artist(name='Guns N Petals', city='San Francisco', state='CA')
+  db.session.add_all([venue, artist])
+  db.session.flush()
+  start = datetime(2035, 4, 1, 20, 0)
+  db.session.add_all([Show(venue_id=venue.id, artist_id=artist.id, start_time=start + timedelta(days=i))
+                      for i in range(10)])
+  db.session.commit()
+  db.session.close()
+
+
+def test_streamed_show_listing_releases_its_connection(db, client, shows):
+  response = client.get('/shows?stream=1')
+  assert response.data.count(b'Guns N Petals') == 10
+  response.close()
+  assert db.engine.pool.checkedout() == 0
+
+
+@pytest.mark.parametrize('format', ['csv', 'jsonl', 'ics'])
+def test_show_export_releases_its_connection(db, client, shows, format):
+  response = client.get(f'/shows/export.{format}')
+  assert response.data.count(b'Guns N Petals') == 10
+  response.close()
+  assert db.engine.pool.checkedout() == 0